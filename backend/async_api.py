@@ -0,0 +1,177 @@
+"""Async variants of the account, category, ledger and transfer endpoints.
+
+Enabled with ASYNC_ENDPOINTS=1. Each handler awaits the AsyncSession and runs
+the matching sync handler from main.py through AsyncSession.run_sync, so the
+business rules stay in one place while database I/O goes through the async
+driver and never pins a threadpool thread.
+"""
+from datetime import date, datetime
+from typing import List, Optional
+from fastapi import APIRouter, Depends, FastAPI, Query, Response, status
+from fastapi.routing import APIRoute
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import main as sync_api
+from auth import Principal, get_current_user_async
+from database import get_async_db
+from idempotency import Idempotency, idempotency_key
+from jobs import respond_async
+from ownership import OwnershipScope
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+import search
+from versions import conditional_get_async, conditional_get_dated_async
+from schemas import (
+    AccountCreate, AccountUpdate, AccountResponse, AccountWithBalance, AccountBalanceAsOf, BalanceHistory,
+    CategoryCreate, CategoryUpdate, CategoryResponse,
+    LedgerCreate, LedgerUpdate, LedgerResponse, LedgerPage, LedgerSearchPage,
+    TransferCreate, JobResponse
+)
+
+router = APIRouter()
+
+# Account endpoints
+@router.get("/accounts", response_model=List[AccountWithBalance], dependencies=[Depends(conditional_get_async)])
+async def get_accounts(response: Response, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.get_accounts(response, current_user=current_user, db=session))
+
+@router.post("/accounts", response_model=AccountResponse, status_code=status.HTTP_201_CREATED)
+async def create_account(account_data: AccountCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.create_account(account_data, idem=idem, current_user=current_user, db=session))
+
+@router.get("/accounts/{account_id}", response_model=AccountWithBalance, dependencies=[Depends(conditional_get_async)])
+async def get_account(account_id: int, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.get_account(account_id, current_user=current_user, db=session))
+
+@router.get("/accounts/{account_id}/balance", response_model=AccountBalanceAsOf, dependencies=[Depends(conditional_get_dated_async)])
+async def get_account_balance(account_id: int, as_of: Optional[date] = None, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.get_account_balance(account_id, as_of, current_user=current_user, db=session))
+
+@router.get("/accounts/{account_id}/balance-history", response_model=BalanceHistory, dependencies=[Depends(conditional_get_dated_async)])
+async def get_account_balance_history(
+    account_id: int,
+    start: date,
+    end: Optional[date] = None,
+    interval: str = Query('day', pattern='^(day|week|month)$'),
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(lambda session: sync_api.get_account_balance_history(
+        account_id, start, end, interval, current_user=current_user, db=session
+    ))
+
+@router.put("/accounts/{account_id}", response_model=AccountResponse)
+async def update_account(account_id: int, account_data: AccountUpdate, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.update_account(account_id, account_data, current_user=current_user, db=session))
+
+@router.delete("/accounts/{account_id}", status_code=status.HTTP_204_NO_CONTENT, responses={202: {"model": JobResponse}})
+async def delete_account(account_id: int, background: bool = Depends(respond_async), current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.delete_account(account_id, background=background, current_user=current_user, db=session))
+
+# Category endpoints
+@router.get("/categories", response_model=List[CategoryResponse], dependencies=[Depends(conditional_get_async)])
+async def get_categories(current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.get_categories(current_user=current_user, db=session))
+
+@router.post("/categories", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
+async def create_category(category_data: CategoryCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.create_category(category_data, idem=idem, current_user=current_user, db=session))
+
+@router.get("/categories/{category_id}", response_model=CategoryResponse, dependencies=[Depends(conditional_get_async)])
+async def get_category(category_id: int, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.get_category(category_id, current_user=current_user, db=session))
+
+@router.put("/categories/{category_id}", response_model=CategoryResponse, responses={202: {"model": JobResponse}})
+async def update_category(category_id: int, category_data: CategoryUpdate, background: bool = Depends(respond_async), current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.update_category(category_id, category_data, background=background, current_user=current_user, db=session))
+
+@router.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_category(category_id: int, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.delete_category(category_id, current_user=current_user, db=session))
+
+# Ledger endpoints
+@router.get("/ledger", response_model=LedgerPage, dependencies=[Depends(conditional_get_async)])
+async def get_ledger_entries(
+    response: Response,
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=search.MAX_QUERY_LENGTH),
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(lambda session: sync_api.get_ledger_entries(
+        account_id=account_id,
+        category_id=category_id,
+        start_date=start_date,
+        end_date=end_date,
+        limit=limit,
+        cursor=cursor,
+        q=q,
+        response=response,
+        scope=OwnershipScope(current_user, session),
+        db=session,
+    ))
+
+@router.get("/ledger/search", response_model=LedgerSearchPage, dependencies=[Depends(conditional_get_async)])
+async def search_ledger_entries(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=search.MAX_QUERY_LENGTH),
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await db.run_sync(lambda session: sync_api.search_ledger_entries(
+        response=response,
+        q=q,
+        account_id=account_id,
+        category_id=category_id,
+        start_date=start_date,
+        end_date=end_date,
+        limit=limit,
+        cursor=cursor,
+        scope=OwnershipScope(current_user, session),
+        db=session,
+    ))
+
+@router.post("/ledger", response_model=LedgerResponse, status_code=status.HTTP_201_CREATED)
+async def create_ledger_entry(ledger_data: LedgerCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.create_ledger_entry(ledger_data, idem=idem, current_user=current_user, db=session))
+
+@router.get("/ledger/{ledger_id}", response_model=LedgerResponse, dependencies=[Depends(conditional_get_async)])
+async def get_ledger_entry(ledger_id: int, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.get_ledger_entry(ledger_id, scope=OwnershipScope(current_user, session)))
+
+@router.put("/ledger/{ledger_id}", response_model=LedgerResponse)
+async def update_ledger_entry(ledger_id: int, ledger_data: LedgerUpdate, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.update_ledger_entry(ledger_id, ledger_data, scope=OwnershipScope(current_user, session), db=session))
+
+@router.delete("/ledger/{ledger_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_ledger_entry(ledger_id: int, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.delete_ledger_entry(ledger_id, scope=OwnershipScope(current_user, session), db=session))
+
+# Transfer endpoints
+@router.post("/transfer", response_model=List[LedgerResponse], status_code=status.HTTP_201_CREATED)
+async def create_transfer(transfer_data: TransferCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.create_transfer(transfer_data, idem=idem, current_user=current_user, db=session))
+
+@router.get("/transfer/{transfer_id}", response_model=List[LedgerResponse], dependencies=[Depends(conditional_get_async)])
+async def get_transfer(transfer_id: str, current_user: Principal = Depends(get_current_user_async), db: AsyncSession = Depends(get_async_db)):
+    return await db.run_sync(lambda session: sync_api.get_transfer(transfer_id, scope=OwnershipScope(current_user, session)))
+
+def install(app: FastAPI):
+    """Swap the sync routes for their async variants, keeping every other route in place"""
+    replaced = {(route.path, method) for route in router.routes for method in route.methods}
+    app.router.routes = [
+        route for route in app.router.routes
+        if not (isinstance(route, APIRoute) and any((route.path, method) in replaced for method in route.methods))
+    ]
+    # Literal paths such as /ledger/export and /ledger/import stay ahead of /ledger/{ledger_id}
+    app.include_router(router)
@@ -1,12 +1,19 @@
+import hmac
+import os
+import time
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
-import bcrypt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import get_db, get_async_db
 from models import User
+from cache import TTLCache
+from hashing import hash_password, check_password, needs_rehash
 
 SECRET_KEY = "your-secret-key-change-in-production"
 ALGORITHM = "HS256"
@@ -14,13 +21,33 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_TTL_SECONDS = float(os.getenv("AUTH_CACHE_TTL_SECONDS", "60"))
+# Bearer token for /metrics and /internal/*; while unset those endpoints answer 404
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+@dataclass(frozen=True)
+class Principal:
+    """Immutable snapshot of the authenticated user, safe to share across requests"""
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    created_at: Optional[datetime]
+
+# raw token -> (subject, expiry timestamp); saves re-verifying the signature on every request
+token_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+# subject (email) -> Principal; saves the users lookup on every request
+principal_cache = TTLCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL_SECONDS)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    return check_password(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    return hash_password(password)
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    return needs_rehash(hashed_password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -32,21 +59,100 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def decode_token_subject(token: str) -> Optional[str]:
+    cached = token_cache.get(token)
+    if cached is not None:
+        email, expires_at = cached
+        if expires_at > time.time():
+            return email
+        token_cache.pop(token)
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    email = payload.get("sub")
+    if email is None:
+        return None
+    expires_at = payload.get("exp", 0)
+    # Never keep a token in the cache past its own expiry
+    ttl = min(AUTH_CACHE_TTL_SECONDS, expires_at - time.time())
+    if ttl > 0:
+        token_cache.set(token, (email, expires_at), ttl=ttl)
+    return email
+
+def invalidate_user(email: str):
+    """Forget the cached principal and decoded tokens for a user"""
+    principal_cache.pop(email)
+    token_cache.discard_where(lambda value: value[0] == email)
+
+def auth_cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "principals": principal_cache.stats()}
+
+def require_internal_token(authorization: Optional[str] = Header(None)):
+    """Gate for the operational endpoints, which expose traffic, cache and pool internals"""
+    if not INTERNAL_API_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), INTERNAL_API_TOKEN.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid internal token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_changed_user(mapper, connection, target):
+    invalidate_user(target.email)
+    # An email change leaves the old subject cached too
+    for old_email in inspect(target).attrs.email.history.deleted:
+        invalidate_user(old_email)
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
+    email = decode_token_subject(token)
+    if email is None:
         raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    principal = principal_cache.get(email)
+    if principal is None:
+        user = db.query(User).filter(User.email == email).first()
+        if user is None:
+            raise credentials_exception
+        principal = _cache_principal(user)
+    # Lets a read-only request's session pick a replica for this user (database.RoutingSession)
+    db.info["user_id"] = principal.id
+    return principal
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    email = decode_token_subject(token)
+    if email is None:
         raise credentials_exception
-    return user
+    principal = principal_cache.get(email)
+    if principal is None:
+        user = (await db.execute(select(User).where(User.email == email))).scalars().first()
+        if user is None:
+            raise credentials_exception
+        principal = _cache_principal(user)
+    db.info["user_id"] = principal.id
+    return principal
 
+def _cache_principal(user: User) -> Principal:
+    principal = Principal(
+        id=user.id,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        created_at=user.created_at,
+    )
+    principal_cache.set(user.email, principal)
+    return principal
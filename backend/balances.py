@@ -0,0 +1,134 @@
+import argparse
+from decimal import Decimal
+from sqlalchemy import bindparam, func, select, update, insert
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Account, AccountLedger, AccountBalance
+
+def ledger_balance(db: Session, account_id: int) -> Decimal:
+    """SUM of the ledger for one account (the source of truth for account_balances)"""
+    return db.query(func.coalesce(func.sum(AccountLedger.amount), 0)).filter(
+        AccountLedger.account_id == account_id
+    ).scalar() or Decimal('0')
+
+def adjust_balance(db: Session, account_id: int, delta: Decimal):
+    """Apply a ledger delta to the stored balance inside the caller's transaction"""
+    if not delta:
+        return
+    # balance = balance + delta is applied under the row lock, so concurrent writers don't lose updates
+    result = db.execute(
+        update(AccountBalance)
+        .where(AccountBalance.account_id == account_id)
+        .values(balance=AccountBalance.balance + delta)
+    )
+    if result.rowcount == 0:
+        # No balance row yet (account predates the table): seed it from the ledger,
+        # which already includes the pending change once flushed
+        db.flush()
+        db.add(AccountBalance(account_id=account_id, balance=ledger_balance(db, account_id)))
+
+def adjust_balances(db: Session, deltas: dict):
+    """adjust_balance for {account_id: delta} with one executemany UPDATE, locking rows in account order"""
+    deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    present = set(db.scalars(select(AccountBalance.account_id).where(AccountBalance.account_id.in_(deltas))))
+    table = AccountBalance.__table__
+    if present:
+        db.execute(
+            update(table)
+            .where(table.c.account_id == bindparam("b_account_id"))
+            .values(balance=table.c.balance + bindparam("b_delta")),
+            [{"b_account_id": account_id, "b_delta": deltas[account_id]} for account_id in sorted(present)],
+        )
+    for account_id in sorted(deltas.keys() - present):
+        adjust_balance(db, account_id, deltas[account_id])
+
+def move_balance(db: Session, old_account_id: int, old_amount: Decimal, new_account_id: int, new_amount: Decimal):
+    """Re-point an edited ledger row's contribution from (old account, old amount) to (new account, new amount)"""
+    if old_account_id == new_account_id:
+        adjust_balance(db, new_account_id, new_amount - old_amount)
+    else:
+        adjust_balance(db, old_account_id, -old_amount)
+        adjust_balance(db, new_account_id, new_amount)
+
+def backfill_missing(db: Session) -> int:
+    """Create balance rows for accounts that don't have one yet, in one set-based statement"""
+    ledger_sums = (
+        select(AccountLedger.account_id, func.sum(AccountLedger.amount).label("total"))
+        .group_by(AccountLedger.account_id)
+        .subquery()
+    )
+    missing = (
+        select(Account.id, func.coalesce(ledger_sums.c.total, 0))
+        .outerjoin(ledger_sums, ledger_sums.c.account_id == Account.id)
+        .outerjoin(AccountBalance, AccountBalance.account_id == Account.id)
+        .where(AccountBalance.account_id.is_(None))
+    )
+    result = db.execute(
+        insert(AccountBalance).from_select(["account_id", "balance"], missing)
+    )
+    db.commit()
+    return result.rowcount
+
+def reconcile(db: Session, fix: bool = False):
+    """Compare stored balances against the ledger; optionally overwrite the drifted ones"""
+    ledger_sums = (
+        select(AccountLedger.account_id, func.sum(AccountLedger.amount).label("total"))
+        .group_by(AccountLedger.account_id)
+        .subquery()
+    )
+    rows = db.execute(
+        select(
+            Account.id,
+            AccountBalance.balance,
+            func.coalesce(ledger_sums.c.total, 0),
+        )
+        .outerjoin(ledger_sums, ledger_sums.c.account_id == Account.id)
+        .outerjoin(AccountBalance, AccountBalance.account_id == Account.id)
+        .order_by(Account.id)
+    ).all()
+
+    mismatches = []
+    for account_id, stored, actual in rows:
+        if stored is None or Decimal(stored) != Decimal(actual):
+            mismatches.append((account_id, stored, actual))
+
+    if fix:
+        for account_id, stored, actual in mismatches:
+            if stored is None:
+                db.add(AccountBalance(account_id=account_id, balance=actual))
+            else:
+                db.execute(
+                    update(AccountBalance)
+                    .where(AccountBalance.account_id == account_id)
+                    .values(balance=actual)
+                )
+        db.commit()
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Check stored account balances against the ledger")
+    parser.add_argument("--fix", action="store_true", help="rewrite drifted or missing balances from the ledger")
+    args = parser.parse_args()
+    from partitions import require_full_ledger
+    require_full_ledger("reconcile balances")
+
+    db = SessionLocal()
+    try:
+        mismatches = reconcile(db, fix=args.fix)
+    finally:
+        db.close()
+
+    for account_id, stored, actual in mismatches:
+        print(f"account {account_id}: stored={stored} ledger={actual}")
+    if not mismatches:
+        print("All account balances match the ledger.")
+    elif args.fix:
+        print(f"Rebuilt {len(mismatches)} account balance(s).")
+    else:
+        print(f"{len(mismatches)} account balance(s) out of sync; rerun with --fix to rebuild.")
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
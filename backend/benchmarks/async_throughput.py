@@ -0,0 +1,78 @@
+"""Compare sync and async endpoint throughput at high concurrency.
+
+Starts `uvicorn main:app` once with ASYNC_ENDPOINTS=0 and once with
+ASYNC_ENDPOINTS=1 against the same DATABASE_URL, drives both with the same
+concurrent load, and prints requests/second and latency percentiles.
+
+    python -m benchmarks.async_throughput --concurrency 200 --duration 15
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from benchmarks.common import login, percentile, running_server
+
+async def drive(url, paths, concurrency, duration, email, password):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        token = await login(client, email, password)
+        headers = {"Authorization": f"Bearer {token}"}
+        latencies = []
+        errors = 0
+        deadline = time.monotonic() + duration
+
+        async def worker(offset):
+            nonlocal errors
+            i = offset
+            while time.monotonic() < deadline:
+                path = paths[i % len(paths)]
+                i += 1
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path, headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.monotonic()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.monotonic() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.fmean(latencies) * 1000 if latencies else 0.0,
+    }
+
+def run_mode(async_mode, args):
+    env = {"ASYNC_ENDPOINTS": "1" if async_mode else "0"}
+    command = ["uvicorn", "main:app", "--log-level", "warning"]
+    with running_server(command, args.port, env) as url:
+        return asyncio.run(drive(url, args.paths, args.concurrency, args.duration, args.email, args.password))
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async endpoint throughput")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=15.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--email", default="bench@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--paths", nargs="+", default=["/accounts", "/categories", "/ledger?limit=50"])
+    args = parser.parse_args()
+
+    for label, async_mode in (("sync", False), ("async", True)):
+        result = run_mode(async_mode, args)
+        print(
+            f"{label:>5}: {result['rps']:8.1f} req/s  "
+            f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms  "
+            f"({result['requests']} requests, {result['errors']} errors)"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def wait_until_ready(url, timeout=30.0, process=None):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"server exited with status {process.returncode} before becoming ready")
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"server at {url} did not become ready")
+
+async def login(client, email, password, signup=True):
+    if signup:
+        await client.post("/signup", json={"first_name": "Bench", "last_name": "User", "email": email, "password": password})
+    response = await client.post("/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+@contextmanager
+def running_server(command, port, env=None):
+    """Run `python -m <command...>` from the backend directory until the block exits"""
+    server = subprocess.Popen(
+        [sys.executable, "-m", *command, "--port", str(port)],
+        cwd=BACKEND_DIR,
+        env={**os.environ, **(env or {})},
+    )
+    try:
+        asyncio.run(wait_until_ready(f"http://127.0.0.1:{port}", process=server))
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,42 @@
+"""Diff two benchmarks.suite JSON reports endpoint by endpoint.
+
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import json
+
+METRICS = ("rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request")
+
+def change(old, new):
+    if old is None or new is None:
+        return "-"
+    if old == 0:
+        return "n/a" if new else "0%"
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    args = parser.parse_args()
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+    print(f"before {before['meta'].get('git_commit')}  after {after['meta'].get('git_commit')}")
+    for key in ("dataset", "database", "concurrency", "async_endpoints"):
+        if before["meta"].get(key) != after["meta"].get(key):
+            print(f"warning: runs differ in {key}: {before['meta'].get(key)} vs {after['meta'].get(key)}")
+    print(f"{'endpoint':<18} {'metric':<20} {'before':>10} {'after':>10} {'change':>9}")
+    for name in sorted(set(before["endpoints"]) & set(after["endpoints"])):
+        old = before["endpoints"][name]
+        new = after["endpoints"][name]
+        for metric in METRICS:
+            a, b = old.get(metric), new.get(metric)
+            print(f"{name:<18} {metric:<20} {str(a):>10} {str(b):>10} {change(a, b):>9}")
+    for name in sorted(set(before["endpoints"]) ^ set(after["endpoints"])):
+        print(f"{name:<18} only in {'before' if name in before['endpoints'] else 'after'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Deterministic synthetic dataset for benchmarks.
+
+Builds USERS users (bench-<n>@example.com, all sharing one password), each
+with ACCOUNTS accounts and CATEGORIES categories, and spreads ENTRIES ledger
+rows across them. The same --seed always yields the same rows. Dates skew
+towards the recent end of the window, and a few accounts and users carry
+most of the activity, the way real ledgers do. Balances, monthly rollups and
+balance checkpoints are rebuilt from the loaded rows, so every endpoint sees
+consistent data.
+
+    python -m benchmarks.seed --users 100 --entries 2000000 --reset
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import func, insert, select
+
+from benchmarks.common import BACKEND_DIR
+
+sys.path.insert(0, BACKEND_DIR)
+
+from database import engine, Base, SessionLocal  # noqa: E402
+from models import User, Account, Category, AccountLedger  # noqa: E402
+
+BENCH_PASSWORD = "bench-password"
+ACCOUNT_TYPES = ("bank", "cash", "credit_card", "savings")
+CATEGORY_NAMES = {
+    "income": ("Salary", "Interest", "Refunds", "Freelance"),
+    "expense": ("Groceries", "Rent", "Utilities", "Dining", "Transport", "Travel", "Health", "Shopping"),
+}
+
+def bench_email(n: int) -> str:
+    return f"bench-{n}@example.com"
+
+def reset_schema():
+    from migrations import migration_metadata, upgrade
+    Base.metadata.drop_all(bind=engine)
+    migration_metadata.drop_all(bind=engine)
+    upgrade(engine)
+
+def _weighted_choice(rng: random.Random, items: list):
+    # Zipf-like: the first few items get most of the picks
+    return items[min(int(rng.paretovariate(1.2)) - 1, len(items) - 1)]
+
+def generate_entries(rng: random.Random, owners: list, count: int, end: datetime, days: int):
+    """Yield ledger rows; owners is [(user_id, [account ids], {category_id: type})]"""
+    for _ in range(count):
+        user_id, account_ids, categories = _weighted_choice(rng, owners)
+        account_id = _weighted_choice(rng, account_ids)
+        # Squaring a uniform sample puts most entries in the recent part of the window
+        age = timedelta(days=days * rng.random() ** 2, seconds=rng.randrange(86400))
+        category_id = rng.choice(list(categories)) if categories and rng.random() < 0.85 else None
+        magnitude = Decimal(int(rng.lognormvariate(8, 1.2))) / 100
+        if category_id is not None:
+            amount = magnitude if categories[category_id] == "income" else -magnitude
+        else:
+            amount = magnitude if rng.random() < 0.3 else -magnitude
+        yield {
+            "account_id": account_id,
+            "created_by": user_id,
+            "amount": min(amount, Decimal("99999999.99")),
+            "category_id": category_id,
+            "narration": f"{rng.choice(('Card', 'Transfer', 'Direct debit', 'Cash'))} {rng.randrange(10000):04d}",
+            "transaction_date": (end - age).replace(microsecond=0),
+            "created_on": end,
+        }
+
+def seed(users: int, accounts_per_user: int, categories_per_user: int, entries: int, seed_value: int, days: int, batch_size: int) -> dict:
+    from hashing import hash_password, shutdown
+    from ledger_import import _write_rows
+    from balances import backfill_missing
+    from rollups import rebuild
+    import checkpoints
+
+    rng = random.Random(seed_value)
+    end = datetime(2025, 1, 1)
+    db = SessionLocal()
+    try:
+        if db.execute(select(User.id).where(User.email == bench_email(1))).first():
+            raise SystemExit("benchmark users already exist; rerun with --reset")
+        password_hash = hash_password(BENCH_PASSWORD)
+        shutdown()
+        user_ids = list(db.execute(insert(User).returning(User.id, sort_by_parameter_order=True), [
+            {"first_name": "Bench", "last_name": str(n), "email": bench_email(n), "password_hash": password_hash, "created_at": end}
+            for n in range(1, users + 1)
+        ]).scalars())
+        owners = []
+        for user_id in user_ids:
+            account_ids = list(db.execute(insert(Account).returning(Account.id, sort_by_parameter_order=True), [
+                {"user_id": user_id, "account_name": f"Account {n}", "account_type": ACCOUNT_TYPES[n % len(ACCOUNT_TYPES)], "created_at": end}
+                for n in range(1, accounts_per_user + 1)
+            ]).scalars())
+            category_rows = []
+            for n in range(categories_per_user):
+                category_type = "income" if n % 4 == 0 else "expense"
+                names = CATEGORY_NAMES[category_type]
+                category_rows.append({"user_id": user_id, "category_type": category_type, "name": f"{names[n % len(names)]} {n}", "created_at": end})
+            categories = {}
+            if category_rows:
+                inserted = db.execute(insert(Category).returning(Category.id, Category.category_type, sort_by_parameter_order=True), category_rows).all()
+                categories = dict(inserted)
+            owners.append((user_id, account_ids, categories))
+        db.commit()
+
+        batch = []
+        for row in generate_entries(rng, owners, entries, end, days):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _write_rows(db, batch)
+                db.commit()
+                batch = []
+        if batch:
+            _write_rows(db, batch)
+            db.commit()
+
+        backfill_missing(db)
+        rebuild(db)
+        # Built from the rollups, so it has to come after them
+        checkpoints.rebuild(db)
+        return {
+            "users": db.scalar(select(func.count()).select_from(User)),
+            "accounts": db.scalar(select(func.count()).select_from(Account)),
+            "categories": db.scalar(select(func.count()).select_from(Category)),
+            "ledger_entries": db.scalar(select(func.count()).select_from(AccountLedger)),
+        }
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Load a deterministic benchmark dataset into DATABASE_URL")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--accounts-per-user", type=int, default=5)
+    parser.add_argument("--categories-per-user", type=int, default=12)
+    parser.add_argument("--entries", type=int, default=200_000, help="total ledger rows across all users")
+    parser.add_argument("--days", type=int, default=3 * 365, help="length of the transaction date window")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--reset", action="store_true", help="drop and recreate every table first")
+    args = parser.parse_args()
+
+    if args.reset:
+        reset_schema()
+    started = time.perf_counter()
+    counts = seed(args.users, args.accounts_per_user, args.categories_per_user, args.entries, args.seed, args.days, args.batch_size)
+    print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
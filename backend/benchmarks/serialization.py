@@ -0,0 +1,138 @@
+"""Per-row cost of the list-response serialization paths.
+
+Loads N synthetic ledger rows (and N accounts) into a throwaway SQLite
+database and times, for each endpoint, the old path (ORM instances ->
+pydantic validation -> json.dumps, as FastAPI does for a response_model)
+against the fast path (column tuples -> serialization.dumps). Both outputs
+are decoded and compared so the fast path is known to be byte-for-byte
+equivalent in content.
+
+    python -m benchmarks.serialization --rows 100000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def build_database(url, rows):
+    from sqlalchemy import create_engine, insert
+    from sqlalchemy.orm import sessionmaker
+    from database import Base
+    from models import User, Account, AccountBalance, AccountLedger
+
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    started = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(User), [{"id": 1, "first_name": "Bench", "last_name": "User", "email": "bench@example.com", "password_hash": "x"}])
+        conn.execute(insert(Account), [
+            {"id": i, "user_id": 1, "account_name": f"Account {i}", "account_type": "bank", "created_at": started}
+            for i in range(1, rows + 1)
+        ])
+        conn.execute(insert(AccountBalance), [
+            {"account_id": i, "balance": Decimal(i) / 100, "updated_at": started} for i in range(1, rows + 1)
+        ])
+        conn.execute(insert(AccountLedger), [
+            {
+                "account_id": i % 50 + 1,
+                "created_by": 1,
+                "amount": Decimal((i * 7919) % 200000 - 100000) / 100,
+                "category_id": None,
+                "narration": f"Synthetic entry {i}",
+                "transaction_date": started + timedelta(minutes=i),
+                "created_on": started,
+            }
+            for i in range(rows)
+        ])
+    return engine, sessionmaker(bind=engine)
+
+def ledger_old(db):
+    from pydantic import TypeAdapter
+    from models import AccountLedger
+    from schemas import LedgerPage
+    entries = db.query(AccountLedger).order_by(AccountLedger.transaction_date.desc(), AccountLedger.id.desc()).all()
+    adapter = TypeAdapter(LedgerPage)
+    page = adapter.validate_python({"items": entries, "next_cursor": None}, from_attributes=True)
+    return json.dumps(adapter.dump_python(page, mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def ledger_fast(db):
+    from sqlalchemy import select
+    from models import AccountLedger
+    from main import LEDGER_FIELDS
+    from serialization import dumps, rows_as_dicts
+    query = select(*[AccountLedger.__table__.c[name] for name in LEDGER_FIELDS]).order_by(
+        AccountLedger.transaction_date.desc(), AccountLedger.id.desc()
+    )
+    return dumps({"items": rows_as_dicts(LEDGER_FIELDS, db.execute(query)), "next_cursor": None})
+
+def accounts_old(db):
+    from typing import List
+    from pydantic import TypeAdapter
+    from sqlalchemy import func
+    from models import Account, AccountBalance
+    from schemas import AccountWithBalance
+    rows = db.query(Account, func.coalesce(AccountBalance.balance, 0)).outerjoin(
+        AccountBalance, AccountBalance.account_id == Account.id
+    ).all()
+    result = [AccountWithBalance(**{**account.__dict__, "balance": balance}) for account, balance in rows]
+    adapter = TypeAdapter(List[AccountWithBalance])
+    return json.dumps(adapter.dump_python(adapter.validate_python(result), mode="json"), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def accounts_fast(db):
+    from sqlalchemy import func, select
+    from models import Account, AccountBalance
+    from main import ACCOUNT_FIELDS
+    from serialization import dumps, rows_as_dicts
+    columns = [Account.__table__.c[name] for name in ACCOUNT_FIELDS if name != "balance"]
+    rows = db.execute(
+        select(*columns, func.coalesce(AccountBalance.balance, 0))
+        .outerjoin(AccountBalance, AccountBalance.account_id == Account.id)
+    ).all()
+    return dumps(rows_as_dicts(ACCOUNT_FIELDS, rows))
+
+def timed(session_factory, fn, repeat):
+    best = None
+    body = None
+    for _ in range(repeat):
+        db = session_factory()
+        try:
+            started = time.perf_counter()
+            body = fn(db)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list-response serialization paths")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3, help="best of this many runs per path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        # main.py builds its engine from DATABASE_URL at import time
+        os.environ.setdefault("DATABASE_URL", url)
+        engine, session_factory = build_database(url, args.rows)
+        print(f"{args.rows} rows, best of {args.repeat}")
+        print(f"{'endpoint':<10} {'path':<6} {'total s':>9} {'us/row':>8}")
+        for name, old, fast in (("ledger", ledger_old, ledger_fast), ("accounts", accounts_old, accounts_fast)):
+            old_seconds, old_body = timed(session_factory, old, args.repeat)
+            fast_seconds, fast_body = timed(session_factory, fast, args.repeat)
+            if json.loads(old_body) != json.loads(fast_body):
+                raise SystemExit(f"{name}: fast path output differs from the pydantic path")
+            for label, seconds in (("old", old_seconds), ("fast", fast_seconds)):
+                print(f"{name:<10} {label:<6} {seconds:>9.3f} {seconds / args.rows * 1e6:>8.2f}")
+            print(f"{name:<10} speedup {old_seconds / fast_seconds:.1f}x")
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Per-endpoint latency, throughput and queries-per-request.
+
+Starts `uvicorn main:app` against DATABASE_URL (load it with
+benchmarks.seed first), logs in as the seeded users and sends --requests
+requests to each endpoint at --concurrency. Reports p50/p95/p99 latency,
+requests/second and statements per request (from the Server-Timing header),
+and with --output writes the same numbers as JSON for
+`python -m benchmarks.compare`.
+
+    python -m benchmarks.seed --reset
+    python -m benchmarks.suite --concurrency 32 --requests 2000 --output before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+import httpx
+
+from benchmarks.common import BACKEND_DIR, percentile, running_server
+from benchmarks.seed import BENCH_PASSWORD, bench_email
+
+# name -> (method, path template, needs a request body)
+ENDPOINTS = {
+    "accounts": ("GET", "/accounts", False),
+    "account": ("GET", "/accounts/{account_id}", False),
+    "categories": ("GET", "/categories", False),
+    "ledger_page": ("GET", "/ledger?limit=50", False),
+    "ledger_by_account": ("GET", "/ledger?account_id={account_id}&limit=50", False),
+    "ledger_entry": ("GET", "/ledger/{ledger_id}", False),
+    "reports": ("GET", "/reports", False),
+    "create_ledger": ("POST", "/ledger", True),
+}
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+READ_ENDPOINTS = [name for name, (method, _, _) in ENDPOINTS.items() if method == "GET"]
+
+class BenchUser:
+    def __init__(self, token, account_id, category_id, ledger_id):
+        self.headers = {"Authorization": f"Bearer {token}"}
+        self.ids = {"account_id": account_id, "category_id": category_id, "ledger_id": ledger_id}
+
+async def prepare_users(client, count):
+    users = []
+    for n in range(1, count + 1):
+        response = await client.post("/login", json={"email": bench_email(n), "password": BENCH_PASSWORD})
+        if response.status_code == 401:
+            # Fewer users were seeded than requested
+            break
+        response.raise_for_status()
+        token = response.json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        accounts = (await client.get("/accounts", headers=headers)).json()
+        categories = (await client.get("/categories", headers=headers)).json()
+        entries = (await client.get("/ledger?limit=1", headers=headers)).json()["items"]
+        if not accounts or not entries:
+            continue
+        users.append(BenchUser(
+            token,
+            accounts[0]["id"],
+            categories[0]["id"] if categories else None,
+            entries[0]["id"],
+        ))
+    if not users:
+        raise SystemExit("no seeded users with ledger data; run python -m benchmarks.seed first")
+    return users
+
+def query_count(server_timing):
+    # db;dur=1.23;desc="4 queries", app;dur=5.67
+    match = SERVER_TIMING_QUERIES.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+def request_for(name, user, n):
+    method, template, has_body = ENDPOINTS[name]
+    body = None
+    if has_body:
+        body = {
+            "account_id": user.ids["account_id"],
+            "amount": f"{n % 500 + 1}.25",
+            "category_id": user.ids["category_id"],
+            "narration": f"benchmark {n}",
+            "transaction_date": "2024-06-15T12:00:00",
+        }
+    return method, template.format(**user.ids), body
+
+async def run_endpoint(client, name, users, total, concurrency):
+    latencies = []
+    queries = []
+    errors = 0
+    issued = 0
+
+    async def worker():
+        nonlocal errors, issued
+        while issued < total:
+            n = issued
+            issued += 1
+            user = users[n % len(users)]
+            method, path, body = request_for(name, user, n)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, headers=user.headers, json=body)
+                if response.status_code >= 400:
+                    errors += 1
+                count = query_count(response.headers.get("server-timing"))
+                if count is not None:
+                    queries.append(count)
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+        "max_queries": max(queries) if queries else None,
+    }
+
+async def run_suite(url, args):
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60.0) as client:
+        users = await prepare_users(client, args.users)
+        results = {}
+        for name in args.endpoints:
+            if args.warmup:
+                await run_endpoint(client, name, users, args.warmup, min(args.concurrency, args.warmup))
+            results[name] = await run_endpoint(client, name, users, args.requests, args.concurrency)
+            print(format_row(name, results[name]))
+        return results
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain"], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+def dataset_summary():
+    from benchmarks.seed import engine
+    from sqlalchemy import func, select
+    from models import User, Account, Category, AccountLedger
+    with engine.connect() as conn:
+        counts = {
+            table.__tablename__: conn.execute(select(func.count()).select_from(table)).scalar()
+            for table in (User, Account, Category, AccountLedger)
+        }
+    return engine.dialect.name, counts
+
+def format_row(name, result):
+    queries = "-" if result["queries_per_request"] is None else f"{result['queries_per_request']:.1f}"
+    return (
+        f"{name:<18} {result['rps']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+        f"{result['p99_ms']:>9.2f} {queries:>8} {result['errors']:>7}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every endpoint against the seeded dataset")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=50, help="unmeasured requests per endpoint")
+    parser.add_argument("--users", type=int, default=10, help="seeded users to spread requests across")
+    parser.add_argument("--endpoints", nargs="+", default=READ_ENDPOINTS, choices=sorted(ENDPOINTS),
+                        help="defaults to every read endpoint; add create_ledger to include writes")
+    parser.add_argument("--async-endpoints", action="store_true", help="start the server with ASYNC_ENDPOINTS=1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    dialect, counts = dataset_summary()
+    commit, dirty = git_revision()
+    env = {"ASYNC_ENDPOINTS": "1" if args.async_endpoints else "0"}
+    print(f"{dialect}, {counts}, concurrency {args.concurrency}, {args.requests} requests per endpoint")
+    print(f"{'endpoint':<18} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'errors':>7}")
+    with running_server(["uvicorn", "main:app", "--log-level", "warning"], args.port, env) as url:
+        results = asyncio.run(run_suite(url, args))
+
+    if args.output:
+        report = {
+            "meta": {
+                "git_commit": commit,
+                "git_dirty": dirty,
+                "timestamp": datetime.now(timezone.utc).isoformat(),
+                "database": dialect,
+                "dataset": counts,
+                "concurrency": args.concurrency,
+                "requests_per_endpoint": args.requests,
+                "async_endpoints": args.async_endpoints,
+                "python": platform.python_version(),
+                "cpu_count": os.cpu_count(),
+            },
+            "endpoints": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f"Wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
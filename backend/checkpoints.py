@@ -0,0 +1,187 @@
+import argparse
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import Date, bindparam, cast, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import AccountLedger, AccountBalanceCheckpoint, LedgerRollup
+
+ZERO = Decimal('0')
+
+def _first_of_month(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+def apply_deltas(db: Session, deltas: dict):
+    """Shift checkpoints for {(account_id, month): net change}; call after adjust_balance so the
+    account's balance row lock serializes concurrent writers"""
+    by_account = {}
+    for (account_id, month), delta in deltas.items():
+        if delta:
+            months = by_account.setdefault(account_id, {})
+            months[month] = months.get(month, ZERO) + delta
+    # Accounts whose earliest change falls in the same month share one set of queries
+    by_first = {}
+    for account_id, months in by_account.items():
+        by_first.setdefault(min(months), {})[account_id] = months
+    for first, accounts in sorted(by_first.items()):
+        _shift_accounts(db, first, accounts)
+
+def _shift_accounts(db: Session, first: date, accounts: dict):
+    """Shift {account_id: {month: delta}} for accounts whose earliest changed month is first"""
+    account_ids = sorted(accounts)
+    table = AccountBalanceCheckpoint.__table__
+    existing = {}
+    for account_id, month, closing_balance in db.execute(
+        select(table.c.account_id, table.c.month, table.c.closing_balance)
+        .where(table.c.account_id.in_(account_ids), table.c.month >= first)
+    ):
+        existing.setdefault(account_id, {})[month] = closing_balance
+    # Closing balance before the earliest change, as it stands before this write
+    previous = (
+        select(table.c.account_id, func.max(table.c.month).label("month"))
+        .where(table.c.account_id.in_(account_ids), table.c.month < first)
+        .group_by(table.c.account_id)
+        .subquery()
+    )
+    bases = dict(db.execute(
+        select(table.c.account_id, table.c.closing_balance)
+        .join(previous, (table.c.account_id == previous.c.account_id) & (table.c.month == previous.c.month))
+    ).all())
+
+    updates = []
+    inserts = []
+    for account_id in account_ids:
+        months = accounts[account_id]
+        stored = existing.get(account_id, {})
+        base = bases.get(account_id) or ZERO
+        shift = ZERO
+        for month in sorted(set(stored) | set(months)):
+            # A back-dated change moves every later closing balance too
+            shift += months.get(month, ZERO)
+            if month in stored:
+                base = stored[month]
+                if shift:
+                    updates.append({"b_account_id": account_id, "b_month": month, "b_shift": shift})
+            else:
+                # First activity in this month: start from the previous closing balance
+                inserts.append({"account_id": account_id, "month": month, "closing_balance": base + shift})
+
+    if updates:
+        # Relative updates, so the rows only ever move by this write's own deltas
+        db.execute(
+            update(table)
+            .where(table.c.account_id == bindparam("b_account_id"), table.c.month == bindparam("b_month"))
+            .values(closing_balance=table.c.closing_balance + bindparam("b_shift")),
+            updates,
+        )
+    if inserts:
+        db.execute(insert(table), inserts)
+
+def rebuild(db: Session, account_id: Optional[int] = None) -> int:
+    """Recompute checkpoints from the monthly rollups with a running SUM window"""
+    monthly = (
+        select(
+            LedgerRollup.account_id,
+            LedgerRollup.month,
+            func.sum(LedgerRollup.income + LedgerRollup.expense).label("net"),
+        )
+        .group_by(LedgerRollup.account_id, LedgerRollup.month)
+    )
+    clear = delete(AccountBalanceCheckpoint)
+    if account_id is not None:
+        monthly = monthly.where(LedgerRollup.account_id == account_id)
+        clear = clear.where(AccountBalanceCheckpoint.account_id == account_id)
+    monthly = monthly.subquery()
+    running = select(
+        monthly.c.account_id,
+        monthly.c.month,
+        func.sum(monthly.c.net).over(partition_by=monthly.c.account_id, order_by=monthly.c.month),
+    )
+    db.execute(clear)
+    result = db.execute(insert(AccountBalanceCheckpoint).from_select(["account_id", "month", "closing_balance"], running))
+    db.commit()
+    return result.rowcount
+
+def balance_as_of(db: Session, account_id: int, as_of: date) -> Decimal:
+    """Closing balance of as_of: nearest earlier checkpoint plus this month's entries up to that day"""
+    month = _first_of_month(as_of)
+    checkpoint = db.execute(
+        select(AccountBalanceCheckpoint.closing_balance)
+        .where(AccountBalanceCheckpoint.account_id == account_id, AccountBalanceCheckpoint.month < month)
+        .order_by(AccountBalanceCheckpoint.month.desc())
+        .limit(1)
+    ).scalar()
+    # Months between that checkpoint and this one had no activity, or they would have a checkpoint
+    month_to_date = db.execute(
+        select(func.coalesce(func.sum(AccountLedger.amount), 0)).where(
+            AccountLedger.account_id == account_id,
+            AccountLedger.transaction_date >= datetime.combine(month, datetime.min.time()),
+            AccountLedger.transaction_date < datetime.combine(as_of + timedelta(days=1), datetime.min.time()),
+        )
+    ).scalar()
+    return Decimal(checkpoint or 0) + Decimal(month_to_date or 0)
+
+def _day(db: Session, column):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, Date)
+
+def _period_end(day: date, interval: str, end: date) -> date:
+    if interval == "week":
+        # Weeks end on Sunday
+        return min(day + timedelta(days=6 - day.weekday()), end)
+    if interval == "month":
+        following = date(day.year + day.month // 12, day.month % 12 + 1, 1)
+        return min(following - timedelta(days=1), end)
+    return day
+
+def balance_history(db: Session, account_id: int, start: date, end: date, interval: str = "day") -> list:
+    """Closing balance at the end of every day/week/month in [start, end]"""
+    opening = balance_as_of(db, account_id, start - timedelta(days=1))
+    day = _day(db, AccountLedger.transaction_date)
+    daily = (
+        select(day.label("day"), func.sum(AccountLedger.amount).label("net"))
+        .where(
+            AccountLedger.account_id == account_id,
+            AccountLedger.transaction_date >= datetime.combine(start, datetime.min.time()),
+            AccountLedger.transaction_date < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+        )
+        .group_by(day)
+        .subquery()
+    )
+    # Running total over the active days; days without entries carry the previous value forward
+    rows = db.execute(
+        select(daily.c.day, func.sum(daily.c.net).over(order_by=daily.c.day)).order_by(daily.c.day)
+    ).all()
+    running = {}
+    for active_day, total in rows:
+        if isinstance(active_day, str):
+            active_day = date.fromisoformat(active_day)
+        running[active_day] = opening + Decimal(total)
+
+    points = []
+    balance = opening
+    current = start
+    while current <= end:
+        period_end = _period_end(current, interval, end)
+        while current <= period_end:
+            balance = running.get(current, balance)
+            current += timedelta(days=1)
+        points.append({"date": period_end, "balance": balance})
+    return points
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild monthly balance checkpoints from the ledger rollups")
+    parser.add_argument("--account-id", type=int, help="only rebuild this account's checkpoints")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db, args.account_id)
+    finally:
+        db.close()
+    print(f"Rebuilt {count} checkpoint row(s).")
+
+if __name__ == "__main__":
+    main()
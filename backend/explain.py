@@ -0,0 +1,73 @@
+import argparse
+from datetime import datetime, timedelta
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from database import engine, SessionLocal
+from models import Category
+from ownership import owned_ledger_clause
+from main import accounts_query, ledger_query
+
+def endpoint_queries(user_id: int, account_id: int, category_id: int):
+    """The statements the main endpoints in main.py run, built by the same helpers"""
+    since = datetime.utcnow() - timedelta(days=90)
+    ownership = owned_ledger_clause(user_id)
+    db = SessionLocal()
+    try:
+        return [
+            ("GET /accounts", accounts_query(user_id)),
+            ("GET /categories", select(Category).where(Category.user_id == user_id)),
+            ("GET /ledger", ledger_query(db, ownership)),
+            ("GET /ledger?account_id&start_date", ledger_query(db, ownership, account_id=account_id, start_date=since)),
+            ("GET /ledger?category_id", ledger_query(db, ownership, category_id=category_id)),
+        ]
+    finally:
+        db.close()
+
+def session_sql(statement):
+    """SQL and parameters a Session sends for statement, including ORM criteria such as the
+    soft-deleted account filter that compiling the statement alone leaves out"""
+    captured = []
+
+    def capture(conn, cursor, sql, parameters, context, executemany):
+        captured.append((sql, parameters))
+
+    db = SessionLocal()
+    event.listen(Engine, "before_cursor_execute", capture)
+    try:
+        db.execute(statement)
+    finally:
+        event.remove(Engine, "before_cursor_execute", capture)
+        db.close()
+    return captured[-1]
+
+def explain(statement):
+    sql, parameters = session_sql(statement)
+    prefix = "EXPLAIN QUERY PLAN " if engine.dialect.name == "sqlite" else "EXPLAIN "
+    with engine.connect() as conn:
+        rows = conn.exec_driver_sql(prefix + sql, parameters).all()
+    # SQLite returns (id, parent, notused, detail); PostgreSQL returns one text column per plan line
+    return [row[-1] for row in rows]
+
+def main():
+    parser = argparse.ArgumentParser(description="Print query plans for the main endpoints")
+    parser.add_argument("--user-id", type=int, default=1)
+    parser.add_argument("--account-id", type=int, default=1)
+    parser.add_argument("--category-id", type=int, default=1)
+    args = parser.parse_args()
+
+    full_scans = []
+    for name, statement in endpoint_queries(args.user_id, args.account_id, args.category_id):
+        print(f"== {name}")
+        plan = explain(statement)
+        for line in plan:
+            print(f"   {line}")
+        if any("Seq Scan" in line or line.startswith("SCAN ") for line in plan):
+            full_scans.append(name)
+    if full_scans:
+        # Small tables legitimately seq-scan; rerun after ANALYZE on realistic data before acting on this
+        print(f"Full table scans in: {', '.join(full_scans)}")
+    else:
+        print("All endpoint queries use index scans.")
+
+if __name__ == "__main__":
+    main()
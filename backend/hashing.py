@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+import bcrypt
+from fastapi import HTTPException, status
+
+def _available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# bcrypt work factor for new hashes; existing hashes at another cost are upgraded on the next login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# 0 hashes inline in the request thread (useful for tests and single-core boxes)
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", str(_available_cores())))
+# Hash jobs allowed in flight (running + queued) before new ones are rejected with 503
+HASH_QUEUE_LIMIT = int(os.getenv("HASH_QUEUE_LIMIT", str(max(HASH_WORKERS, 1) * 4)))
+HASH_RETRY_AFTER_SECONDS = int(os.getenv("HASH_RETRY_AFTER_SECONDS", "1"))
+
+_executor = None
+_executor_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(HASH_QUEUE_LIMIT)
+
+def _hashpw(password: bytes, rounds: int) -> bytes:
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+
+def _checkpw(password: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(password, hashed)
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn, not fork: the API process is multi-threaded by the time the first hash runs
+                _executor = ProcessPoolExecutor(
+                    max_workers=HASH_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _executor
+
+def _run(fn, *args):
+    """Run a bcrypt call in the hashing pool, or reject it if the pool is saturated"""
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent sign-in requests, please retry",
+            headers={"Retry-After": str(HASH_RETRY_AFTER_SECONDS)},
+        )
+    try:
+        if HASH_WORKERS <= 0:
+            return fn(*args)
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+def hash_password(password: str) -> str:
+    return _run(_hashpw, password.encode('utf-8'), BCRYPT_ROUNDS).decode('utf-8')
+
+def check_password(password: str, hashed: str) -> bool:
+    return _run(_checkpw, password.encode('utf-8'), hashed.encode('utf-8'))
+
+def needs_rehash(hashed: str) -> bool:
+    """True when a stored hash was made with a different work factor than BCRYPT_ROUNDS"""
+    # bcrypt hashes look like $2b$12$<salt+digest>
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def shutdown():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
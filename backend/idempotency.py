@@ -0,0 +1,124 @@
+"""Idempotency-Key support for the create endpoints.
+
+The key row is inserted at the start of the request's own transaction and its response is
+stored just before that transaction commits. A retry that arrives later replays the stored
+response; a duplicate that arrives while the original is still running blocks on the key's
+unique index until the original commits (then replays) or rolls back (then runs itself).
+"""
+import argparse
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Optional, Union
+from fastapi import Header, HTTPException, Response, status
+from pydantic import BaseModel, TypeAdapter
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import IdempotencyKey
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+MAX_KEY_LENGTH = 255
+
+class Idempotency:
+    """One request's Idempotency-Key; every method is a no-op when the header was not sent"""
+
+    def __init__(self, key: Optional[str]):
+        self.key = key
+        self.user_id = None
+
+    def replay(self, db: Session, user_id: int, operation: str, payload: Union[BaseModel, str]) -> Optional[Response]:
+        """Claim the key, or return the stored response of the request that already claimed it"""
+        if self.key is None:
+            return None
+        body = payload if isinstance(payload, str) else payload.model_dump_json()
+        request_hash = hashlib.sha256(f"{operation}:{body}".encode("utf-8")).hexdigest()
+        now = datetime.utcnow()
+        db.execute(delete(IdempotencyKey).where(
+            IdempotencyKey.user_id == user_id,
+            IdempotencyKey.key == self.key,
+            IdempotencyKey.expires_at <= now,
+        ))
+        if _claim(db, user_id, self.key, request_hash, now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS)):
+            self.user_id = user_id
+            return None
+
+        stored = db.execute(
+            select(IdempotencyKey.request_hash, IdempotencyKey.status_code, IdempotencyKey.response_body)
+            .where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == self.key)
+        ).first()
+        if stored is None or stored.status_code is None:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A request with this Idempotency-Key is still in progress")
+        if stored.request_hash != request_hash:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request",
+            )
+        return Response(
+            content=stored.response_body,
+            status_code=stored.status_code,
+            media_type="application/json",
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+    def save(self, db: Session, response_type, value, status_code: int = status.HTTP_201_CREATED):
+        """Validate the handler's result against its response model and store it with the key; call before commit"""
+        adapter = TypeAdapter(response_type)
+        result = adapter.validate_python(value, from_attributes=True)
+        if self.user_id is not None:
+            db.execute(
+                update(IdempotencyKey)
+                .where(IdempotencyKey.user_id == self.user_id, IdempotencyKey.key == self.key)
+                .values(status_code=status_code, response_body=adapter.dump_json(result).decode("utf-8"))
+            )
+        return result
+
+def _claim(db: Session, user_id: int, key: str, request_hash: str, expires_at: datetime) -> bool:
+    values = dict(user_id=user_id, key=key, request_hash=request_hash, expires_at=expires_at)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        # Waits on an uncommitted duplicate, so concurrent retries run one at a time
+        result = db.execute(dialect_insert(IdempotencyKey).values(**values).on_conflict_do_nothing())
+        return result.rowcount == 1
+    try:
+        with db.begin_nested():
+            db.execute(insert(IdempotencyKey).values(**values))
+        return True
+    except IntegrityError:
+        return False
+
+def upload_fingerprint(stream, **fields) -> str:
+    """Stands in for the JSON body of a multipart request: the file's digest plus the form fields"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(1024 * 1024), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return json.dumps({"file": digest.hexdigest(), **fields}, sort_keys=True, default=str)
+
+def idempotency_key(idempotency_key: Optional[str] = Header(None, max_length=MAX_KEY_LENGTH)) -> Idempotency:
+    return Idempotency((idempotency_key or "").strip() or None)
+
+def purge_expired(db: Session) -> int:
+    result = db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at <= datetime.utcnow()))
+    db.commit()
+    return result.rowcount
+
+def main():
+    parser = argparse.ArgumentParser(description="Delete expired idempotency keys")
+    parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        count = purge_expired(db)
+    finally:
+        db.close()
+    print(f"Deleted {count} expired idempotency key(s).")
+
+if __name__ == "__main__":
+    main()
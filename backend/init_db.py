@@ -1,31 +1,60 @@
-from database import engine, Base
-from models import User, Account, Category, AccountLedger
+import os
+import random
 import time
+from sqlalchemy.exc import OperationalError
+from database import engine
+from migrations import LATEST_VERSION, current_version, upgrade
+from partitions import is_partitioned, ensure_future_partitions
 
-def init_db():
-    """Create all database tables"""
-    print("Waiting for database to be ready...")
-    max_retries = 30
-    retry_count = 0
-    
-    while retry_count < max_retries:
+# Give up waiting for the database after this many seconds
+DB_READY_TIMEOUT = float(os.getenv("DB_READY_TIMEOUT", "60"))
+DB_READY_MAX_DELAY = 2.0
+
+def wait_for_database(bind=engine, timeout: float = DB_READY_TIMEOUT) -> float:
+    """Retry connecting with exponential backoff (50 ms doubling up to 2 s); returns seconds waited"""
+    started = time.perf_counter()
+    delay = 0.05
+    attempt = 0
+    while True:
+        attempt += 1
         try:
-            # Try to connect
-            conn = engine.connect()
-            conn.close()
-            print("Database connection successful!")
-            break
-        except Exception as e:
-            retry_count += 1
-            if retry_count >= max_retries:
-                print(f"Failed to connect to database after {max_retries} attempts")
+            with bind.connect():
+                return time.perf_counter() - started
+        except OperationalError:
+            elapsed = time.perf_counter() - started
+            if elapsed + delay > timeout:
+                print(f"Failed to connect to database after {attempt} attempts ({elapsed:.1f}s)")
                 raise
-            print(f"Waiting for database... ({retry_count}/{max_retries})")
-            time.sleep(2)
-    
-    print("Creating database tables...")
-    Base.metadata.create_all(bind=engine)
-    print("Database tables created successfully!")
+            # Jitter keeps a fleet of starting pods from retrying in lockstep
+            pause = delay * random.uniform(0.5, 1.0)
+            print(f"Waiting for database... (attempt {attempt}, retrying in {pause:.2f}s)")
+            time.sleep(pause)
+            delay = min(delay * 2, DB_READY_MAX_DELAY)
+
+def ensure_schema(bind=engine) -> list:
+    """Apply pending migrations; only reads schema_migrations when the schema is already current"""
+    if current_version(bind) >= LATEST_VERSION:
+        return []
+    return upgrade(bind)
+
+def ensure_partitions(bind=engine) -> list:
+    """Create upcoming ledger partitions when account_ledger is partitioned"""
+    return ensure_future_partitions(bind) if is_partitioned(bind) else []
+
+def init_db():
+    """Bring the database schema up to the latest migration"""
+    print("Waiting for database to be ready...")
+    waited = wait_for_database()
+    print(f"Database connection successful after {waited:.2f}s!")
+
+    applied = ensure_schema()
+    if applied:
+        print(f"Applied {len(applied)} migration(s); schema is up to date!")
+    else:
+        print(f"Schema already at version {LATEST_VERSION}; nothing to apply.")
+
+    if is_partitioned(engine):
+        print(f"Created {len(ensure_partitions())} upcoming ledger partition(s).")
 
 if __name__ == "__main__":
     init_db()
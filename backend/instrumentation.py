@@ -0,0 +1,91 @@
+import time
+from database import (
+    RequestQueryStats, current_query_stats, sql_logger, engine, async_engine, replica_set, N_PLUS_ONE_THRESHOLD,
+    InstrumentedPoolMixin,
+)
+from metrics import COUNT_BUCKETS, CounterFamily, HistogramFamily, render_histogram
+
+request_seconds = HistogramFamily("http_request_duration_seconds", "Request latency by route", "route")
+request_db_seconds = HistogramFamily("http_request_db_seconds", "Database time spent per request by route", "route")
+request_queries = HistogramFamily("http_request_db_queries", "SQL statements run per request by route", "route", COUNT_BUCKETS)
+slow_queries = CounterFamily("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS by route", "route")
+n_plus_one = CounterFamily("db_repeated_statement_warnings_total", "Requests that repeated one statement more than N_PLUS_ONE_THRESHOLD times", "route")
+
+def route_label(scope) -> str:
+    # The route template, not the raw path, so ids don't explode the label set
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return f"{scope['method']} {path}"
+
+class RouteQueryStats(RequestQueryStats):
+    def __init__(self, scope):
+        super().__init__()
+        self.scope = scope
+
+    @property
+    def route(self) -> str:
+        # Routing updates the shared scope dict in place, so this resolves once the router has matched
+        return route_label(self.scope)
+
+def server_timing(stats: RequestQueryStats, started: float) -> bytes:
+    total_ms = (time.perf_counter() - started) * 1000
+    return (
+        f'db;dur={stats.seconds * 1000:.2f};desc="{stats.count} queries", app;dur={total_ms:.2f}'
+    ).encode("latin-1")
+
+class QueryMetricsMiddleware:
+    """Counts statements and DB time per request, reports them in Server-Timing and /metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RouteQueryStats(scope)
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", server_timing(stats, started))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+            label = stats.route
+            request_seconds.labels(label).observe(time.perf_counter() - started)
+            request_db_seconds.labels(label).observe(stats.seconds)
+            request_queries.labels(label).observe(stats.count)
+            if stats.slow:
+                slow_queries.inc(label, stats.slow)
+            repeated = stats.repeated_statements()
+            if repeated:
+                n_plus_one.inc(label)
+                for statement, count in repeated:
+                    sql_logger.warning(
+                        "possible N+1: %s ran one statement %d times (threshold %d): %s",
+                        label, count, N_PLUS_ONE_THRESHOLD, statement,
+                    )
+
+def render_metrics() -> str:
+    lines = []
+    for family in (request_seconds, request_db_seconds, request_queries, slow_queries, n_plus_one):
+        lines.extend(family.render())
+    lines.append("# HELP db_pool_checkout_wait_seconds Time spent waiting for a pooled connection")
+    lines.append("# TYPE db_pool_checkout_wait_seconds histogram")
+    engines = {"sync": engine}
+    if async_engine is not None:
+        engines["async"] = async_engine.sync_engine
+    for replica in replica_set.replicas if replica_set is not None else []:
+        engines[replica.name] = replica.engine
+        if replica.async_engine is not None:
+            engines[f"{replica.name}_async"] = replica.async_engine.sync_engine
+    for name, target in engines.items():
+        if isinstance(target.pool, InstrumentedPoolMixin):
+            lines.extend(render_histogram("db_pool_checkout_wait_seconds", {"engine": name}, target.pool.stats.checkout_wait))
+    if replica_set is not None:
+        lines.extend(replica_set.render_metrics())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,305 @@
+"""Durable background jobs stored in the jobs table.
+
+Endpoints enqueue a job in the same transaction as the rest of their request and answer
+202 Accepted with its status URL. Workers (`python jobs.py worker`, as many as needed) claim
+queued jobs with SELECT ... FOR UPDATE SKIP LOCKED, so each job goes to exactly one of them
+without workers blocking each other. A job's work and its "succeeded" status commit together;
+a failure is retried with exponential backoff until max_attempts, and a job whose worker
+stops heartbeating is put back in the queue.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import Header, HTTPException, Response, status
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Job
+from schemas import JobResponse
+
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+JOB_RETRY_MAX_SECONDS = float(os.getenv("JOB_RETRY_MAX_SECONDS", "600"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1"))
+# A running job whose lock is older than this is assumed orphaned; workers refresh it a few times per period
+JOB_LOCK_TIMEOUT_SECONDS = float(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", "300"))
+JOB_RETENTION_DAYS = int(os.getenv("JOB_RETENTION_DAYS", "7"))
+MAX_ERROR_LENGTH = 2000
+
+logger = logging.getLogger("elephant_book.jobs")
+
+def enqueue(db: Session, user_id: int, kind: str, payload: dict, max_attempts: int = JOB_MAX_ATTEMPTS) -> Job:
+    """Add a job inside the caller's transaction; workers see it once that commits"""
+    job = Job(
+        user_id=user_id,
+        kind=kind,
+        payload=json.dumps(payload),
+        status="queued",
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=datetime.utcnow(),
+    )
+    db.add(job)
+    db.flush()
+    return job
+
+def describe(job: Job) -> JobResponse:
+    return JobResponse(
+        id=job.id,
+        kind=job.kind,
+        status=job.status,
+        attempts=job.attempts,
+        max_attempts=job.max_attempts,
+        run_after=job.run_after,
+        created_at=job.created_at,
+        finished_at=job.finished_at,
+        result=json.loads(job.result) if job.result else None,
+        error=job.last_error,
+    )
+
+def accepted(job: Job) -> JSONResponse:
+    """202 response pointing the client at the job's status"""
+    return JSONResponse(
+        status_code=status.HTTP_202_ACCEPTED,
+        content=describe(job).model_dump(mode="json"),
+        headers={"Location": f"/jobs/{job.id}", "Preference-Applied": "respond-async"},
+    )
+
+def with_location(response: Response) -> Response:
+    """Point a replayed 202 (see idempotency.py) at the job's status, like the original response"""
+    if response.status_code == status.HTTP_202_ACCEPTED:
+        response.headers["Location"] = f"/jobs/{json.loads(response.body)['id']}"
+        response.headers["Preference-Applied"] = "respond-async"
+    return response
+
+def respond_async(prefer: Optional[str] = Header(None)) -> bool:
+    """True when the request sent `Prefer: respond-async` (RFC 7240)"""
+    if not prefer:
+        return False
+    return any(token.split(";", 1)[0].strip().lower() == "respond-async" for token in prefer.split(","))
+
+def retry_delay(attempts: int) -> float:
+    delay = min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+    # Jitter spreads out jobs that failed together, e.g. during a database restart
+    return delay * random.uniform(0.5, 1.0)
+
+def claim(db: Session, worker_id: str) -> Optional[tuple]:
+    """Lock the next due job for this worker; returns (id, user_id, kind, payload, attempts, max_attempts)"""
+    now = datetime.utcnow()
+    row = db.execute(
+        select(Job.id, Job.user_id, Job.kind, Job.payload, Job.attempts, Job.max_attempts)
+        .where(Job.status == "queued", Job.run_after <= now)
+        .order_by(Job.run_after, Job.id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    ).first()
+    if row is None:
+        db.rollback()
+        return None
+    db.execute(
+        update(Job)
+        .where(Job.id == row.id)
+        .values(status="running", attempts=Job.attempts + 1, locked_by=worker_id, locked_at=now)
+    )
+    db.commit()
+    return (row.id, row.user_id, row.kind, json.loads(row.payload), row.attempts + 1, row.max_attempts)
+
+def requeue_stale(db: Session) -> int:
+    """Return running jobs whose worker stopped heartbeating to the queue, or fail them when out of attempts"""
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+    stale = (Job.status == "running", Job.locked_at < cutoff)
+    error = "worker stopped responding"
+    failed = db.execute(
+        update(Job)
+        .where(*stale, Job.attempts >= Job.max_attempts)
+        .values(status="failed", locked_by=None, locked_at=None, last_error=error, finished_at=datetime.utcnow())
+    ).rowcount
+    requeued = db.execute(
+        update(Job)
+        .where(*stale)
+        .values(status="queued", locked_by=None, locked_at=None, last_error=error, run_after=datetime.utcnow())
+    ).rowcount
+    db.commit()
+    return failed + requeued
+
+class _Heartbeat:
+    """Keeps a running job's lock fresh from a side thread"""
+
+    def __init__(self, job_id: int, worker_id: str):
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-{job_id}-heartbeat", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(JOB_LOCK_TIMEOUT_SECONDS / 3):
+            db = SessionLocal()
+            try:
+                db.execute(
+                    update(Job)
+                    .where(Job.id == self.job_id, Job.locked_by == self.worker_id)
+                    .values(locked_at=datetime.utcnow())
+                )
+                db.commit()
+            except Exception:
+                logger.exception("heartbeat for job %s failed", self.job_id)
+            finally:
+                db.close()
+
+def _finish(db: Session, job_id: int, worker_id: str, **values) -> bool:
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.locked_by == worker_id, Job.status == "running")
+        .values(locked_by=None, locked_at=None, **values)
+    )
+    return result.rowcount == 1
+
+def run_job(job: tuple, worker_id: str) -> str:
+    """Run a claimed job; returns its new status"""
+    from tasks import CLEANUP, HANDLERS
+    job_id, user_id, kind, payload, attempts, max_attempts = job
+    handler = HANDLERS.get(kind)
+    db = SessionLocal()
+    try:
+        try:
+            if handler is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"unknown job kind {kind!r}")
+            with _Heartbeat(job_id, worker_id):
+                result = handler(db, user_id, **payload)
+            # The work commits only if this worker still holds the job
+            if not _finish(db, job_id, worker_id, status="succeeded", result=json.dumps(result), finished_at=datetime.utcnow()):
+                db.rollback()
+                logger.warning("job %s was reclaimed by another worker; discarding this run", job_id)
+                return "reclaimed"
+            db.commit()
+            new_status = "succeeded"
+        except Exception as e:
+            db.rollback()
+            # 4xx HTTPExceptions are the same validation errors the inline endpoint would return: don't retry
+            permanent = isinstance(e, HTTPException) and e.status_code < 500
+            error = e.detail if isinstance(e, HTTPException) else f"{type(e).__name__}: {e}"
+            if permanent or attempts >= max_attempts:
+                new_status = "failed"
+                values = dict(status="failed", finished_at=datetime.utcnow())
+            else:
+                new_status = "queued"
+                values = dict(status="queued", run_after=datetime.utcnow() + timedelta(seconds=retry_delay(attempts)))
+            if not permanent:
+                logger.exception("job %s (%s) attempt %s/%s failed", job_id, kind, attempts, max_attempts)
+            _finish(db, job_id, worker_id, last_error=str(error)[:MAX_ERROR_LENGTH], **values)
+            db.commit()
+    finally:
+        db.close()
+    if new_status in ("succeeded", "failed") and kind in CLEANUP:
+        CLEANUP[kind](**payload)
+    return new_status
+
+def work(worker_id: Optional[str] = None, drain: bool = False) -> int:
+    """Claim and run jobs until SIGTERM/SIGINT (or, with drain, until none are due); returns jobs run"""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        logger.info("worker %s stopping after the current job", worker_id)
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    ran = 0
+    next_stale_check = 0.0
+    while not stopping.is_set():
+        db = SessionLocal()
+        try:
+            if time.monotonic() >= next_stale_check:
+                requeued = requeue_stale(db)
+                if requeued:
+                    logger.warning("requeued %s job(s) from unresponsive workers", requeued)
+                next_stale_check = time.monotonic() + JOB_LOCK_TIMEOUT_SECONDS / 3
+            job = claim(db, worker_id)
+        finally:
+            db.close()
+        if job is None:
+            if drain:
+                break
+            stopping.wait(JOB_POLL_INTERVAL_SECONDS)
+            continue
+        started = time.perf_counter()
+        new_status = run_job(job, worker_id)
+        ran += 1
+        logger.info("job %s (%s) %s in %.0f ms", job[0], job[2], new_status, (time.perf_counter() - started) * 1000)
+    return ran
+
+def retry(db: Session, job_id: int) -> bool:
+    """Queue a failed job again with a fresh set of attempts"""
+    result = db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "failed")
+        .values(status="queued", attempts=0, run_after=datetime.utcnow(), finished_at=None)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+def purge_finished(db: Session, days: int = JOB_RETENTION_DAYS) -> int:
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    result = db.execute(delete(Job).where(Job.status.in_(("succeeded", "failed")), Job.finished_at < cutoff))
+    db.commit()
+    return result.rowcount
+
+def main():
+    parser = argparse.ArgumentParser(description="Run and manage background jobs")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker = sub.add_parser("worker", help="claim and run queued jobs")
+    worker.add_argument("--drain", action="store_true", help="exit once no job is due instead of polling")
+    sub.add_parser("status", help="count jobs by kind and status")
+    retry_parser = sub.add_parser("retry", help="queue a failed job again")
+    retry_parser.add_argument("job_id", type=int)
+    purge = sub.add_parser("purge", help="delete finished jobs")
+    purge.add_argument("--older-than-days", type=int, default=JOB_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+        ran = work(drain=args.drain)
+        print(f"Ran {ran} job(s).")
+        return
+
+    db = SessionLocal()
+    try:
+        if args.command == "status":
+            rows = db.execute(
+                select(Job.kind, Job.status, func.count(), func.min(Job.run_after))
+                .group_by(Job.kind, Job.status)
+                .order_by(Job.kind, Job.status)
+            ).all()
+            for kind, job_status, count, oldest in rows:
+                print(f"{kind:20} {job_status:10} {count:8}  oldest due {oldest:%Y-%m-%d %H:%M:%S}")
+            if not rows:
+                print("No jobs.")
+        elif args.command == "retry":
+            if not retry(db, args.job_id):
+                raise SystemExit(f"Job {args.job_id} is not a failed job.")
+            print(f"Job {args.job_id} queued.")
+        else:
+            print(f"Deleted {purge_finished(db, args.older_than_days)} finished job(s).")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+from decimal import Decimal
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+from models import Account, Category, AccountLedger
+from balances import adjust_balances
+from rollups import RollupDeltas
+from ledger_rules import apply_category_sign
+from schemas import LedgerResponse
+from versions import bump_data_version
+
+class BatchError(ValueError):
+    pass
+
+def _contribution(entry):
+    return (entry.account_id, entry.category_id, entry.transaction_date, entry.amount)
+
+def apply_batch(db: Session, user_id: int, operations: list, atomic: bool) -> dict:
+    """Apply create/update/delete operations with one ownership query per table and bulk writes;
+    the caller commits (a rejected atomic batch is rolled back here)"""
+    target_ids = {op.id for op in operations if op.op in ('update', 'delete') and op.id is not None}
+    account_ids = {op.account_id for op in operations if op.account_id is not None}
+    category_ids = {op.category_id for op in operations if op.category_id is not None}
+
+    entries = {}
+    if target_ids:
+        entries = {
+            entry.id: entry
+            for entry in db.scalars(
+                select(AccountLedger)
+                .join(Account, Account.id == AccountLedger.account_id)
+                .where(AccountLedger.id.in_(target_ids), Account.user_id == user_id)
+            )
+        }
+    owned_accounts = set()
+    if account_ids:
+        owned_accounts = set(db.scalars(
+            select(Account.id).where(Account.id.in_(account_ids), Account.user_id == user_id)
+        ))
+    category_types = {}
+    if category_ids:
+        category_types = dict(db.execute(
+            select(Category.id, Category.category_type).where(Category.id.in_(category_ids), Category.user_id == user_id)
+        ).all())
+
+    results = []
+    created = []
+    deleted = set()
+    balance_deltas = {}
+    rollup_deltas = RollupDeltas()
+
+    def track(values, sign):
+        account_id, category_id, transaction_date, amount = values
+        balance_deltas[account_id] = balance_deltas.get(account_id, Decimal('0')) + sign * amount
+        rollup_deltas.add(user_id, account_id, category_id, transaction_date, amount, sign)
+
+    for index, op in enumerate(operations):
+        result = {"index": index, "op": op.op, "ok": True, "id": op.id}
+        try:
+            if op.op == 'create':
+                entry = _build_entry(op, user_id, owned_accounts, category_types)
+                created.append((result, entry))
+                track(_contribution(entry), 1)
+            else:
+                if op.id is None:
+                    raise BatchError("id is required")
+                entry = entries.get(op.id)
+                if entry is None or op.id in deleted:
+                    raise BatchError("Ledger entry not found")
+                if op.op == 'update':
+                    old_values = _contribution(entry)
+                    _update_entry(entry, op, owned_accounts, category_types)
+                    track(old_values, -1)
+                    track(_contribution(entry), 1)
+                    result["entry"] = entry
+                else:
+                    deleted.add(op.id)
+                    track(_contribution(entry), -1)
+        except BatchError as e:
+            result.update(ok=False, error=str(e))
+        results.append(result)
+
+    if atomic and not all(result["ok"] for result in results):
+        db.rollback()
+        for result in results:
+            result.pop("entry", None)
+        return {"applied": False, "results": results}
+
+    if created:
+        # On PostgreSQL the unit of work sends these as multi-row INSERT ... RETURNING
+        db.add_all([entry for _, entry in created])
+    if deleted:
+        for entry_id in deleted:
+            db.expunge(entries[entry_id])
+        db.execute(delete(AccountLedger).where(AccountLedger.id.in_(deleted)))
+    # Flushes created rows and updated rows (one executemany per column set)
+    db.flush()
+    for result, entry in created:
+        result.update(id=entry.id, entry=entry)
+    # Re-read the written rows in one query so responses carry the stored values, and serialize
+    # them before commit expires the objects, which would cost a refresh per row
+    written = [result["entry"].id for result in results if result.get("entry") is not None]
+    if written:
+        stored = {
+            entry.id: entry
+            for entry in db.scalars(
+                select(AccountLedger).where(AccountLedger.id.in_(written)).execution_options(populate_existing=True)
+            )
+        }
+        for result in results:
+            if result.get("entry") is not None:
+                result["entry"] = LedgerResponse.model_validate(stored[result["entry"].id])
+    adjust_balances(db, balance_deltas)
+    rollup_deltas.apply(db)
+    bump_data_version(db, user_id)
+    return {"applied": True, "results": results}
+
+def _build_entry(op, user_id, owned_accounts, category_types) -> AccountLedger:
+    if op.account_id is None or op.amount is None or op.transaction_date is None:
+        raise BatchError("account_id, amount and transaction_date are required")
+    if op.account_id not in owned_accounts:
+        raise BatchError("Account not found")
+    amount = op.amount
+    if op.category_id:
+        if op.category_id not in category_types:
+            raise BatchError("Category not found")
+        amount = apply_category_sign(amount, category_types[op.category_id])
+    return AccountLedger(
+        account_id=op.account_id,
+        created_by=user_id,
+        amount=amount,
+        category_id=op.category_id,
+        narration=op.narration,
+        transaction_date=op.transaction_date,
+    )
+
+def _update_entry(entry, op, owned_accounts, category_types):
+    """Same rules as PUT /ledger/{id}; validates everything before touching the entry"""
+    if op.account_id is not None and op.account_id not in owned_accounts:
+        raise BatchError("Account not found")
+    if op.category_id is not None and op.category_id not in category_types:
+        raise BatchError("Category not found")
+
+    if op.account_id is not None:
+        entry.account_id = op.account_id
+    if op.category_id is not None:
+        entry.category_id = op.category_id
+        if op.amount is not None:
+            entry.amount = apply_category_sign(op.amount, category_types[op.category_id])
+    elif op.amount is not None:
+        entry.amount = op.amount
+    if op.narration is not None:
+        entry.narration = op.narration
+    if op.transaction_date is not None:
+        entry.transaction_date = op.transaction_date
@@ -0,0 +1,92 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterator
+from sqlalchemy import select
+from database import SessionLocal
+from models import AccountLedger
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_FETCH_SIZE = 2000
+# Bytes buffered before a chunk is handed to the response
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = (
+    AccountLedger.id,
+    AccountLedger.account_id,
+    AccountLedger.category_id,
+    AccountLedger.amount,
+    AccountLedger.narration,
+    AccountLedger.transaction_date,
+    AccountLedger.created_by,
+    AccountLedger.created_on,
+)
+EXPORT_FIELDS = [column.key for column in EXPORT_COLUMNS]
+
+MEDIA_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+def export_statement(*clauses):
+    return select(*EXPORT_COLUMNS).where(*clauses).order_by(
+        AccountLedger.transaction_date.desc(), AccountLedger.id.desc()
+    )
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        # Exact string form rather than a float
+        return str(value)
+    return value
+
+def _csv_lines(rows) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        writer.writerow([_format_value(value) for value in row])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def _ndjson_lines(rows) -> Iterator[str]:
+    parts = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(EXPORT_FIELDS, map(_format_value, row))), separators=(",", ":")) + "\n"
+        parts.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(parts)
+            parts, size = [], 0
+    yield "".join(parts)
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+def stream_export(statement, fmt: str, gzip: bool, bind=None) -> Iterator[bytes]:
+    """Yield the encoded export, reading rows through a server-side cursor"""
+    def encoded():
+        # The request's session is closed before a streaming body is sent, so use our own
+        db = SessionLocal(bind=bind) if bind is not None else SessionLocal()
+        try:
+            result = db.execute(statement.execution_options(stream_results=True, yield_per=EXPORT_FETCH_SIZE))
+            lines = _csv_lines(result) if fmt == "csv" else _ndjson_lines(result)
+            for text in lines:
+                if text:
+                    yield text.encode("utf-8")
+        finally:
+            db.close()
+    return _gzip(encoded()) if gzip else encoded()
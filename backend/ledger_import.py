@@ -0,0 +1,240 @@
+import csv
+import io
+import re
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, Iterator, Optional, Tuple
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from models import Account, Category, AccountLedger
+from balances import adjust_balances
+from rollups import RollupDeltas
+from ledger_rules import apply_category_sign, round_amount
+from versions import bump_data_version
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+# Largest magnitude account_ledger.amount (Numeric(10, 2)) can hold
+MAX_AMOUNT = Decimal("99999999.99")
+COPY_COLUMNS = ("account_id", "created_by", "amount", "category_id", "narration", "transaction_date", "created_on")
+
+DATE_FORMATS = ("%Y-%m-%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%d/%m/%Y", "%m/%d/%Y")
+CSV_ALIASES = {
+    "date": "transaction_date",
+    "description": "narration",
+    "memo": "narration",
+}
+OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<\r\n]*)")
+
+class RowError(ValueError):
+    pass
+
+# (row number, parsed fields or None, error message or None)
+ParsedRow = Tuple[int, Optional[dict], Optional[str]]
+
+def parse_amount(raw: str) -> Decimal:
+    try:
+        amount = Decimal(raw.strip().replace(",", ""))
+    except (InvalidOperation, AttributeError):
+        raise RowError(f"invalid amount {raw!r}")
+    if not amount.is_finite() or abs(amount) > MAX_AMOUNT:
+        raise RowError(f"amount out of range {raw!r}")
+    return round_amount(amount)
+
+def parse_date(raw: str) -> datetime:
+    raw = (raw or "").strip()
+    try:
+        return datetime.fromisoformat(raw)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt)
+        except ValueError:
+            continue
+    raise RowError(f"invalid date {raw!r}")
+
+def parse_ofx_date(raw: str) -> datetime:
+    # OFX dates are YYYYMMDD[HHMMSS[.XXX]][[offset:TZ]]; the time part and zone are optional
+    digits = re.match(r"\d{8}(\d{6})?", raw.strip())
+    if not digits:
+        raise RowError(f"invalid date {raw!r}")
+    value = digits.group(0)
+    return datetime.strptime(value, "%Y%m%d%H%M%S" if len(value) == 14 else "%Y%m%d")
+
+def parse_optional_int(raw: Optional[str], field: str) -> Optional[int]:
+    if raw is None or not raw.strip():
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise RowError(f"invalid {field} {raw!r}")
+
+def iter_csv_rows(stream: io.TextIOBase, default_account_id: Optional[int]) -> Iterator[ParsedRow]:
+    reader = csv.DictReader(stream)
+    if reader.fieldnames is None:
+        return
+    reader.fieldnames = [CSV_ALIASES.get(name.strip().lower(), name.strip().lower()) for name in reader.fieldnames]
+    # Row 1 is the header line
+    for row_number, row in enumerate(reader, start=2):
+        try:
+            account_id = parse_optional_int(row.get("account_id"), "account_id") or default_account_id
+            if account_id is None:
+                raise RowError("account_id is required")
+            yield row_number, {
+                "account_id": account_id,
+                "amount": parse_amount(row.get("amount") or ""),
+                "category_id": parse_optional_int(row.get("category_id"), "category_id"),
+                "narration": (row.get("narration") or "").strip() or None,
+                "transaction_date": parse_date(row.get("transaction_date")),
+            }, None
+        except RowError as e:
+            yield row_number, None, str(e)
+
+def iter_ofx_rows(stream: io.TextIOBase, default_account_id: Optional[int]) -> Iterator[ParsedRow]:
+    """Stream <STMTTRN> records out of an OFX/QFX file (SGML or XML flavour)"""
+    current = None
+    row_number = 0
+    for line in stream:
+        for closing, tag, value in OFX_TAG.findall(line):
+            tag = tag.upper()
+            if tag == "STMTTRN":
+                if not closing:
+                    current = {}
+                    continue
+                row_number += 1
+                try:
+                    if default_account_id is None:
+                        raise RowError("account_id is required for OFX imports")
+                    narration = " - ".join(part for part in (current.get("NAME"), current.get("MEMO")) if part)
+                    yield row_number, {
+                        "account_id": default_account_id,
+                        "amount": parse_amount(current.get("TRNAMT", "")),
+                        "category_id": None,
+                        "narration": narration or None,
+                        "transaction_date": parse_ofx_date(current.get("DTPOSTED", "")),
+                    }, None
+                except RowError as e:
+                    yield row_number, None, str(e)
+                current = None
+            elif current is not None and not closing:
+                current[tag] = value.strip()
+
+def _batches(rows: Iterable[ParsedRow], size: int) -> Iterator[list]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def _copy_rows(db: Session, records: list):
+    """Load rows with COPY on the session's own connection so they share its transaction"""
+    driver_connection = db.connection().connection.driver_connection
+    with driver_connection.cursor() as cursor:
+        with cursor.copy(f"COPY {AccountLedger.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN") as copy:
+            for record in records:
+                copy.write_row(tuple(record[column] for column in COPY_COLUMNS))
+
+def _write_rows(db: Session, records: list):
+    bind = db.get_bind()
+    if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg":
+        _copy_rows(db, records)
+    else:
+        db.execute(insert(AccountLedger.__table__), records)
+
+def import_rows(db: Session, user_id: int, rows: Iterable[ParsedRow]) -> dict:
+    """Validate and bulk-insert parsed statement rows inside the caller's transaction"""
+    # Ownership is resolved once per distinct id across the whole file
+    owned_accounts = {}
+    category_types = {}
+    balance_deltas = {}
+    rollup_deltas = RollupDeltas()
+    errors = []
+    imported = 0
+    failed = 0
+    created_on = datetime.utcnow()
+
+    def record_error(row_number, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({"row": row_number, "error": message})
+
+    for batch in _batches(rows, BATCH_SIZE):
+        new_accounts = {fields["account_id"] for _, fields, _ in batch if fields} - owned_accounts.keys()
+        if new_accounts:
+            found = set(db.execute(
+                select(Account.id).where(Account.id.in_(new_accounts), Account.user_id == user_id)
+            ).scalars())
+            owned_accounts.update({account_id: account_id in found for account_id in new_accounts})
+        new_categories = {fields["category_id"] for _, fields, _ in batch if fields and fields["category_id"]} - category_types.keys()
+        if new_categories:
+            found = dict(db.execute(
+                select(Category.id, Category.category_type).where(Category.id.in_(new_categories), Category.user_id == user_id)
+            ).all())
+            category_types.update({category_id: found.get(category_id) for category_id in new_categories})
+
+        records = []
+        for row_number, fields, error in batch:
+            if error:
+                record_error(row_number, error)
+                continue
+            if not owned_accounts[fields["account_id"]]:
+                record_error(row_number, "Account not found")
+                continue
+            category_type = None
+            if fields["category_id"]:
+                category_type = category_types[fields["category_id"]]
+                if category_type is None:
+                    record_error(row_number, "Category not found")
+                    continue
+            amount = apply_category_sign(fields["amount"], category_type)
+            records.append({
+                **fields,
+                "amount": amount,
+                "created_by": user_id,
+                "created_on": created_on,
+            })
+            balance_deltas[fields["account_id"]] = balance_deltas.get(fields["account_id"], Decimal("0")) + amount
+            rollup_deltas.add(user_id, fields["account_id"], fields["category_id"], fields["transaction_date"], amount)
+
+        if records:
+            _write_rows(db, records)
+            imported += len(records)
+
+    adjust_balances(db, balance_deltas)
+    rollup_deltas.apply(db)
+    if imported:
+        bump_data_version(db, user_id)
+    return {
+        "imported": imported,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
+
+def detect_format(filename: Optional[str], requested: Optional[str]) -> Optional[str]:
+    if requested:
+        return requested.lower()
+    name = (filename or "").lower()
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ofx", ".qfx")):
+        return "ofx"
+    return None
+
+def import_statement(db: Session, user_id: int, binary_stream, fmt: str, default_account_id: Optional[int]) -> dict:
+    # Decode lazily so the upload is never held in memory as a whole
+    stream = io.TextIOWrapper(binary_stream, encoding="utf-8-sig", errors="replace", newline="")
+    if fmt == "csv":
+        rows = iter_csv_rows(stream, default_account_id)
+    else:
+        rows = iter_ofx_rows(stream, default_account_id)
+    try:
+        return import_rows(db, user_id, rows)
+    finally:
+        # Leave the underlying upload file for FastAPI to close
+        stream.detach()
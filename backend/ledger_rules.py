@@ -0,0 +1,19 @@
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from typing import Optional
+
+CENT = Decimal("0.01")
+
+def round_amount(amount: Decimal) -> Decimal:
+    """Round to the cent the way Numeric(10,2) stores it, so balances add exactly what the ledger keeps"""
+    try:
+        return amount.quantize(CENT, rounding=ROUND_HALF_UP)
+    except InvalidOperation:
+        raise ValueError("amount is out of range")
+
+def apply_category_sign(amount: Decimal, category_type: Optional[str]) -> Decimal:
+    """Expense: negative (debit), Income: positive (credit); uncategorised amounts keep their sign"""
+    if category_type == 'expense':
+        return -abs(amount)
+    if category_type == 'income':
+        return abs(amount)
+    return amount
@@ -1,25 +1,59 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, HTTPException, Query, File, Form, UploadFile, Request, Response, status
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime
+from sqlalchemy import func, select, and_
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 from decimal import Decimal
+import uuid
 
-from database import get_db
-from models import User, Account, Category, AccountLedger
+from database import get_db, pool_status, engine, async_engine, replica_set, ASYNC_ENDPOINTS
+from models import User, Account, Category, AccountLedger, AccountBalance, Job, RecurringRule
 from schemas import (
     UserCreate, UserResponse, LoginRequest, Token,
-    AccountCreate, AccountUpdate, AccountResponse, AccountWithBalance,
+    AccountCreate, AccountUpdate, AccountResponse, AccountWithBalance, AccountBalanceAsOf, BalanceHistory,
     CategoryCreate, CategoryUpdate, CategoryResponse,
-    LedgerCreate, LedgerUpdate, LedgerResponse,
-    TransferCreate
+    LedgerCreate, LedgerUpdate, LedgerResponse, LedgerPage, LedgerSearchPage, LedgerImportResult,
+    LedgerBatchRequest, LedgerBatchResponse,
+    TransferCreate, LedgerReport, JobResponse,
+    RecurringRuleCreate, RecurringRuleUpdate, RecurringRuleResponse
 )
-from auth import get_password_hash, verify_password, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES
-from datetime import timedelta
+from auth import (
+    get_password_hash, verify_password, password_needs_rehash, create_access_token, get_current_user,
+    auth_cache_stats, require_internal_token, Principal, ACCESS_TOKEN_EXPIRE_MINUTES
+)
+from balances import adjust_balance, move_balance
+import rollups
+import checkpoints
+from ledger_rules import apply_category_sign
+from ledger_import import detect_format, import_statement
+from ledger_export import MEDIA_TYPES, export_statement, stream_export
+from ledger_batch import apply_batch
+from ownership import OwnershipScope, get_ownership
+from pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, encode_ranked_cursor, seek_before, seek_ranked_before
+import search
+from versions import bump_data_version, conditional_get, conditional_get_dated
+from idempotency import Idempotency, idempotency_key, upload_fingerprint
+import jobs
+import tasks
+import recurring
+from serialization import json_response, rows_as_dicts
+import hashing
+from instrumentation import QueryMetricsMiddleware, render_metrics
 
 app = FastAPI(title="Elephant Book API")
 
+# List endpoints select these columns as plain tuples in response-model field order
+ACCOUNT_FIELDS = tuple(AccountWithBalance.model_fields)
+LEDGER_FIELDS = tuple(LedgerResponse.model_fields)
+# Longest balance-history range, about ten years of daily points
+MAX_HISTORY_DAYS = 3660
+
+@app.on_event("shutdown")
+def shutdown_hashing_pool():
+    hashing.shutdown()
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,6 +62,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-request SQL counts and DB time: Server-Timing header, /metrics, slow-query and N+1 logging
+app.add_middleware(QueryMetricsMiddleware)
 
 # Authentication endpoints
 @app.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
@@ -62,6 +98,10 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    # Upgrade hashes made under an older BCRYPT_ROUNDS while we still have the plaintext
+    if password_needs_rehash(user.password_hash):
+        user.password_hash = get_password_hash(login_data.password)
+        db.commit()
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
@@ -69,52 +109,101 @@ def login(login_data: LoginRequest, db: Session = Depends(get_db)):
     return {"access_token": access_token, "token_type": "bearer"}
 
 # Account endpoints
-@app.get("/accounts", response_model=List[AccountWithBalance])
-def get_accounts(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    accounts = db.query(Account).filter(Account.user_id == current_user.id).all()
-    result = []
-    for account in accounts:
-        balance = db.query(func.coalesce(func.sum(AccountLedger.amount), 0)).filter(
-            AccountLedger.account_id == account.id
-        ).scalar() or Decimal('0')
-        account_dict = {
-            **account.__dict__,
-            "balance": balance
-        }
-        result.append(AccountWithBalance(**account_dict))
-    return result
+def accounts_query(user_id: int):
+    """The GET /accounts statement; explain.py plans this same query"""
+    columns = [Account.__table__.c[name] for name in ACCOUNT_FIELDS if name != "balance"]
+    return (
+        select(*columns, func.coalesce(AccountBalance.balance, 0))
+        .outerjoin(AccountBalance, AccountBalance.account_id == Account.id)
+        # Plain table columns: the ORM soft-delete filter doesn't reach this statement
+        .where(Account.user_id == user_id, Account.deleted_at.is_(None))
+    )
+
+@app.get("/accounts", response_model=List[AccountWithBalance], dependencies=[Depends(conditional_get)])
+def get_accounts(response: Response, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    # Column tuples encoded straight to JSON; response_model only documents the shape
+    rows = db.execute(accounts_query(current_user.id)).all()
+    return json_response(rows_as_dicts(ACCOUNT_FIELDS, rows), response)
 
 @app.post("/accounts", response_model=AccountResponse, status_code=status.HTTP_201_CREATED)
-def create_account(account_data: AccountCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_account(account_data: AccountCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    replayed = idem.replay(db, current_user.id, "create_account", account_data)
+    if replayed is not None:
+        return replayed
     new_account = Account(
         user_id=current_user.id,
         account_name=account_data.account_name,
         account_type=account_data.account_type
     )
+    new_account.balance_row = AccountBalance(balance=Decimal('0'))
     db.add(new_account)
-    db.commit()
+    bump_data_version(db, current_user.id)
+    db.flush()
+    # Reload the stored values, so the first response and its replays match a later GET
     db.refresh(new_account)
-    return new_account
+    result = idem.save(db, AccountResponse, new_account)
+    db.commit()
+    return result
 
-@app.get("/accounts/{account_id}", response_model=AccountWithBalance)
-def get_account(account_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    account = db.query(Account).filter(
+@app.get("/accounts/{account_id}", response_model=AccountWithBalance, dependencies=[Depends(conditional_get)])
+def get_account(account_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    row = db.query(Account, func.coalesce(AccountBalance.balance, 0)).outerjoin(
+        AccountBalance, AccountBalance.account_id == Account.id
+    ).filter(
         Account.id == account_id,
         Account.user_id == current_user.id
     ).first()
-    if not account:
+    if not row:
         raise HTTPException(status_code=404, detail="Account not found")
-    balance = db.query(func.coalesce(func.sum(AccountLedger.amount), 0)).filter(
-        AccountLedger.account_id == account.id
-    ).scalar() or Decimal('0')
+    account, balance = row
     account_dict = {
         **account.__dict__,
         "balance": balance
     }
     return AccountWithBalance(**account_dict)
 
+def get_owned_account_id(account_id: int, db: Session, current_user: Principal) -> int:
+    owned = db.query(Account.id).filter(Account.id == account_id, Account.user_id == current_user.id).first()
+    if not owned:
+        raise HTTPException(status_code=404, detail="Account not found")
+    return account_id
+
+@app.get("/accounts/{account_id}/balance", response_model=AccountBalanceAsOf, dependencies=[Depends(conditional_get_dated)])
+def get_account_balance(
+    account_id: int,
+    as_of: Optional[date] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    get_owned_account_id(account_id, db, current_user)
+    as_of = as_of or date.today()
+    return {"account_id": account_id, "as_of": as_of, "balance": checkpoints.balance_as_of(db, account_id, as_of)}
+
+@app.get("/accounts/{account_id}/balance-history", response_model=BalanceHistory, dependencies=[Depends(conditional_get_dated)])
+def get_account_balance_history(
+    account_id: int,
+    start: date,
+    end: Optional[date] = None,
+    interval: str = Query('day', pattern='^(day|week|month)$'),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    end = end or date.today()
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days > MAX_HISTORY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {MAX_HISTORY_DAYS} days")
+    get_owned_account_id(account_id, db, current_user)
+    return {
+        "account_id": account_id,
+        "start": start,
+        "end": end,
+        "interval": interval,
+        "points": checkpoints.balance_history(db, account_id, start, end, interval),
+    }
+
 @app.put("/accounts/{account_id}", response_model=AccountResponse)
-def update_account(account_id: int, account_data: AccountUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_account(account_id: int, account_data: AccountUpdate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     account = db.query(Account).filter(
         Account.id == account_id,
         Account.user_id == current_user.id
@@ -127,30 +216,35 @@ def update_account(account_id: int, account_data: AccountUpdate, current_user: U
     if account_data.account_type is not None:
         account.account_type = account_data.account_type
     
+    bump_data_version(db, current_user.id)
     db.commit()
     db.refresh(account)
     return account
 
-@app.delete("/accounts/{account_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_account(account_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    account = db.query(Account).filter(
-        Account.id == account_id,
-        Account.user_id == current_user.id
-    ).first()
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-    db.delete(account)
+@app.delete("/accounts/{account_id}", status_code=status.HTTP_204_NO_CONTENT, responses={202: {"model": JobResponse}})
+def delete_account(account_id: int, background: bool = Depends(jobs.respond_async), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    get_owned_account_id(account_id, db, current_user)
+    if background:
+        # The account disappears now; a worker deletes its entries in chunks
+        tasks.soft_delete_account(db, current_user.id, account_id)
+        job = jobs.enqueue(db, current_user.id, "purge_account", {"account_id": account_id})
+        db.commit()
+        return jobs.accepted(job)
+    tasks.delete_account(db, current_user.id, account_id)
     db.commit()
     return None
 
 # Category endpoints
-@app.get("/categories", response_model=List[CategoryResponse])
-def get_categories(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.get("/categories", response_model=List[CategoryResponse], dependencies=[Depends(conditional_get)])
+def get_categories(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     categories = db.query(Category).filter(Category.user_id == current_user.id).all()
     return categories
 
 @app.post("/categories", response_model=CategoryResponse, status_code=status.HTTP_201_CREATED)
-def create_category(category_data: CategoryCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_category(category_data: CategoryCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    replayed = idem.replay(db, current_user.id, "create_category", category_data)
+    if replayed is not None:
+        return replayed
     if category_data.category_type not in ['income', 'expense']:
         raise HTTPException(status_code=400, detail="category_type must be 'income' or 'expense'")
     
@@ -160,12 +254,15 @@ def create_category(category_data: CategoryCreate, current_user: User = Depends(
         name=category_data.name
     )
     db.add(new_category)
-    db.commit()
+    bump_data_version(db, current_user.id)
+    db.flush()
     db.refresh(new_category)
-    return new_category
+    result = idem.save(db, CategoryResponse, new_category)
+    db.commit()
+    return result
 
-@app.get("/categories/{category_id}", response_model=CategoryResponse)
-def get_category(category_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.get("/categories/{category_id}", response_model=CategoryResponse, dependencies=[Depends(conditional_get)])
+def get_category(category_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     category = db.query(Category).filter(
         Category.id == category_id,
         Category.user_id == current_user.id
@@ -174,8 +271,8 @@ def get_category(category_id: int, current_user: User = Depends(get_current_user
         raise HTTPException(status_code=404, detail="Category not found")
     return category
 
-@app.put("/categories/{category_id}", response_model=CategoryResponse)
-def update_category(category_id: int, category_data: CategoryUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.put("/categories/{category_id}", response_model=CategoryResponse, responses={202: {"model": JobResponse}})
+def update_category(category_id: int, category_data: CategoryUpdate, background: bool = Depends(jobs.respond_async), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     category = db.query(Category).filter(
         Category.id == category_id,
         Category.user_id == current_user.id
@@ -183,58 +280,160 @@ def update_category(category_id: int, category_data: CategoryUpdate, current_use
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
     
+    type_changed = False
     if category_data.category_type is not None:
         if category_data.category_type not in ['income', 'expense']:
             raise HTTPException(status_code=400, detail="category_type must be 'income' or 'expense'")
+        type_changed = category.category_type != category_data.category_type
         category.category_type = category_data.category_type
     if category_data.name is not None:
         category.name = category_data.name
     
+    bump_data_version(db, current_user.id)
+    if type_changed:
+        # Existing entries take the sign of the new type
+        db.flush()
+        if background:
+            job = jobs.enqueue(db, current_user.id, "resign_category", {"category_id": category_id})
+            db.commit()
+            return jobs.accepted(job)
+        tasks.resign_category(db, current_user.id, category_id)
     db.commit()
     db.refresh(category)
     return category
 
 @app.delete("/categories/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_category(category_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_category(category_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
     category = db.query(Category).filter(
         Category.id == category_id,
         Category.user_id == current_user.id
     ).first()
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
+    rollups.uncategorise(db, category.id)
+    # ON DELETE SET NULL uncategorises its entries and recurring rules
     db.delete(category)
+    bump_data_version(db, current_user.id)
     db.commit()
     return None
 
 # Ledger endpoints
-@app.get("/ledger", response_model=List[LedgerResponse])
+def ledger_filters(db: Session, account_id, category_id, start_date, end_date, q=None):
+    """Optional filters shared by the ledger listing and export"""
+    clauses = []
+    if account_id:
+        clauses.append(AccountLedger.account_id == account_id)
+    if category_id:
+        clauses.append(AccountLedger.category_id == category_id)
+    if start_date:
+        clauses.append(AccountLedger.transaction_date >= start_date)
+    if end_date:
+        clauses.append(AccountLedger.transaction_date <= end_date)
+    if q and q.strip():
+        # Filter only; the listing stays in date order (see /ledger/search for ranked results)
+        clauses.append(search.match_clause(db, q.strip()))
+    return clauses
+
+def ledger_query(db: Session, ownership, account_id=None, category_id=None, start_date=None, end_date=None, q=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """The GET /ledger page statement, one row past limit; explain.py plans this same query"""
+    query = select(*[AccountLedger.__table__.c[name] for name in LEDGER_FIELDS]).where(ownership)
+    query = query.where(*ledger_filters(db, account_id, category_id, start_date, end_date, q))
+    if cursor:
+        query = query.where(seek_before(AccountLedger.transaction_date, AccountLedger.id, cursor))
+    # id breaks ties between entries on the same date so pages never overlap or skip rows
+    return query.order_by(AccountLedger.transaction_date.desc(), AccountLedger.id.desc()).limit(limit + 1)
+
+@app.get("/ledger", response_model=LedgerPage, dependencies=[Depends(conditional_get)])
 def get_ledger_entries(
+    response: Response,
     account_id: Optional[int] = None,
     category_id: Optional[int] = None,
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
-    current_user: User = Depends(get_current_user),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(None, max_length=search.MAX_QUERY_LENGTH),
+    scope: OwnershipScope = Depends(get_ownership),
     db: Session = Depends(get_db)
 ):
-    # Get user's account IDs
-    user_account_ids = [acc.id for acc in db.query(Account.id).filter(Account.user_id == current_user.id).all()]
+    query = ledger_query(db, scope.ledger_clause(), account_id, category_id, start_date, end_date, q, cursor, limit)
+    entries = rows_as_dicts(LEDGER_FIELDS, db.execute(query))
     
-    query = db.query(AccountLedger).filter(AccountLedger.account_id.in_(user_account_ids))
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        next_cursor = encode_cursor(last["transaction_date"], last["id"])
+    return json_response({"items": entries, "next_cursor": next_cursor}, response)
+
+@app.get("/ledger/export")
+def export_ledger_entries(
+    request: Request,
+    format: str = Query('csv', pattern='^(csv|ndjson)$'),
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    q: Optional[str] = Query(None, max_length=search.MAX_QUERY_LENGTH),
+    scope: OwnershipScope = Depends(get_ownership)
+):
+    # Ownership is a subquery so nothing is loaded before the first byte goes out
+    statement = export_statement(
+        scope.ledger_clause(),
+        *ledger_filters(scope.db, account_id, category_id, start_date, end_date, q)
+    )
+    gzip = 'gzip' in request.headers.get('accept-encoding', '')
+    headers = {"Content-Disposition": f'attachment; filename="ledger.{format}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    # Same engine the request's reads were routed to (a replica when one is eligible)
+    bind = scope.db.get_bind(clause=statement)
+    return StreamingResponse(stream_export(statement, format, gzip, bind), media_type=MEDIA_TYPES[format], headers=headers)
+
+@app.get("/ledger/search", response_model=LedgerSearchPage, dependencies=[Depends(conditional_get)])
+def search_ledger_entries(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=search.MAX_QUERY_LENGTH),
+    account_id: Optional[int] = None,
+    category_id: Optional[int] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    scope: OwnershipScope = Depends(get_ownership),
+    db: Session = Depends(get_db)
+):
+    q = q.strip()
+    if not q:
+        raise HTTPException(status_code=400, detail="q must not be blank")
+    rank = search.rank_expression(db, q)
+    query = select(*[AccountLedger.__table__.c[name] for name in LEDGER_FIELDS], rank.label("rank")).where(
+        scope.ledger_clause(),
+        search.match_clause(db, q),
+        *ledger_filters(db, account_id, category_id, start_date, end_date)
+    )
+    if cursor:
+        query = query.where(seek_ranked_before(rank, AccountLedger.transaction_date, AccountLedger.id, cursor))
     
-    if account_id:
-        query = query.filter(AccountLedger.account_id == account_id)
-    if category_id:
-        query = query.filter(AccountLedger.category_id == category_id)
-    if start_date:
-        query = query.filter(AccountLedger.transaction_date >= start_date)
-    if end_date:
-        query = query.filter(AccountLedger.transaction_date <= end_date)
+    entries = rows_as_dicts(LEDGER_FIELDS + ("rank",), db.execute(query.order_by(
+        rank.desc(), AccountLedger.transaction_date.desc(), AccountLedger.id.desc()
+    ).limit(limit + 1)))
     
-    entries = query.order_by(AccountLedger.transaction_date.desc()).all()
-    return entries
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        last = entries[-1]
+        next_cursor = encode_ranked_cursor(last["rank"], last["transaction_date"], last["id"])
+    return json_response({"items": entries, "next_cursor": next_cursor}, response)
 
 @app.post("/ledger", response_model=LedgerResponse, status_code=status.HTTP_201_CREATED)
-def create_ledger_entry(ledger_data: LedgerCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_ledger_entry(ledger_data: LedgerCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    # A retried request replays the first response before any validation or write
+    replayed = idem.replay(db, current_user.id, "create_ledger_entry", ledger_data)
+    if replayed is not None:
+        return replayed
+
     # Verify account belongs to user
     account = db.query(Account).filter(
         Account.id == ledger_data.account_id,
@@ -253,12 +452,7 @@ def create_ledger_entry(ledger_data: LedgerCreate, current_user: User = Depends(
             raise HTTPException(status_code=404, detail="Category not found")
         
         # Determine amount sign based on category type
-        # Expense: negative (debit), Income: positive (credit)
-        amount = ledger_data.amount
-        if category.category_type == 'expense':
-            amount = -abs(amount)  # Ensure negative
-        elif category.category_type == 'income':
-            amount = abs(amount)  # Ensure positive
+        amount = apply_category_sign(ledger_data.amount, category.category_type)
     else:
         amount = ledger_data.amount
     
@@ -271,57 +465,89 @@ def create_ledger_entry(ledger_data: LedgerCreate, current_user: User = Depends(
         transaction_date=ledger_data.transaction_date
     )
     db.add(new_entry)
-    db.commit()
+    adjust_balance(db, new_entry.account_id, new_entry.amount)
+    rollups.add_entry(db, current_user.id, new_entry)
+    bump_data_version(db, current_user.id)
+    db.flush()
+    # Amounts come back rounded to the column's two decimals
     db.refresh(new_entry)
-    return new_entry
-
-@app.get("/ledger/{ledger_id}", response_model=LedgerResponse)
-def get_ledger_entry(ledger_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_account_ids = [acc.id for acc in db.query(Account.id).filter(Account.user_id == current_user.id).all()]
-    entry = db.query(AccountLedger).filter(
-        AccountLedger.id == ledger_id,
-        AccountLedger.account_id.in_(user_account_ids)
-    ).first()
+    result = idem.save(db, LedgerResponse, new_entry)
+    db.commit()
+    return result
+
+@app.post("/ledger/import", response_model=LedgerImportResult, responses={202: {"model": JobResponse}})
+def import_ledger_entries(
+    file: UploadFile = File(...),
+    account_id: Optional[int] = Form(None),
+    format: Optional[str] = Form(None),
+    background: bool = Depends(jobs.respond_async),
+    idem: Idempotency = Depends(idempotency_key),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    fingerprint = upload_fingerprint(file.file, filename=file.filename, account_id=account_id, format=format)
+    replayed = idem.replay(db, current_user.id, "import_ledger_entries", fingerprint)
+    if replayed is not None:
+        return jobs.with_location(replayed)
+    # CSV rows may name their own account_id; account_id here is the default (and the only option for OFX)
+    fmt = detect_format(file.filename, format)
+    if fmt not in ('csv', 'ofx'):
+        raise HTTPException(status_code=400, detail="format must be 'csv' or 'ofx'")
+    if background:
+        path = tasks.spool_upload(file.file)
+        job = jobs.enqueue(db, current_user.id, "import_statement", {"path": path, "format": fmt, "account_id": account_id})
+        idem.save(db, JobResponse, jobs.describe(job), status_code=status.HTTP_202_ACCEPTED)
+        db.commit()
+        return jobs.accepted(job)
+    result = import_statement(db, current_user.id, file.file, fmt, account_id)
+    result = idem.save(db, LedgerImportResult, result, status_code=status.HTTP_200_OK)
+    db.commit()
+    return result
+
+@app.post("/ledger/batch", response_model=LedgerBatchResponse)
+def batch_ledger_entries(batch: LedgerBatchRequest, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    replayed = idem.replay(db, current_user.id, "batch_ledger_entries", batch)
+    if replayed is not None:
+        return replayed
+    result = apply_batch(db, current_user.id, batch.operations, atomic=batch.mode == 'atomic')
+    if not result["applied"]:
+        # Atomic batch rejected: nothing was written (the key included); per-operation errors explain why
+        return JSONResponse(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            content=LedgerBatchResponse(**result).model_dump(mode="json"),
+        )
+    result = idem.save(db, LedgerBatchResponse, result, status_code=status.HTTP_200_OK)
+    db.commit()
+    return result
+
+@app.get("/ledger/{ledger_id}", response_model=LedgerResponse, dependencies=[Depends(conditional_get)])
+def get_ledger_entry(ledger_id: int, scope: OwnershipScope = Depends(get_ownership)):
+    entry = scope.get_entry(ledger_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Ledger entry not found")
     return entry
 
 @app.put("/ledger/{ledger_id}", response_model=LedgerResponse)
-def update_ledger_entry(ledger_id: int, ledger_data: LedgerUpdate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_account_ids = [acc.id for acc in db.query(Account.id).filter(Account.user_id == current_user.id).all()]
-    entry = db.query(AccountLedger).filter(
-        AccountLedger.id == ledger_id,
-        AccountLedger.account_id.in_(user_account_ids)
-    ).first()
+def update_ledger_entry(ledger_id: int, ledger_data: LedgerUpdate, scope: OwnershipScope = Depends(get_ownership), db: Session = Depends(get_db)):
+    entry = scope.get_entry(ledger_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Ledger entry not found")
+    old_values = (entry.account_id, entry.category_id, entry.transaction_date, entry.amount)
     
     if ledger_data.account_id is not None:
-        account = db.query(Account).filter(
-            Account.id == ledger_data.account_id,
-            Account.user_id == current_user.id
-        ).first()
-        if not account:
+        if not scope.owns_account(ledger_data.account_id):
             raise HTTPException(status_code=404, detail="Account not found")
         entry.account_id = ledger_data.account_id
     
     if ledger_data.category_id is not None:
-        category = db.query(Category).filter(
-            Category.id == ledger_data.category_id,
-            Category.user_id == current_user.id
-        ).first()
-        if not category:
+        category_type = scope.category_type(ledger_data.category_id)
+        if not category_type:
             raise HTTPException(status_code=404, detail="Category not found")
         entry.category_id = ledger_data.category_id
         
         # Adjust amount sign based on category type
         if ledger_data.amount is not None:
-            amount = ledger_data.amount
-            if category.category_type == 'expense':
-                amount = -abs(amount)
-            elif category.category_type == 'income':
-                amount = abs(amount)
-            entry.amount = amount
+            entry.amount = apply_category_sign(ledger_data.amount, category_type)
     elif ledger_data.amount is not None:
         entry.amount = ledger_data.amount
     
@@ -330,26 +556,33 @@ def update_ledger_entry(ledger_id: int, ledger_data: LedgerUpdate, current_user:
     if ledger_data.transaction_date is not None:
         entry.transaction_date = ledger_data.transaction_date
     
+    move_balance(db, old_values[0], old_values[3], entry.account_id, entry.amount)
+    rollups.move_entry(db, scope.user_id, old_values, entry)
+    bump_data_version(db, scope.user_id)
     db.commit()
     db.refresh(entry)
     return entry
 
 @app.delete("/ledger/{ledger_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_ledger_entry(ledger_id: int, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_account_ids = [acc.id for acc in db.query(Account.id).filter(Account.user_id == current_user.id).all()]
-    entry = db.query(AccountLedger).filter(
-        AccountLedger.id == ledger_id,
-        AccountLedger.account_id.in_(user_account_ids)
-    ).first()
+def delete_ledger_entry(ledger_id: int, scope: OwnershipScope = Depends(get_ownership), db: Session = Depends(get_db)):
+    entry = scope.get_entry(ledger_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Ledger entry not found")
+    account_id, amount = entry.account_id, entry.amount
+    # Balance first: its row lock orders concurrent checkpoint updates for the account
+    adjust_balance(db, account_id, -amount)
+    rollups.add_entry(db, scope.user_id, entry, sign=-1)
     db.delete(entry)
+    bump_data_version(db, scope.user_id)
     db.commit()
     return None
 
 # Transfer endpoint
 @app.post("/transfer", response_model=List[LedgerResponse], status_code=status.HTTP_201_CREATED)
-def create_transfer(transfer_data: TransferCreate, current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_transfer(transfer_data: TransferCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    replayed = idem.replay(db, current_user.id, "create_transfer", transfer_data)
+    if replayed is not None:
+        return replayed
     if transfer_data.from_account_id == transfer_data.to_account_id:
         raise HTTPException(status_code=400, detail="From and to accounts must be different")
     
@@ -366,7 +599,8 @@ def create_transfer(transfer_data: TransferCreate, current_user: User = Depends(
     if not from_account or not to_account:
         raise HTTPException(status_code=404, detail="Account not found")
     
-    # Create two ledger entries
+    # Create two ledger entries sharing a transfer id
+    transfer_id = str(uuid.uuid4())
     # From account: negative amount (debit)
     from_entry = AccountLedger(
         account_id=transfer_data.from_account_id,
@@ -374,7 +608,8 @@ def create_transfer(transfer_data: TransferCreate, current_user: User = Depends(
         amount=-abs(transfer_data.amount),
         category_id=None,
         narration=transfer_data.narration or f"Transfer to {to_account.account_name}",
-        transaction_date=transfer_data.transaction_date
+        transaction_date=transfer_data.transaction_date,
+        transfer_id=transfer_id
     )
     
     # To account: positive amount (credit)
@@ -384,18 +619,192 @@ def create_transfer(transfer_data: TransferCreate, current_user: User = Depends(
         amount=abs(transfer_data.amount),
         category_id=None,
         narration=transfer_data.narration or f"Transfer from {from_account.account_name}",
-        transaction_date=transfer_data.transaction_date
+        transaction_date=transfer_data.transaction_date,
+        transfer_id=transfer_id
     )
     
     db.add(from_entry)
     db.add(to_entry)
-    db.commit()
+    adjust_balance(db, from_entry.account_id, from_entry.amount)
+    adjust_balance(db, to_entry.account_id, to_entry.amount)
+    rollups.add_entry(db, current_user.id, from_entry)
+    rollups.add_entry(db, current_user.id, to_entry)
+    bump_data_version(db, current_user.id)
+    db.flush()
     db.refresh(from_entry)
     db.refresh(to_entry)
-    
-    return [from_entry, to_entry]
+    result = idem.save(db, List[LedgerResponse], [from_entry, to_entry])
+    db.commit()
+    return result
+
+@app.get("/transfer/{transfer_id}", response_model=List[LedgerResponse], dependencies=[Depends(conditional_get)])
+def get_transfer(transfer_id: str, scope: OwnershipScope = Depends(get_ownership)):
+    # Both legs in one lookup on ix_account_ledger_transfer_id; the debit leg comes first
+    legs = scope.db.scalars(
+        select(AccountLedger)
+        .where(AccountLedger.transfer_id == transfer_id, scope.ledger_clause())
+        .order_by(AccountLedger.amount)
+    ).all()
+    if not legs:
+        raise HTTPException(status_code=404, detail="Transfer not found")
+    return legs
+
+# Recurring transaction endpoints
+def check_rule_references(scope: OwnershipScope, account_id: Optional[int], category_id: Optional[int]) -> Optional[str]:
+    """404 unless the user owns both; returns the category's type"""
+    if account_id is not None and not scope.owns_account(account_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+    if category_id is None:
+        return None
+    category_type = scope.category_type(category_id)
+    if not category_type:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return category_type
+
+@app.get("/recurring", response_model=List[RecurringRuleResponse], dependencies=[Depends(conditional_get)])
+def get_recurring_rules(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    return db.scalars(select(RecurringRule).where(RecurringRule.user_id == current_user.id).order_by(RecurringRule.id)).all()
+
+@app.post("/recurring", response_model=RecurringRuleResponse, status_code=status.HTTP_201_CREATED)
+def create_recurring_rule(rule_data: RecurringRuleCreate, idem: Idempotency = Depends(idempotency_key), current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    replayed = idem.replay(db, current_user.id, "create_recurring_rule", rule_data)
+    if replayed is not None:
+        return replayed
+    category_type = check_rule_references(OwnershipScope(current_user, db), rule_data.account_id, rule_data.category_id)
+    if rule_data.end_date is not None and rule_data.end_date < rule_data.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+    rule = RecurringRule(
+        user_id=current_user.id,
+        account_id=rule_data.account_id,
+        category_id=rule_data.category_id,
+        amount=apply_category_sign(rule_data.amount, category_type),
+        narration=rule_data.narration,
+        frequency=rule_data.frequency,
+        interval=rule_data.interval,
+        start_date=rule_data.start_date,
+        end_date=rule_data.end_date,
+        max_occurrences=rule_data.max_occurrences,
+        next_occurrence=0,
+    )
+    rule.next_date = recurring.scheduled_date(rule, 0)
+    db.add(rule)
+    bump_data_version(db, current_user.id)
+    db.flush()
+    # Occurrences already due (a start_date in the past) are generated right away
+    recurring.materialize_batch(db, datetime.utcnow().date(), rule_ids=[rule.id])
+    db.refresh(rule)
+    result = idem.save(db, RecurringRuleResponse, rule)
+    db.commit()
+    return result
+
+@app.get("/recurring/{rule_id}", response_model=RecurringRuleResponse, dependencies=[Depends(conditional_get)])
+def get_recurring_rule(rule_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    rule = db.scalars(select(RecurringRule).where(RecurringRule.id == rule_id, RecurringRule.user_id == current_user.id)).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Recurring rule not found")
+    return rule
+
+@app.put("/recurring/{rule_id}", response_model=RecurringRuleResponse)
+def update_recurring_rule(rule_id: int, rule_data: RecurringRuleUpdate, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    rule = db.scalars(
+        select(RecurringRule)
+        .where(RecurringRule.id == rule_id, RecurringRule.user_id == current_user.id)
+        .with_for_update()
+    ).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Recurring rule not found")
+    # Only future occurrences change; entries already generated stay as they are
+    category_id = rule_data.category_id if rule_data.category_id is not None else rule.category_id
+    category_type = check_rule_references(OwnershipScope(current_user, db), rule_data.account_id, category_id)
+    if rule_data.account_id is not None:
+        rule.account_id = rule_data.account_id
+    rule.category_id = category_id
+    if rule_data.amount is not None:
+        rule.amount = rule_data.amount
+    rule.amount = apply_category_sign(rule.amount, category_type)
+    if rule_data.narration is not None:
+        rule.narration = rule_data.narration
+    if rule_data.end_date is not None:
+        if rule_data.end_date < rule.start_date:
+            raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+        rule.end_date = rule_data.end_date
+    if rule_data.max_occurrences is not None:
+        rule.max_occurrences = rule_data.max_occurrences
+    # A later end or a higher count revives an ended schedule; missed occurrences are caught up on the next run
+    rule.next_date = recurring.scheduled_date(rule, rule.next_occurrence)
+    bump_data_version(db, current_user.id)
+    db.commit()
+    db.refresh(rule)
+    return rule
+
+@app.delete("/recurring/{rule_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_recurring_rule(rule_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    rule = db.scalars(select(RecurringRule).where(RecurringRule.id == rule_id, RecurringRule.user_id == current_user.id)).first()
+    if not rule:
+        raise HTTPException(status_code=404, detail="Recurring rule not found")
+    # Entries it generated stay in the ledger, unlinked by ON DELETE SET NULL
+    db.delete(rule)
+    bump_data_version(db, current_user.id)
+    db.commit()
+    return None
+
+# Report endpoints
+@app.get("/reports", response_model=LedgerReport, dependencies=[Depends(conditional_get)])
+def get_report(
+    start_month: Optional[date] = None,
+    end_month: Optional[date] = None,
+    account_id: Optional[int] = None,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    # Answered from the monthly rollups, so periods are whole months
+    return rollups.build_report(db, current_user.id, start_month, end_month, account_id)
+
+# Background job endpoints
+@app.get("/jobs", response_model=List[JobResponse])
+def get_jobs(
+    job_status: Optional[str] = Query(None, alias='status', pattern='^(queued|running|succeeded|failed)$'),
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    query = select(Job).where(Job.user_id == current_user.id)
+    if job_status:
+        query = query.where(Job.status == job_status)
+    return [jobs.describe(job) for job in db.scalars(query.order_by(Job.id.desc()).limit(limit))]
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+def get_job(job_id: int, current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)):
+    job = db.scalars(select(Job).where(Job.id == job_id, Job.user_id == current_user.id)).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return jobs.describe(job)
+
+# Internal endpoints
+@app.get("/internal/auth-cache", dependencies=[Depends(require_internal_token)])
+def get_auth_cache_stats():
+    return auth_cache_stats()
+
+@app.get("/internal/pool", dependencies=[Depends(require_internal_token)])
+def get_pool_stats():
+    stats = {"sync": pool_status(engine)}
+    if async_engine is not None:
+        stats["async"] = pool_status(async_engine.sync_engine)
+    if replica_set is not None:
+        for replica in replica_set.replicas:
+            stats[replica.name] = dict(replica.status(), pool=pool_status(replica.engine))
+    return stats
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_internal_token)])
+def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 def root():
     return {"message": "Elephant Book API"}
 
+if ASYNC_ENDPOINTS:
+    import async_api
+    async_api.install(app)
@@ -0,0 +1,99 @@
+import bisect
+import threading
+
+# Seconds; tuned for pool checkout waits and request/DB timings
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Histogram:
+    """Thread-safe cumulative histogram with Prometheus-style buckets"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self._counts)
+            total, count = self._sum, self._count
+        cumulative = []
+        running = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            running += bucket_count
+            cumulative.append(("+Inf" if bound == float("inf") else bound, running))
+        return {"buckets": cumulative, "sum": total, "count": count}
+
+# Statements per request
+COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 250, 500, 1000)
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+def render_histogram(name: str, labels: dict, histogram: Histogram) -> list:
+    snapshot = histogram.snapshot()
+    lines = []
+    for bound, count in snapshot["buckets"]:
+        lines.append(f"{name}_bucket{_format_labels({**labels, 'le': bound})} {count}")
+    lines.append(f"{name}_sum{_format_labels(labels)} {snapshot['sum']}")
+    lines.append(f"{name}_count{_format_labels(labels)} {snapshot['count']}")
+    return lines
+
+class HistogramFamily:
+    """Histograms sharing a metric name, one per label value"""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, value: str) -> Histogram:
+        child = self._children.get(value)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(value, Histogram(self.buckets))
+        return child
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            children = sorted(self._children.items())
+        for value, child in children:
+            lines.extend(render_histogram(self.name, {self.label: value}, child))
+        return lines
+
+class CounterFamily:
+    """Monotonic counters sharing a metric name, one per label value"""
+
+    def __init__(self, name: str, help_text: str, label: str):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value: str, amount: int = 1):
+        with self._lock:
+            self._values[value] = self._values.get(value, 0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for value, count in values:
+            lines.append(f"{self.name}{_format_labels({self.label: value})} {count}")
+        return lines
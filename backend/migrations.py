@@ -0,0 +1,312 @@
+import argparse
+from datetime import datetime
+from sqlalchemy import Table, Column, Integer, String, DateTime, MetaData, inspect, select, insert, text
+from sqlalchemy.schema import CreateIndex, CreateTable
+from database import DB_PROFILE, engine, Base, SessionLocal
+from models import (
+    Account, Category, AccountLedger, AccountBalance, LedgerRollup, UserDataVersion, AccountBalanceCheckpoint,
+    IdempotencyKey, Job, RecurringRule,
+)
+
+class MigrationError(RuntimeError):
+    pass
+
+# Kept out of Base.metadata so create_all never touches it
+migration_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    migration_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow),
+)
+
+# Partial indexes kept out of the models so migration 3 never builds them before their columns exist
+TRANSFER_INDEX = "ix_account_ledger_transfer_id"
+RECURRING_INDEX = "ux_account_ledger_recurring_occurrence"
+
+def create_index_concurrently(bind, index):
+    """Build an index without blocking writes on PostgreSQL (plain CREATE INDEX elsewhere)"""
+    ddl = str(CreateIndex(index, if_not_exists=True).compile(dialect=bind.dialect))
+    create_index_ddl_concurrently(bind, index.name, ddl)
+
+def create_index_ddl_concurrently(bind, name: str, ddl: str):
+    """Same as create_index_concurrently for hand-written CREATE INDEX statements"""
+    if bind.dialect.name != "postgresql":
+        with bind.begin() as conn:
+            conn.execute(text(ddl))
+        return
+    ddl = ddl.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)
+    # CONCURRENTLY cannot run inside a transaction block
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # An interrupted concurrent build leaves an INVALID index that IF NOT EXISTS would skip
+        invalid = conn.execute(text(
+            "SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+            "WHERE c.relname = :name AND NOT i.indisvalid"
+        ), {"name": name}).first()
+        if invalid:
+            conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"'))
+        conn.execute(text(ddl))
+
+def _session(bind):
+    # Steps before 12 run before accounts.deleted_at exists, so they read without the soft-delete filter
+    return SessionLocal(bind=bind, info={"include_deleted": True})
+
+def _create_base_tables(bind):
+    # checkfirst keeps this safe on databases created before migrations existed
+    Base.metadata.create_all(bind=bind, checkfirst=True)
+
+def _seed_account_balances(bind):
+    from balances import backfill_missing
+    db = _session(bind)
+    try:
+        backfill_missing(db)
+    finally:
+        db.close()
+
+def _create_ledger_rollups(bind):
+    from rollups import rebuild
+    LedgerRollup.__table__.create(bind=bind, checkfirst=True)
+    db = _session(bind)
+    try:
+        rebuild(db)
+    finally:
+        db.close()
+
+def _create_user_data_versions(bind):
+    # Missing rows read as version 0, so there is nothing to backfill
+    UserDataVersion.__table__.create(bind=bind, checkfirst=True)
+
+def _create_balance_checkpoints(bind):
+    from checkpoints import rebuild
+    AccountBalanceCheckpoint.__table__.create(bind=bind, checkfirst=True)
+    db = _session(bind)
+    try:
+        rebuild(db)
+    finally:
+        db.close()
+
+def _create_search_indexes(bind):
+    # PostgreSQL only: SQLite falls back to LIKE scans in search.py
+    if bind.dialect.name != "postgresql":
+        return
+    from search import SEARCH_INDEXES
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    for name, ddl in SEARCH_INDEXES:
+        create_index_ddl_concurrently(bind, name, ddl)
+
+def _add_transfer_ids_and_idempotency_keys(bind):
+    from partitions import is_partitioned
+    if "transfer_id" not in {column["name"] for column in inspect(bind).get_columns(AccountLedger.__tablename__)}:
+        # Nullable with no default: a catalog-only change on PostgreSQL, no table rewrite
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {AccountLedger.__tablename__} ADD COLUMN transfer_id VARCHAR(36)"))
+    ddl = (
+        f"CREATE INDEX IF NOT EXISTS {TRANSFER_INDEX} ON {AccountLedger.__tablename__} (transfer_id) "
+        "WHERE transfer_id IS NOT NULL"
+    )
+    if is_partitioned(bind):
+        # Partitioned parents cannot build indexes concurrently
+        with bind.begin() as conn:
+            conn.execute(text(ddl))
+    else:
+        create_index_ddl_concurrently(bind, TRANSFER_INDEX, ddl)
+    IdempotencyKey.__table__.create(bind=bind, checkfirst=True)
+
+def _add_data_version_timestamps(bind):
+    if "updated_at" not in {column["name"] for column in inspect(bind).get_columns(UserDataVersion.__tablename__)}:
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {UserDataVersion.__tablename__} ADD COLUMN updated_at TIMESTAMP"))
+
+def _create_jobs(bind):
+    Job.__table__.create(bind=bind, checkfirst=True)
+
+def _add_recurring_rules(bind):
+    from partitions import is_partitioned
+    RecurringRule.__table__.create(bind=bind, checkfirst=True)
+    if "recurring_rule_id" not in {column["name"] for column in inspect(bind).get_columns(AccountLedger.__tablename__)}:
+        with bind.begin() as conn:
+            conn.execute(text(
+                f"ALTER TABLE {AccountLedger.__tablename__} ADD COLUMN recurring_rule_id INTEGER "
+                f"REFERENCES {RecurringRule.__tablename__} (id)"
+            ))
+    # One entry per rule and occurrence; includes transaction_date, so it is valid on a partitioned ledger too
+    ddl = (
+        f"CREATE UNIQUE INDEX IF NOT EXISTS {RECURRING_INDEX} ON {AccountLedger.__tablename__} "
+        "(recurring_rule_id, transaction_date) WHERE recurring_rule_id IS NOT NULL"
+    )
+    if is_partitioned(bind):
+        with bind.begin() as conn:
+            conn.execute(text(ddl))
+    else:
+        create_index_ddl_concurrently(bind, RECURRING_INDEX, ddl)
+
+# (table, column, referenced table, ON DELETE action) for the foreign keys that migration 12 rewrites
+DELETE_ACTIONS = [
+    (AccountLedger.__tablename__, "account_id", Account.__tablename__, "CASCADE"),
+    (AccountLedger.__tablename__, "category_id", Category.__tablename__, "SET NULL"),
+    (AccountLedger.__tablename__, "recurring_rule_id", RecurringRule.__tablename__, "SET NULL"),
+    (AccountBalance.__tablename__, "account_id", Account.__tablename__, "CASCADE"),
+    (LedgerRollup.__tablename__, "account_id", Account.__tablename__, "CASCADE"),
+    (AccountBalanceCheckpoint.__tablename__, "account_id", Account.__tablename__, "CASCADE"),
+    (RecurringRule.__tablename__, "account_id", Account.__tablename__, "CASCADE"),
+    (RecurringRule.__tablename__, "category_id", Category.__tablename__, "SET NULL"),
+]
+
+def _foreign_key(bind, table: str, column: str, referred: str) -> dict:
+    return next(
+        fk for fk in inspect(bind).get_foreign_keys(table)
+        if fk["constrained_columns"] == [column] and fk["referred_table"] == referred
+    )
+
+def _rebuild_sqlite_table(bind, name: str):
+    """Recreate a SQLite table from its model and copy the rows over (SQLite's documented way to change constraints)"""
+    table = Base.metadata.tables[name]
+    rebuilt = f"{name}_rebuild"
+    create = str(CreateTable(table).compile(dialect=bind.dialect)).replace(f"CREATE TABLE {name} (", f"CREATE TABLE {rebuilt} (", 1)
+    with bind.connect() as conn:
+        enforced = conn.exec_driver_sql("PRAGMA foreign_keys").scalar()
+        # Only takes effect outside a transaction; dropping the old table must not fire its actions
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conn.commit()
+        try:
+            with conn.begin():
+                indexes = conn.execute(text(
+                    "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = :name AND sql IS NOT NULL"
+                ), {"name": name}).scalars().all()
+                existing = {column["name"] for column in inspect(conn).get_columns(name)}
+                columns = ", ".join(column.name for column in table.columns if column.name in existing)
+                conn.exec_driver_sql(create)
+                conn.exec_driver_sql(f"INSERT INTO {rebuilt} ({columns}) SELECT {columns} FROM {name}")
+                conn.exec_driver_sql(f"DROP TABLE {name}")
+                conn.exec_driver_sql(f"ALTER TABLE {rebuilt} RENAME TO {name}")
+                for ddl in indexes:
+                    conn.exec_driver_sql(ddl)
+        finally:
+            conn.exec_driver_sql(f"PRAGMA foreign_keys={'ON' if enforced else 'OFF'}")
+            conn.commit()
+
+def _add_delete_cascades(bind):
+    from partitions import is_partitioned
+    if "deleted_at" not in {column["name"] for column in inspect(bind).get_columns(Account.__tablename__)}:
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {Account.__tablename__} ADD COLUMN deleted_at TIMESTAMP"))
+    # Cascades and SET NULL look rules up by these columns
+    for index in sorted(RecurringRule.__table__.indexes, key=lambda idx: idx.name):
+        create_index_concurrently(bind, index)
+    if bind.dialect.name == "sqlite":
+        # SQLite cannot alter a constraint; tables created before the models had the actions are rebuilt
+        outdated = sorted({
+            table for table, column, referred, action in DELETE_ACTIONS
+            if (_foreign_key(bind, table, column, referred)["options"].get("ondelete") or "").upper() != action
+        })
+        for table in outdated:
+            _rebuild_sqlite_table(bind, table)
+        return
+    if bind.dialect.name != "postgresql":
+        return
+    partitioned = is_partitioned(bind)
+    for table, column, referred, action in DELETE_ACTIONS:
+        foreign_key = _foreign_key(bind, table, column, referred)
+        if (foreign_key["options"].get("ondelete") or "").upper() == action:
+            continue
+        name = foreign_key["name"]
+        # NOT VALID swaps the constraint under a brief lock and checks existing rows separately,
+        # without blocking writes; PostgreSQL doesn't allow it on a partitioned table
+        not_valid = "" if partitioned and table == AccountLedger.__tablename__ else " NOT VALID"
+        with bind.begin() as conn:
+            conn.execute(text(
+                f'ALTER TABLE {table} DROP CONSTRAINT "{name}", ADD CONSTRAINT "{name}" '
+                f"FOREIGN KEY ({column}) REFERENCES {referred} (id) ON DELETE {action}{not_valid}"
+            ))
+        if not_valid:
+            with bind.begin() as conn:
+                conn.execute(text(f'ALTER TABLE {table} VALIDATE CONSTRAINT "{name}"'))
+
+def _create_query_indexes(bind):
+    indexes = list(Account.__table__.indexes) + list(Category.__table__.indexes) + list(AccountLedger.__table__.indexes)
+    for index in sorted(indexes, key=lambda idx: idx.name):
+        create_index_concurrently(bind, index)
+
+# (version, description, upgrade). Append only; never renumber or edit an applied step.
+MIGRATIONS = [
+    (1, "base tables", _create_base_tables),
+    (2, "seed account_balances from the ledger", _seed_account_balances),
+    (3, "ledger, account and category query indexes", _create_query_indexes),
+    (4, "monthly ledger rollups", _create_ledger_rollups),
+    (5, "per-user data versions for ETags", _create_user_data_versions),
+    (6, "monthly account balance checkpoints", _create_balance_checkpoints),
+    (7, "narration full-text and trigram search indexes", _create_search_indexes),
+    (8, "transfer ids and idempotency keys", _add_transfer_ids_and_idempotency_keys),
+    (9, "last-write timestamps for replica read routing", _add_data_version_timestamps),
+    (10, "background jobs", _create_jobs),
+    (11, "recurring transaction rules", _add_recurring_rules),
+    (12, "ON DELETE actions and soft-deleted accounts", _add_delete_cascades),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+# Arbitrary application-wide key for pg_advisory_lock
+MIGRATION_LOCK_KEY = 7262011
+
+def current_version(bind=engine) -> int:
+    migration_metadata.create_all(bind=bind, checkfirst=True)
+    with bind.connect() as conn:
+        version = conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc())).scalar()
+    return version or 0
+
+def upgrade(bind=engine, target: int = LATEST_VERSION):
+    """Apply every pending migration up to target, recording each one as it completes"""
+    if bind.dialect.name != "postgresql":
+        return _apply_pending(bind, target)
+    if DB_PROFILE == "pgbouncer":
+        # Migrations span several transactions (CONCURRENTLY builds can't run in one), so they hold a
+        # session-level lock; transaction pooling could unlock it on another server connection and leak it
+        raise MigrationError(
+            "Migrations need a direct PostgreSQL connection; run them with DB_PROFILE=direct "
+            "and DATABASE_URL pointing at PostgreSQL rather than PgBouncer"
+        )
+    # Pods starting together queue here; the ones that follow find nothing left to apply
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as lock_conn:
+        lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        try:
+            return _apply_pending(bind, target)
+        finally:
+            lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+def _apply_pending(bind, target: int):
+    applied = []
+    version = current_version(bind)
+    for step, description, fn in MIGRATIONS:
+        if step <= version or step > target:
+            continue
+        print(f"Applying migration {step}: {description}")
+        fn(bind)
+        with bind.begin() as conn:
+            conn.execute(insert(schema_migrations).values(version=step, description=description))
+        applied.append(step)
+    return applied
+
+def main():
+    parser = argparse.ArgumentParser(description="Elephant Book schema migrations")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["upgrade", "status"])
+    args = parser.parse_args()
+
+    if args.command == "status":
+        version = current_version()
+        print(f"Schema version {version} (latest {LATEST_VERSION})")
+        for step, description, _ in MIGRATIONS:
+            print(f"  [{'x' if step <= version else ' '}] {step}: {description}")
+        return
+
+    try:
+        applied = upgrade()
+    except MigrationError as e:
+        raise SystemExit(str(e))
+    if applied:
+        print(f"Schema upgraded to version {applied[-1]}.")
+    else:
+        print("Schema already up to date.")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Numeric, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, ForeignKey, Numeric, Text, Index, event, text
+from sqlalchemy.orm import Session, relationship, with_loader_criteria
 from datetime import datetime
 from database import Base
 
@@ -21,41 +21,166 @@ class Account(Base):
     __tablename__ = "accounts"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     account_name = Column(String, nullable=False)
     account_type = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    deleted_at = Column(DateTime, nullable=True)  # soft-deleted, waiting for its purge job
     
     user = relationship("User", back_populates="accounts")
-    ledger_entries = relationship("AccountLedger", back_populates="account", cascade="all, delete-orphan")
+    # Dependent rows go with ON DELETE CASCADE in the database; the ORM never loads them to delete them
+    ledger_entries = relationship("AccountLedger", back_populates="account", cascade="all, delete-orphan", passive_deletes=True)
+    balance_row = relationship("AccountBalance", back_populates="account", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted_accounts(execute_state):
+    """Soft-deleted accounts drop out of every ORM SELECT, including ownership subqueries; pass
+    execution_options(include_deleted=True), or info={"include_deleted": True} for a whole session, to see them"""
+    if not execute_state.is_select:
+        return
+    if execute_state.execution_options.get("include_deleted", False) or execute_state.session.info.get("include_deleted", False):
+        return
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(Account, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+    )
 
 class Category(Base):
     __tablename__ = "categories"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     category_type = Column(String, nullable=False)  # 'income' or 'expense'
     name = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     user = relationship("User", back_populates="categories")
-    ledger_entries = relationship("AccountLedger", back_populates="category")
+    # ON DELETE SET NULL uncategorises the entries in the database
+    ledger_entries = relationship("AccountLedger", back_populates="category", passive_deletes=True)
 
 class AccountLedger(Base):
     __tablename__ = "account_ledger"
     
     id = Column(Integer, primary_key=True, index=True)
-    account_id = Column(Integer, ForeignKey("accounts.id"), nullable=False)
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False)
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     amount = Column(Numeric(10, 2), nullable=False)
-    category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True)
     narration = Column(Text, nullable=True)
     transaction_date = Column(DateTime, nullable=False)
     created_on = Column(DateTime, default=datetime.utcnow)
+    transfer_id = Column(String(36), nullable=True)  # shared by both legs of a transfer
+    recurring_rule_id = Column(Integer, ForeignKey("recurring_rules.id", ondelete="SET NULL"), nullable=True)  # rule that generated the entry
     
     account = relationship("Account", back_populates="ledger_entries")
     category = relationship("Category", back_populates="ledger_entries")
     creator = relationship("User", foreign_keys=[created_by], back_populates="ledger_entries")
 
+# Match the ledger listing: filter by account, newest first, id as the keyset tiebreaker
+Index("ix_account_ledger_account_date", AccountLedger.account_id, AccountLedger.transaction_date.desc(), AccountLedger.id.desc())
+# Category filters scan by date within a category
+Index("ix_account_ledger_category_date", AccountLedger.category_id, AccountLedger.transaction_date)
+
+class RecurringRule(Base):
+    __tablename__ = "recurring_rules"
+    
+    # An RRULE-style schedule (FREQ, INTERVAL, COUNT, UNTIL) materialized into ledger entries by recurring.py
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False, index=True)
+    category_id = Column(Integer, ForeignKey("categories.id", ondelete="SET NULL"), nullable=True, index=True)
+    amount = Column(Numeric(10, 2), nullable=False)
+    narration = Column(Text, nullable=True)
+    frequency = Column(String(8), nullable=False)  # daily, weekly, monthly or yearly
+    interval = Column(Integer, nullable=False, default=1)
+    start_date = Column(Date, nullable=False)  # first occurrence; monthly and yearly rules keep its day of the month
+    end_date = Column(Date, nullable=True)  # no occurrences after this day
+    max_occurrences = Column(Integer, nullable=True)
+    next_occurrence = Column(Integer, nullable=False, default=0)  # occurrences generated so far
+    next_date = Column(Date, nullable=True)  # date of the next occurrence; NULL once the schedule has ended
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# The materializer's scan: due rules in id order
+Index(
+    "ix_recurring_rules_due", RecurringRule.next_date, RecurringRule.id,
+    postgresql_where=text("next_date IS NOT NULL"), sqlite_where=text("next_date IS NOT NULL"),
+)
+
+class AccountBalance(Base):
+    __tablename__ = "account_balances"
+    
+    # Running SUM(account_ledger.amount) per account, maintained by the ledger write paths
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    balance = Column(Numeric(14, 2), nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    account = relationship("Account", back_populates="balance_row")
+
+class LedgerRollup(Base):
+    __tablename__ = "ledger_rollups"
+    
+    # Monthly totals per (account, category), maintained by the ledger write paths
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    category_id = Column(Integer, primary_key=True, default=0)  # 0 = uncategorised (transfers); not a FK so it can be part of the key
+    month = Column(Date, primary_key=True)  # first day of the month
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    income = Column(Numeric(14, 2), nullable=False, default=0)  # sum of positive amounts
+    expense = Column(Numeric(14, 2), nullable=False, default=0)  # sum of negative amounts
+    entry_count = Column(Integer, nullable=False, default=0)
+
+Index("ix_ledger_rollups_user_month", LedgerRollup.user_id, LedgerRollup.month)
+
+class AccountBalanceCheckpoint(Base):
+    __tablename__ = "account_balance_checkpoints"
+    
+    # Balance at the end of each month that has ledger activity; later months are shifted on back-dated writes
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), primary_key=True)
+    month = Column(Date, primary_key=True)  # first day of the month
+    closing_balance = Column(Numeric(14, 2), nullable=False, default=0)
+
+class UserDataVersion(Base):
+    __tablename__ = "user_data_versions"
+    
+    # Bumped by every write a user makes; GET endpoints derive their ETags from it
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=True)  # database clock; replicas.py keeps reads on the primary just after a write
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    
+    # Response of a create request, replayed when the client retries with the same Idempotency-Key
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)  # set in the same transaction as the write itself
+    response_body = Column(Text, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
 
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    # Background work queued by the API and run by `python jobs.py worker`
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    kind = Column(String(64), nullable=False)
+    payload = Column(Text, nullable=False)  # JSON arguments for the handler in tasks.py
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, succeeded or failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False)
+    run_after = Column(DateTime, nullable=False)  # not claimed before this; pushed back after each failure
+    locked_by = Column(String(255), nullable=True)  # worker running it
+    locked_at = Column(DateTime, nullable=True)  # refreshed while it runs; stale locks are requeued
+    result = Column(Text, nullable=True)  # JSON
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
 
+# Workers poll these: the queue in claim order, and running jobs whose worker went away
+Index(
+    "ix_jobs_queued", Job.run_after, Job.id,
+    postgresql_where=text("status = 'queued'"), sqlite_where=text("status = 'queued'"),
+)
+Index(
+    "ix_jobs_running", Job.locked_at,
+    postgresql_where=text("status = 'running'"), sqlite_where=text("status = 'running'"),
+)
@@ -0,0 +1,56 @@
+from typing import Dict, Optional, Set
+from fastapi import Depends
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from auth import Principal, get_current_user
+from database import get_db
+from models import Account, Category, AccountLedger
+
+def owned_ledger_clause(user_id: int):
+    """Restricts account_ledger to the user's accounts inside the same statement"""
+    return AccountLedger.account_id.in_(
+        select(Account.id).where(Account.user_id == user_id).scalar_subquery()
+    )
+
+class OwnershipScope:
+    """What the current user owns, resolved at most once per request"""
+
+    def __init__(self, user: Principal, db: Session):
+        self.user = user
+        self.user_id = user.id
+        self.db = db
+        self._account_ids: Optional[Set[int]] = None
+        self._category_types: Optional[Dict[int, str]] = None
+
+    def ledger_clause(self):
+        return owned_ledger_clause(self.user_id)
+
+    def get_entry(self, ledger_id: int) -> Optional[AccountLedger]:
+        """Fetch one ledger entry and check its ownership in a single query"""
+        return self.db.scalars(
+            select(AccountLedger)
+            .join(Account, Account.id == AccountLedger.account_id)
+            .where(AccountLedger.id == ledger_id, Account.user_id == self.user_id)
+        ).first()
+
+    def account_ids(self) -> Set[int]:
+        if self._account_ids is None:
+            self._account_ids = set(self.db.scalars(select(Account.id).where(Account.user_id == self.user_id)))
+        return self._account_ids
+
+    def category_types(self) -> Dict[int, str]:
+        if self._category_types is None:
+            self._category_types = dict(self.db.execute(
+                select(Category.id, Category.category_type).where(Category.user_id == self.user_id)
+            ).all())
+        return self._category_types
+
+    def owns_account(self, account_id: int) -> bool:
+        return account_id in self.account_ids()
+
+    def category_type(self, category_id: int) -> Optional[str]:
+        """'income'/'expense' for the user's categories, None when the category isn't theirs"""
+        return self.category_types().get(category_id)
+
+def get_ownership(current_user: Principal = Depends(get_current_user), db: Session = Depends(get_db)) -> OwnershipScope:
+    return OwnershipScope(current_user, db)
@@ -0,0 +1,51 @@
+import base64
+import json
+from datetime import datetime
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+def encode_cursor(transaction_date: datetime, entry_id: int) -> str:
+    """Opaque cursor pointing just past (transaction_date, id)"""
+    raw = json.dumps({"d": transaction_date.isoformat(), "i": entry_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def encode_ranked_cursor(rank: float, transaction_date: datetime, entry_id: int) -> str:
+    """Cursor for (rank DESC, date DESC, id DESC) orderings such as search results"""
+    raw = json.dumps({"r": rank, "d": transaction_date.isoformat(), "i": entry_id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def _decode(cursor: str, ranked: bool = False):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        position = (datetime.fromisoformat(data["d"]), int(data["i"]))
+        return (float(data["r"]),) + position if ranked else position
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def decode_cursor(cursor: str):
+    return _decode(cursor)
+
+def seek_before(date_column, id_column, cursor: str):
+    """Keyset predicate for rows after the cursor in (date DESC, id DESC) order"""
+    transaction_date, entry_id = decode_cursor(cursor)
+    # The redundant upper bound is a plain range the planner can use to prune ledger partitions
+    return and_(
+        date_column <= transaction_date,
+        or_(
+            date_column < transaction_date,
+            and_(date_column == transaction_date, id_column < entry_id),
+        ),
+    )
+
+def seek_ranked_before(rank_expression, date_column, id_column, cursor: str):
+    """Keyset predicate for rows after a ranked cursor in (rank DESC, date DESC, id DESC) order"""
+    rank, transaction_date, entry_id = _decode(cursor, ranked=True)
+    return or_(
+        rank_expression < rank,
+        and_(rank_expression == rank, date_column < transaction_date),
+        and_(rank_expression == rank, date_column == transaction_date, id_column < entry_id),
+    )
@@ -0,0 +1,305 @@
+"""Monthly range partitioning and cold-data archiving for account_ledger (PostgreSQL only).
+
+The layout is opt-in: `python partitions.py convert` rebuilds account_ledger as a table
+partitioned by transaction month. From then on init_db.py keeps future months created
+ahead of time, a DEFAULT partition catches anything outside them, and `archive` detaches
+old months into gzip-compressed COPY files that `restore` can load and attach again.
+"""
+import argparse
+import gzip
+import hashlib
+import os
+from datetime import date, datetime
+from pathlib import Path
+from typing import List
+from sqlalchemy import Table, Column, String, Date, DateTime, BigInteger, MetaData, delete, inspect, insert, select, text
+from database import engine
+from models import AccountLedger
+
+# Future months kept ready so new entries never land in the DEFAULT partition
+PARTITION_MONTHS_AHEAD = int(os.getenv("LEDGER_PARTITION_MONTHS_AHEAD", "3"))
+ARCHIVE_DIR = os.getenv("LEDGER_ARCHIVE_DIR", "ledger_archive")
+COPY_CHUNK_BYTES = 1024 * 1024
+
+PARENT = AccountLedger.__tablename__
+DEFAULT_PARTITION = f"{PARENT}_default"
+LEGACY_TABLE = f"{PARENT}_unpartitioned"
+COLUMNS = ", ".join(column.name for column in AccountLedger.__table__.columns)
+
+# Kept out of Base.metadata like schema_migrations; created by `convert`
+archive_metadata = MetaData()
+ledger_archives = Table(
+    "ledger_partition_archives",
+    archive_metadata,
+    Column("month", Date, primary_key=True),
+    Column("path", String, nullable=False),
+    Column("columns", String, nullable=False),
+    Column("row_count", BigInteger, nullable=False),
+    Column("sha256", String(64), nullable=False),
+    Column("archived_at", DateTime, default=datetime.utcnow),
+)
+
+class PartitionError(RuntimeError):
+    pass
+
+def _add_months(month: date, count: int) -> date:
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def _parse_month(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+def partition_name(month: date) -> str:
+    return f"{PARENT}_y{month.year:04d}m{month.month:02d}"
+
+def is_partitioned(bind=engine) -> bool:
+    if bind.dialect.name != "postgresql":
+        return False
+    with bind.connect() as conn:
+        return conn.execute(text(
+            "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:table)"
+        ), {"table": PARENT}).first() is not None
+
+def attached_months(conn) -> List[date]:
+    """Months with an attached partition, oldest first (the DEFAULT partition is not included)"""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": PARENT}).scalars()
+    prefix = f"{PARENT}_y"
+    return sorted(
+        date(int(name[len(prefix):len(prefix) + 4]), int(name[-2:]), 1)
+        for name in names if name.startswith(prefix)
+    )
+
+def archived_months(bind=engine) -> List[date]:
+    if bind.dialect.name != "postgresql" or not inspect(bind).has_table(ledger_archives.name):
+        return []
+    with bind.connect() as conn:
+        return list(conn.execute(select(ledger_archives.c.month).order_by(ledger_archives.c.month)).scalars())
+
+def require_full_ledger(action: str, bind=engine):
+    """Stop a CLI that recomputes aggregates from the ledger while months are archived"""
+    months = archived_months(bind)
+    if months:
+        listed = ", ".join(month.strftime("%Y-%m") for month in months)
+        raise SystemExit(
+            f"Cannot {action}: ledger months {listed} are archived and missing from account_ledger. "
+            "Restore them first with `python partitions.py restore --month YYYY-MM`."
+        )
+
+def _bounds(month: date) -> str:
+    # DDL takes no bind parameters; both values are formatted from date objects
+    return f"FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+
+def _attach(conn, month: date, table: str):
+    """Attach table as month's partition, first moving rows the DEFAULT partition caught for it"""
+    # Blocks inserts into DEFAULT so ATTACH's validation scan can't find new rows for the month
+    conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        f"WHERE transaction_date >= :start AND transaction_date < :end RETURNING {COLUMNS}) "
+        f"INSERT INTO {table} ({COLUMNS}) SELECT {COLUMNS} FROM moved"
+    ), {"start": month, "end": _add_months(month, 1)})
+    conn.execute(text(f"ALTER TABLE {PARENT} ATTACH PARTITION {table} {_bounds(month)}"))
+
+def _create_empty(conn, table: str):
+    conn.execute(text(f"CREATE TABLE {table} (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+
+def ensure_future_partitions(bind=engine, months_ahead: int = PARTITION_MONTHS_AHEAD) -> List[date]:
+    """Create partitions from the current month through months_ahead; returns the months created"""
+    if not is_partitioned(bind):
+        raise PartitionError(f"{PARENT} is not partitioned")
+    this_month = date.today().replace(day=1)
+    created = []
+    with bind.begin() as conn:
+        existing = set(attached_months(conn))
+    skipped = set(archived_months(bind))
+    for offset in range(months_ahead + 1):
+        month = _add_months(this_month, offset)
+        if month in existing or month in skipped:
+            continue
+        with bind.begin() as conn:
+            table = partition_name(month)
+            _create_empty(conn, table)
+            _attach(conn, month, table)
+        created.append(month)
+    return created
+
+def convert(bind=engine, months_ahead: int = PARTITION_MONTHS_AHEAD) -> int:
+    """Rebuild account_ledger as a monthly partitioned table in one transaction; returns rows copied
+
+    Holds an exclusive lock on the ledger for the whole copy, so run it in a maintenance window.
+    """
+    if bind.dialect.name != "postgresql":
+        raise PartitionError("Ledger partitioning needs PostgreSQL")
+    if is_partitioned(bind):
+        raise PartitionError(f"{PARENT} is already partitioned")
+    archive_metadata.create_all(bind=bind, checkfirst=True)
+
+    with bind.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {PARENT} IN ACCESS EXCLUSIVE MODE"))
+        # Secondary indexes (including the search indexes) are recreated from their own definitions
+        index_ddl = conn.execute(text(
+            "SELECT indexdef FROM pg_indexes WHERE schemaname = current_schema() AND tablename = :table "
+            "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(:table))"
+        ), {"table": PARENT}).scalars().all()
+        foreign_keys = conn.execute(text(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = to_regclass(:table) AND contype = 'f'"
+        ), {"table": PARENT}).all()
+        sequence = conn.execute(text("SELECT pg_get_serial_sequence(:table, 'id')"), {"table": PARENT}).scalar()
+        first = conn.execute(text(f"SELECT min(transaction_date) FROM {PARENT}")).scalar()
+
+        conn.execute(text(f"ALTER TABLE {PARENT} RENAME TO {LEGACY_TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {PARENT} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+            "PARTITION BY RANGE (transaction_date)"
+        ))
+        # A partitioned table's primary key must include the partition column
+        conn.execute(text(f"ALTER TABLE {PARENT} ADD PRIMARY KEY (id, transaction_date)"))
+        conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT} DEFAULT"))
+        this_month = date.today().replace(day=1)
+        month = min(first.date().replace(day=1), this_month) if first else this_month
+        while month <= _add_months(this_month, months_ahead):
+            conn.execute(text(f"CREATE TABLE {partition_name(month)} PARTITION OF {PARENT} {_bounds(month)}"))
+            month = _add_months(month, 1)
+
+        copied = conn.execute(text(
+            f"INSERT INTO {PARENT} ({COLUMNS}) SELECT {COLUMNS} FROM {LEGACY_TABLE}"
+        )).rowcount
+        if sequence:
+            # Dropping the old table would otherwise drop the id sequence with it
+            conn.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {PARENT}.id"))
+        conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+        for ddl in index_ddl:
+            conn.execute(text(ddl))
+        for name, definition in foreign_keys:
+            conn.execute(text(f'ALTER TABLE {PARENT} ADD CONSTRAINT "{name}" {definition}'))
+    with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"ANALYZE {PARENT}"))
+    return copied
+
+def archive(before: date, directory: str = ARCHIVE_DIR, keep_tables: bool = False, bind=engine) -> List[dict]:
+    """Detach every monthly partition older than before and write it to <directory>/<partition>.copy.gz"""
+    if not is_partitioned(bind):
+        raise PartitionError(f"{PARENT} is not partitioned; run `python partitions.py convert` first")
+    archive_metadata.create_all(bind=bind, checkfirst=True)
+    target = Path(directory)
+    target.mkdir(parents=True, exist_ok=True)
+    with bind.connect() as conn:
+        months = [month for month in attached_months(conn) if month < before]
+
+    archived = []
+    # One transaction per month: a failed copy leaves that partition attached
+    for month in months:
+        with bind.begin() as conn:
+            archived.append(_archive_month(conn, month, target, keep_tables))
+    return archived
+
+def _archive_month(conn, month: date, target: Path, keep_tables: bool) -> dict:
+    table = partition_name(month)
+    conn.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {table}"))
+    path = target / f"{table}.copy.gz"
+    partial = path.with_name(path.name + ".partial")
+    digest = hashlib.sha256()
+    rows = 0
+    driver_connection = conn.connection.driver_connection
+    with open(partial, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as out, driver_connection.cursor() as cursor:
+            with cursor.copy(f"COPY {table} ({COLUMNS}) TO STDOUT") as copy:
+                for block in copy:
+                    block = bytes(block)
+                    digest.update(block)
+                    # Text COPY escapes embedded newlines, so each one ends a row
+                    rows += block.count(b"\n")
+                    out.write(block)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(partial, path)
+
+    record = {
+        "month": month,
+        "path": str(path.resolve()),
+        "columns": COLUMNS,
+        "row_count": rows,
+        "sha256": digest.hexdigest(),
+    }
+    conn.execute(delete(ledger_archives).where(ledger_archives.c.month == month))
+    conn.execute(insert(ledger_archives).values(**record))
+    if not keep_tables:
+        conn.execute(text(f"DROP TABLE {table}"))
+    return record
+
+def restore(month: date, bind=engine) -> int:
+    """Load an archived month back from its file and attach it again; returns the rows restored"""
+    if not is_partitioned(bind):
+        raise PartitionError(f"{PARENT} is not partitioned")
+    with bind.begin() as conn:
+        record = conn.execute(select(ledger_archives).where(ledger_archives.c.month == month)).first()
+        if record is None:
+            raise PartitionError(f"{month:%Y-%m} is not archived")
+        table = partition_name(month)
+        # --keep-tables archives leave the detached table behind; reload from the file regardless
+        conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        _create_empty(conn, table)
+
+        digest = hashlib.sha256()
+        rows = 0
+        driver_connection = conn.connection.driver_connection
+        with gzip.open(record.path, "rb") as data, driver_connection.cursor() as cursor:
+            with cursor.copy(f"COPY {table} ({record.columns}) FROM STDIN") as copy:
+                for chunk in iter(lambda: data.read(COPY_CHUNK_BYTES), b""):
+                    digest.update(chunk)
+                    rows += chunk.count(b"\n")
+                    copy.write(chunk)
+        if digest.hexdigest() != record.sha256 or rows != record.row_count:
+            raise PartitionError(f"{record.path} does not match its archive record; nothing was restored")
+
+        _attach(conn, month, table)
+        conn.execute(delete(ledger_archives).where(ledger_archives.c.month == month))
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Monthly partitions and cold archives for account_ledger (PostgreSQL)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert_parser = subparsers.add_parser("convert", help="rebuild account_ledger as a partitioned table")
+    convert_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    ensure_parser = subparsers.add_parser("ensure", help="create upcoming monthly partitions")
+    ensure_parser.add_argument("--months-ahead", type=int, default=PARTITION_MONTHS_AHEAD)
+    archive_parser = subparsers.add_parser("archive", help="detach and archive old months")
+    cutoff = archive_parser.add_mutually_exclusive_group(required=True)
+    cutoff.add_argument("--before", type=_parse_month, help="archive months earlier than YYYY-MM")
+    cutoff.add_argument("--older-than-months", type=int, help="archive months at least this many months before the current one")
+    archive_parser.add_argument("--dir", default=ARCHIVE_DIR, help="where archive files are written")
+    archive_parser.add_argument("--keep-tables", action="store_true", help="leave detached tables in place after archiving")
+    restore_parser = subparsers.add_parser("restore", help="reload an archived month and attach it")
+    restore_parser.add_argument("--month", type=_parse_month, required=True, help="YYYY-MM")
+    subparsers.add_parser("status", help="list attached and archived months")
+    args = parser.parse_args()
+
+    try:
+        if args.command == "convert":
+            print(f"Copied {convert(months_ahead=args.months_ahead)} ledger row(s) into monthly partitions.")
+        elif args.command == "ensure":
+            created = ensure_future_partitions(months_ahead=args.months_ahead)
+            print(f"Created {len(created)} partition(s).")
+        elif args.command == "archive":
+            before = args.before or _add_months(date.today().replace(day=1), -args.older_than_months + 1)
+            for record in archive(before=before, directory=args.dir, keep_tables=args.keep_tables):
+                print(f"{record['month']:%Y-%m}: {record['row_count']} row(s) -> {record['path']}")
+        elif args.command == "restore":
+            print(f"Restored {restore(month=args.month)} row(s) for {args.month:%Y-%m}.")
+        else:
+            if not is_partitioned():
+                print(f"{PARENT} is not partitioned.")
+                return
+            with engine.connect() as conn:
+                attached = attached_months(conn)
+            print("Attached: " + (", ".join(month.strftime("%Y-%m") for month in attached) or "none"))
+            print("Archived: " + (", ".join(month.strftime("%Y-%m") for month in archived_months()) or "none"))
+    except PartitionError as e:
+        raise SystemExit(str(e))
+
+if __name__ == "__main__":
+    main()
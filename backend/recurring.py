@@ -0,0 +1,197 @@
+"""Recurring transaction rules and the materializer that turns due occurrences into ledger entries.
+
+Run it on a schedule (e.g. hourly from cron): `python recurring.py`. Due rules are read in id
+order, RECURRING_BATCH_SIZE at a time, with FOR UPDATE SKIP LOCKED so overlapping runs split
+the work. Each batch is one transaction: a multi-row INSERT of every due occurrence, one
+executemany each for balances, rollups, checkpoints, rule cursors and data versions.
+
+Occurrence n of a rule is computed from its start_date rather than from occurrence n-1, so a
+monthly rule on the 31st falls on the last day of shorter months and goes back to the 31st.
+A rule's cursor (next_occurrence) advances in the same transaction as its entries, and the
+unique (recurring_rule_id, transaction_date) index makes a second insert of the same
+occurrence a no-op. After downtime, every missed occurrence up to today is generated, up to
+RECURRING_MAX_CATCH_UP per rule per pass; passes repeat until no rule is due.
+"""
+import argparse
+import calendar
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import AccountLedger, Category, RecurringRule
+from balances import adjust_balances
+from ledger_rules import apply_category_sign
+from rollups import RollupDeltas
+from versions import bump_data_versions
+
+RECURRING_BATCH_SIZE = int(os.getenv("RECURRING_BATCH_SIZE", "2000"))
+RECURRING_MAX_CATCH_UP = int(os.getenv("RECURRING_MAX_CATCH_UP", "1000"))
+
+RULE_COLUMNS = (
+    RecurringRule.id,
+    RecurringRule.user_id,
+    RecurringRule.account_id,
+    RecurringRule.category_id,
+    RecurringRule.amount,
+    RecurringRule.narration,
+    RecurringRule.frequency,
+    RecurringRule.interval,
+    RecurringRule.start_date,
+    RecurringRule.end_date,
+    RecurringRule.max_occurrences,
+    RecurringRule.next_occurrence,
+    Category.category_type,
+)
+
+def _add_months(start: date, months: int) -> date:
+    month_index = start.month - 1 + months
+    year, month = start.year + month_index // 12, month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+def occurrence_date(frequency: str, interval: int, start_date: date, index: int) -> date:
+    """Date of the index-th occurrence (0 = start_date)"""
+    step = index * interval
+    if frequency == "daily":
+        return start_date + timedelta(days=step)
+    if frequency == "weekly":
+        return start_date + timedelta(weeks=step)
+    if frequency == "monthly":
+        return _add_months(start_date, step)
+    if frequency == "yearly":
+        return _add_months(start_date, 12 * step)
+    raise ValueError(f"unknown frequency {frequency!r}")
+
+def scheduled_date(rule, index: int) -> Optional[date]:
+    """Date of the index-th occurrence, or None when the schedule ends before it"""
+    if rule.max_occurrences is not None and index >= rule.max_occurrences:
+        return None
+    day = occurrence_date(rule.frequency, rule.interval, rule.start_date, index)
+    if rule.end_date is not None and day > rule.end_date:
+        return None
+    return day
+
+def _insert_entries(db: Session, records: list) -> list:
+    """Insert the entries, skipping occurrences that already exist; returns the rows actually inserted"""
+    table = AccountLedger.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(table).on_conflict_do_nothing(
+            index_elements=[table.c.recurring_rule_id, table.c.transaction_date],
+            index_where=table.c.recurring_rule_id.isnot(None),
+        )
+    else:
+        stmt = insert(table)
+    # executemany with RETURNING is sent as multi-row INSERTs
+    return db.execute(
+        stmt.returning(table.c.created_by, table.c.account_id, table.c.category_id, table.c.transaction_date, table.c.amount),
+        records,
+    ).all()
+
+def materialize_batch(db: Session, as_of: date, after_id: int = 0, rule_ids=None) -> Optional[dict]:
+    """Generate the due occurrences of the next batch of rules after after_id inside the caller's
+    transaction; returns None when no rule is left"""
+    query = (
+        select(*RULE_COLUMNS)
+        .outerjoin(Category, Category.id == RecurringRule.category_id)
+        .where(RecurringRule.next_date <= as_of, RecurringRule.id > after_id)
+        .order_by(RecurringRule.id)
+        .limit(RECURRING_BATCH_SIZE)
+        .with_for_update(of=RecurringRule, skip_locked=True)
+    )
+    if rule_ids is not None:
+        query = query.where(RecurringRule.id.in_(rule_ids))
+    rules = db.execute(query).all()
+    if not rules:
+        return None
+
+    created_on = datetime.utcnow()
+    records = []
+    cursors = []
+    pending = False
+    for rule in rules:
+        # The category's current type decides the sign, as it does for entries typed in by hand
+        amount = apply_category_sign(rule.amount, rule.category_type)
+        index = rule.next_occurrence
+        day = scheduled_date(rule, index)
+        while day is not None and day <= as_of and index - rule.next_occurrence < RECURRING_MAX_CATCH_UP:
+            records.append({
+                "account_id": rule.account_id,
+                "created_by": rule.user_id,
+                "amount": amount,
+                "category_id": rule.category_id,
+                "narration": rule.narration,
+                "transaction_date": datetime(day.year, day.month, day.day),
+                "created_on": created_on,
+                "recurring_rule_id": rule.id,
+            })
+            index += 1
+            day = scheduled_date(rule, index)
+        pending = pending or (day is not None and day <= as_of)
+        cursors.append({"b_id": rule.id, "b_next_occurrence": index, "b_next_date": day})
+
+    inserted = _insert_entries(db, records) if records else []
+    balance_deltas = {}
+    rollup_deltas = RollupDeltas()
+    for created_by, account_id, category_id, transaction_date, entry_amount in inserted:
+        balance_deltas[account_id] = balance_deltas.get(account_id, 0) + entry_amount
+        rollup_deltas.add(created_by, account_id, category_id, transaction_date, entry_amount)
+    # Balance rows first: their locks order concurrent checkpoint updates per account
+    adjust_balances(db, balance_deltas)
+    rollup_deltas.apply(db)
+    table = RecurringRule.__table__
+    db.execute(
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(next_occurrence=bindparam("b_next_occurrence"), next_date=bindparam("b_next_date")),
+        cursors,
+    )
+    bump_data_versions(db, {created_by for created_by, *_ in inserted})
+    return {"last_id": rules[-1].id, "rules": len(rules), "entries": len(inserted), "pending": pending}
+
+def materialize(db: Session, as_of: Optional[date] = None) -> dict:
+    """Generate every occurrence due on or before as_of (default today), committing each batch"""
+    as_of = as_of or datetime.utcnow().date()
+    totals = {"rules": 0, "entries": 0, "batches": 0}
+    while True:
+        after_id = 0
+        pending = False
+        while True:
+            batch = materialize_batch(db, as_of, after_id)
+            if batch is None:
+                db.rollback()
+                break
+            db.commit()
+            after_id = batch["last_id"]
+            pending = pending or batch["pending"]
+            totals["rules"] += batch["rules"]
+            totals["entries"] += batch["entries"]
+            totals["batches"] += 1
+        # Rules capped by RECURRING_MAX_CATCH_UP are still due; go round again
+        if not pending:
+            return totals
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate ledger entries for due recurring rules")
+    parser.add_argument("--as-of", type=date.fromisoformat, help="generate occurrences up to this day (default: today)")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    started = time.perf_counter()
+    try:
+        totals = materialize(db, args.as_of)
+    finally:
+        db.close()
+    print(
+        f"Generated {totals['entries']} entries for {totals['rules']} due rule(s) "
+        f"in {totals['batches']} batch(es), {time.perf_counter() - started:.1f}s."
+    )
+
+if __name__ == "__main__":
+    main()
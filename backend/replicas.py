@@ -0,0 +1,189 @@
+"""Read-replica selection with read-your-writes consistency.
+
+GET requests read from a replica once the user is known. Each user's row in
+user_data_versions is bumped in the same transaction as every write they make, so it
+doubles as a per-user commit watermark:
+
+- writes older than REPLICA_STICKY_SECONDS are on every replica that is within
+  REPLICA_MAX_LAG_SECONDS (the lag limit is capped inside the window);
+- inside the window a replica is used only once its copy of the row has reached the
+  primary's version, i.e. once it has replayed the user's latest commit;
+- otherwise the read stays on the primary.
+
+Each process caches a user's row from the primary for REPLICA_MARKER_CACHE_SECONDS, so a
+user's run of reads costs one primary round trip rather than one each. A write committed
+by this process drops the user's entry at once; a write made through another process is
+seen once the entry expires.
+
+A daemon thread polls every replica's replay lag; replicas that fail the check or fall
+behind are skipped until they recover.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from typing import List, Optional
+from sqlalchemy import text
+from cache import TTLCache
+from metrics import CounterFamily
+
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+REPLICA_CHECK_INTERVAL_SECONDS = float(os.getenv("REPLICA_CHECK_INTERVAL_SECONDS", "1"))
+# 0 looks the marker up on the primary for every routed read
+REPLICA_MARKER_CACHE_SECONDS = float(os.getenv("REPLICA_MARKER_CACHE_SECONDS", "1"))
+REPLICA_MARKER_CACHE_SIZE = 10000
+# Lag is up to one check interval old; capped so a write can't age out of the sticky window
+# before every eligible replica has replayed it
+REPLICA_MAX_LAG_SECONDS = max(min(
+    float(os.getenv("REPLICA_MAX_LAG_SECONDS", "2")),
+    REPLICA_STICKY_SECONDS - REPLICA_CHECK_INTERVAL_SECONDS,
+), 0)
+
+logger = logging.getLogger("elephant_book.replicas")
+
+read_routes = CounterFamily("db_read_routing_total", "Read-only requests by where they were sent and why", "decision")
+
+# Zero when the replica has replayed everything it received, otherwise time since the last replayed commit
+LAG_SQL = text(
+    "SELECT pg_is_in_recovery(), CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+# Seconds left in the sticky window, on the primary's clock so app and database clocks needn't agree
+PRIMARY_MARKER_SQL = text(
+    "SELECT version, EXTRACT(EPOCH FROM updated_at - LOCALTIMESTAMP) + :window "
+    "FROM user_data_versions WHERE user_id = :user_id"
+)
+REPLICA_VERSION_SQL = text("SELECT version FROM user_data_versions WHERE user_id = :user_id")
+
+class Replica:
+    def __init__(self, name: str, engine, async_engine=None):
+        self.name = name
+        self.engine = engine
+        self.async_engine = async_engine
+        self.healthy = False
+        self.lag_seconds: Optional[float] = None
+        self.last_checked: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.failures = 0
+
+    def bind_for(self, asynchronous: bool):
+        # AsyncSession runs its sync Session against the async engine's sync facade
+        return self.async_engine.sync_engine if asynchronous and self.async_engine is not None else self.engine
+
+    @property
+    def eligible(self) -> bool:
+        return self.healthy and self.lag_seconds is not None and self.lag_seconds <= REPLICA_MAX_LAG_SECONDS
+
+    def check(self):
+        try:
+            with self.engine.connect() as conn:
+                in_recovery, lag = conn.execute(LAG_SQL).one()
+            self.lag_seconds = float(lag)
+            # A promoted replica is no longer following the primary
+            self.healthy = bool(in_recovery)
+            self.last_error = None if in_recovery else "not in recovery"
+        except Exception as e:
+            self.healthy = False
+            self.failures += 1
+            self.last_error = f"{type(e).__name__}: {e}"
+            logger.warning("replica %s failed its health check: %s", self.name, self.last_error)
+        self.last_checked = time.time()
+
+    def status(self) -> dict:
+        return {
+            "healthy": self.healthy,
+            "eligible": self.eligible,
+            "lag_seconds": self.lag_seconds,
+            "last_checked": self.last_checked,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+class ReplicaSet:
+    def __init__(self, replicas: List[Replica]):
+        self.replicas = replicas
+        # user_id -> (version, monotonic time the sticky window ends)
+        self._markers = TTLCache(REPLICA_MARKER_CACHE_SIZE, REPLICA_MARKER_CACHE_SECONDS)
+        self._lock = threading.Lock()
+        self._poller = None
+
+    def start(self):
+        """Run the first health check inline, then keep polling from a daemon thread"""
+        with self._lock:
+            if self._poller is not None:
+                return
+            for replica in self.replicas:
+                replica.check()
+            self._poller = threading.Thread(target=self._poll, name="replica-health", daemon=True)
+            self._poller.start()
+
+    def _poll(self):
+        while True:
+            time.sleep(REPLICA_CHECK_INTERVAL_SECONDS)
+            for replica in self.replicas:
+                replica.check()
+
+    def choose(self) -> Optional[Replica]:
+        """A replica within the lag limit, favouring the ones furthest ahead"""
+        self.start()
+        candidates = [replica for replica in self.replicas if replica.eligible]
+        if not candidates:
+            return None
+        return random.choices(candidates, weights=[1 / (1 + replica.lag_seconds) for replica in candidates])[0]
+
+    def read_bind(self, primary, user_id: int, asynchronous: bool = False):
+        """Engine for the rest of a read-only request, or None to stay on the primary"""
+        replica = self.choose()
+        if replica is None:
+            read_routes.inc("primary_no_replica")
+            return None
+        version, recent_until = self._marker(primary, user_id)
+        bind = replica.bind_for(asynchronous)
+        if recent_until <= time.monotonic():
+            read_routes.inc("replica")
+            return bind
+        try:
+            with bind.connect() as conn:
+                replica_version = conn.execute(REPLICA_VERSION_SQL, {"user_id": user_id}).scalar()
+        except Exception:
+            replica.healthy = False
+            read_routes.inc("primary_replica_error")
+            return None
+        if replica_version is not None and replica_version >= version:
+            read_routes.inc("replica_caught_up")
+            return bind
+        read_routes.inc("primary_recent_write")
+        return None
+
+    def _marker(self, primary, user_id: int) -> tuple:
+        marker = self._markers.get(user_id)
+        if marker is None:
+            with primary.connect() as conn:
+                row = conn.execute(PRIMARY_MARKER_SQL, {"user_id": user_id, "window": REPLICA_STICKY_SECONDS}).first()
+            # A user who never wrote has no row and nothing a replica could be missing
+            marker = (row[0], time.monotonic() + float(row[1])) if row is not None else (0, 0.0)
+            self._markers.set(user_id, marker)
+        return marker
+
+    def forget(self, user_id: int):
+        """Drop a cached marker once this process has committed a write for the user"""
+        self._markers.pop(user_id)
+
+    def status(self) -> dict:
+        return {replica.name: replica.status() for replica in self.replicas}
+
+    def render_metrics(self) -> List[str]:
+        lines = [
+            "# HELP db_replica_up Whether the replica passed its last health check",
+            "# TYPE db_replica_up gauge",
+        ]
+        lines.extend(f'db_replica_up{{replica="{replica.name}"}} {int(replica.healthy)}' for replica in self.replicas)
+        lines.append("# HELP db_replica_lag_seconds Replay lag reported by the replica's last health check")
+        lines.append("# TYPE db_replica_lag_seconds gauge")
+        lines.extend(
+            f'db_replica_lag_seconds{{replica="{replica.name}"}} {replica.lag_seconds}'
+            for replica in self.replicas if replica.lag_seconds is not None
+        )
+        lines.extend(read_routes.render())
+        return lines
@@ -0,0 +1,244 @@
+import argparse
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import Date, case, cast, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from database import SessionLocal
+from models import Account, AccountLedger, Category, LedgerRollup
+import checkpoints
+
+ZERO = Decimal('0')
+
+def month_of(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+def next_month(value: date) -> date:
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+class RollupDeltas:
+    """Accumulates ledger changes per rollup key so each key is written once"""
+
+    def __init__(self):
+        self._deltas = {}
+
+    def add(self, user_id: int, account_id: int, category_id: Optional[int], transaction_date: datetime, amount: Decimal, sign: int = 1):
+        key = (user_id, account_id, category_id or 0, month_of(transaction_date))
+        income, expense, count = self._deltas.get(key, (ZERO, ZERO, 0))
+        if amount > 0:
+            income += sign * amount
+        else:
+            expense += sign * amount
+        self._deltas[key] = (income, expense, count + sign)
+
+    def apply(self, db: Session):
+        """Write the rollups and shift the matching balance checkpoints"""
+        account_months = {}
+        rows = []
+        for (user_id, account_id, category_id, month), (income, expense, count) in sorted(self._deltas.items()):
+            if income or expense or count:
+                rows.append(dict(
+                    user_id=user_id, account_id=account_id, category_id=category_id, month=month,
+                    income=income, expense=expense, entry_count=count,
+                ))
+                account_months[(account_id, month)] = account_months.get((account_id, month), ZERO) + income + expense
+        _upsert(db, rows)
+        checkpoints.apply_deltas(db, account_months)
+        self._deltas.clear()
+
+def _upsert(db: Session, rows: list):
+    if not rows:
+        return
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(LedgerRollup)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[LedgerRollup.account_id, LedgerRollup.category_id, LedgerRollup.month],
+            set_={
+                "income": LedgerRollup.income + stmt.excluded.income,
+                "expense": LedgerRollup.expense + stmt.excluded.expense,
+                "entry_count": LedgerRollup.entry_count + stmt.excluded.entry_count,
+            },
+        )
+        # One executemany for every key
+        db.execute(stmt, rows)
+        return
+    for values in rows:
+        result = db.execute(
+            update(LedgerRollup)
+            .where(
+                LedgerRollup.account_id == values["account_id"],
+                LedgerRollup.category_id == values["category_id"],
+                LedgerRollup.month == values["month"],
+            )
+            .values(
+                income=LedgerRollup.income + values["income"],
+                expense=LedgerRollup.expense + values["expense"],
+                entry_count=LedgerRollup.entry_count + values["entry_count"],
+            )
+        )
+        if result.rowcount == 0:
+            db.execute(insert(LedgerRollup).values(**values))
+
+def add_entry(db: Session, user_id: int, entry, sign: int = 1):
+    """Add (sign=1) or remove (sign=-1) one ledger entry's contribution"""
+    deltas = RollupDeltas()
+    deltas.add(user_id, entry.account_id, entry.category_id, entry.transaction_date, entry.amount, sign)
+    deltas.apply(db)
+
+def move_entry(db: Session, user_id: int, old_values: tuple, entry):
+    """Re-file an edited entry; old_values is (account_id, category_id, transaction_date, amount) before the edit"""
+    deltas = RollupDeltas()
+    deltas.add(user_id, *old_values, sign=-1)
+    deltas.add(user_id, entry.account_id, entry.category_id, entry.transaction_date, entry.amount)
+    deltas.apply(db)
+
+def uncategorise(db: Session, category_id: int):
+    """Move a category's rollups to uncategorised, as ON DELETE SET NULL does with its entries"""
+    rows = db.execute(
+        select(
+            LedgerRollup.user_id, LedgerRollup.account_id, LedgerRollup.month,
+            LedgerRollup.income, LedgerRollup.expense, LedgerRollup.entry_count,
+        ).where(LedgerRollup.category_id == category_id)
+    ).all()
+    if not rows:
+        return
+    db.execute(delete(LedgerRollup).where(LedgerRollup.category_id == category_id))
+    # Account-month totals don't change, so the checkpoints stay as they are
+    _upsert(db, [
+        dict(user_id=user_id, account_id=account_id, category_id=0, month=month, income=income, expense=expense, entry_count=count)
+        for user_id, account_id, month, income, expense, count in rows
+    ])
+
+def month_start(db: Session, column):
+    if db.get_bind().dialect.name == "sqlite":
+        return func.date(column, "start of month")
+    return cast(func.date_trunc("month", column), Date)
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute rollups from the ledger with one set-based INSERT ... SELECT"""
+    month = month_start(db, AccountLedger.transaction_date)
+    source = (
+        select(
+            Account.user_id,
+            AccountLedger.account_id,
+            func.coalesce(AccountLedger.category_id, 0),
+            month,
+            func.sum(case((AccountLedger.amount > 0, AccountLedger.amount), else_=0)),
+            func.sum(case((AccountLedger.amount < 0, AccountLedger.amount), else_=0)),
+            func.count(),
+        )
+        .join(Account, Account.id == AccountLedger.account_id)
+        .group_by(Account.user_id, AccountLedger.account_id, func.coalesce(AccountLedger.category_id, 0), month)
+    )
+    if not db.info.get("include_deleted", False):
+        # INSERT ... SELECT skips the soft-delete filter ORM SELECTs get; leave purging accounts out here too
+        source = source.where(Account.deleted_at.is_(None))
+    clear = delete(LedgerRollup)
+    if user_id is not None:
+        source = source.where(Account.user_id == user_id)
+        clear = clear.where(LedgerRollup.user_id == user_id)
+    db.execute(clear)
+    result = db.execute(
+        insert(LedgerRollup).from_select(
+            ["user_id", "account_id", "category_id", "month", "income", "expense", "entry_count"],
+            source,
+        )
+    )
+    db.commit()
+    return result.rowcount
+
+def build_report(db: Session, user_id: int, start_month: Optional[date], end_month: Optional[date], account_id: Optional[int] = None) -> dict:
+    query = select(
+        LedgerRollup.month,
+        LedgerRollup.category_id,
+        func.sum(LedgerRollup.income),
+        func.sum(LedgerRollup.expense),
+    ).where(LedgerRollup.user_id == user_id)
+    if start_month:
+        query = query.where(LedgerRollup.month >= month_of(start_month))
+    if end_month:
+        query = query.where(LedgerRollup.month <= month_of(end_month))
+    if account_id:
+        query = query.where(LedgerRollup.account_id == account_id)
+    rows = db.execute(query.group_by(LedgerRollup.month, LedgerRollup.category_id)).all()
+
+    categories = {
+        category.id: category
+        for category in db.query(Category).filter(Category.user_id == user_id).all()
+    }
+    by_category = {}
+    by_month = {}
+    total_income = total_expense = ZERO
+    for month, category_id, income, expense in rows:
+        income, expense = Decimal(income or 0), Decimal(expense or 0)
+        total_income += income
+        total_expense += expense
+        category_totals = by_category.setdefault(category_id, [ZERO, ZERO])
+        category_totals[0] += income
+        category_totals[1] += expense
+        month_totals = by_month.setdefault(month, [ZERO, ZERO])
+        month_totals[0] += income
+        month_totals[1] += expense
+
+    category_report = []
+    for category_id, (income, expense) in sorted(by_category.items(), key=lambda item: item[1][0] + item[1][1]):
+        category = categories.get(category_id)
+        category_report.append({
+            "category_id": category_id or None,
+            "name": category.name if category else None,
+            "category_type": category.category_type if category else None,
+            "income": income,
+            "expense": expense,
+            "net": income + expense,
+        })
+
+    # Fill empty months so trends line up month over month
+    month_report = []
+    if by_month:
+        month = month_of(start_month) if start_month else min(by_month)
+        last = month_of(end_month) if end_month else max(by_month)
+        previous_net = None
+        while month <= last:
+            income, expense = by_month.get(month, (ZERO, ZERO))
+            net = income + expense
+            month_report.append({
+                "month": month,
+                "income": income,
+                "expense": expense,
+                "net": net,
+                "net_change": None if previous_net is None else net - previous_net,
+            })
+            previous_net = net
+            month = next_month(month)
+
+    return {
+        "totals": {
+            "income": total_income,
+            "expense": total_expense,
+            "net": total_income + total_expense,
+        },
+        "categories": category_report,
+        "months": month_report,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild monthly ledger rollups from the ledger")
+    parser.add_argument("--user-id", type=int, help="only rebuild this user's rollups")
+    args = parser.parse_args()
+    from partitions import require_full_ledger
+    require_full_ledger("rebuild rollups")
+
+    db = SessionLocal()
+    try:
+        count = rebuild(db, args.user_id)
+    finally:
+        db.close()
+    print(f"Rebuilt {count} rollup row(s).")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,11 @@
-from pydantic import BaseModel, EmailStr
-from datetime import datetime
-from typing import Optional
+from pydantic import AfterValidator, BaseModel, EmailStr, Field
+from datetime import date, datetime
+from typing import Annotated, Any, List, Literal, Optional
 from decimal import Decimal
+from ledger_rules import round_amount
+
+# Amounts written to the ledger, rounded to the cent on the way in
+Money = Annotated[Decimal, AfterValidator(round_amount)]
 
 # User Schemas
 class UserCreate(BaseModel):
@@ -53,6 +57,22 @@ class AccountResponse(BaseModel):
 class AccountWithBalance(AccountResponse):
     balance: Decimal
 
+class AccountBalanceAsOf(BaseModel):
+    account_id: int
+    as_of: date
+    balance: Decimal  # closing balance at the end of as_of
+
+class BalancePoint(BaseModel):
+    date: date
+    balance: Decimal
+
+class BalanceHistory(BaseModel):
+    account_id: int
+    start: date
+    end: date
+    interval: str
+    points: List[BalancePoint]  # closing balance at the end of each interval
+
 # Category Schemas
 class CategoryCreate(BaseModel):
     category_type: str  # 'income' or 'expense'
@@ -75,14 +95,14 @@ class CategoryResponse(BaseModel):
 # Ledger Schemas
 class LedgerCreate(BaseModel):
     account_id: int
-    amount: Decimal
+    amount: Money
     category_id: Optional[int] = None
     narration: Optional[str] = None
     transaction_date: datetime
 
 class LedgerUpdate(BaseModel):
     account_id: Optional[int] = None
-    amount: Optional[Decimal] = None
+    amount: Optional[Money] = None
     category_id: Optional[int] = None
     narration: Optional[str] = None
     transaction_date: Optional[datetime] = None
@@ -96,15 +116,129 @@ class LedgerResponse(BaseModel):
     narration: Optional[str]
     transaction_date: datetime
     created_on: datetime
+    transfer_id: Optional[str] = None
+    recurring_rule_id: Optional[int] = None
     
     class Config:
         from_attributes = True
 
+class LedgerPage(BaseModel):
+    items: List[LedgerResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= to fetch the next page; None on the last page
+
+class LedgerSearchResult(LedgerResponse):
+    rank: float  # higher is a better match; only comparable within one query
+
+class LedgerSearchPage(BaseModel):
+    items: List[LedgerSearchResult]
+    next_cursor: Optional[str] = None
+
+class LedgerImportError(BaseModel):
+    row: int
+    error: str
+
+class LedgerImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[LedgerImportError]
+    errors_truncated: bool = False
+
+class LedgerBatchOperation(LedgerUpdate):
+    op: Literal['create', 'update', 'delete']
+    id: Optional[int] = None  # target entry for update/delete
+
+class LedgerBatchRequest(BaseModel):
+    operations: List[LedgerBatchOperation] = Field(..., max_length=1000)
+    # atomic: apply nothing if any operation fails; best_effort: apply the ones that succeed
+    mode: Literal['atomic', 'best_effort'] = 'atomic'
+
+class LedgerBatchResult(BaseModel):
+    index: int
+    op: str
+    ok: bool
+    id: Optional[int] = None
+    entry: Optional[LedgerResponse] = None
+    error: Optional[str] = None
+
+class LedgerBatchResponse(BaseModel):
+    applied: bool
+    results: List[LedgerBatchResult]
+
 # Transfer Schema
 class TransferCreate(BaseModel):
     from_account_id: int
     to_account_id: int
-    amount: Decimal
+    amount: Money
     narration: Optional[str] = None
     transaction_date: datetime
 
+# Recurring Transaction Schemas
+class RecurringRuleCreate(BaseModel):
+    account_id: int
+    category_id: Optional[int] = None
+    amount: Money
+    narration: Optional[str] = None
+    frequency: Literal['daily', 'weekly', 'monthly', 'yearly']
+    interval: int = Field(1, ge=1, le=1000)
+    start_date: date
+    end_date: Optional[date] = None
+    max_occurrences: Optional[int] = Field(None, ge=1)
+
+class RecurringRuleUpdate(BaseModel):
+    account_id: Optional[int] = None
+    category_id: Optional[int] = None
+    amount: Optional[Money] = None
+    narration: Optional[str] = None
+    end_date: Optional[date] = None
+    max_occurrences: Optional[int] = Field(None, ge=1)
+
+class RecurringRuleResponse(BaseModel):
+    id: int
+    account_id: int
+    category_id: Optional[int]
+    amount: Decimal
+    narration: Optional[str]
+    frequency: str
+    interval: int
+    start_date: date
+    end_date: Optional[date]
+    max_occurrences: Optional[int]
+    next_occurrence: int  # occurrences generated so far
+    next_date: Optional[date]  # None once the schedule has ended
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+# Report Schemas
+class ReportTotals(BaseModel):
+    income: Decimal
+    expense: Decimal
+    net: Decimal
+
+class CategoryReport(ReportTotals):
+    category_id: Optional[int]  # None for uncategorised entries and transfers
+    name: Optional[str]
+    category_type: Optional[str]
+
+class MonthReport(ReportTotals):
+    month: date
+    net_change: Optional[Decimal]  # net minus the previous month's net
+
+class LedgerReport(BaseModel):
+    totals: ReportTotals
+    categories: List[CategoryReport]
+    months: List[MonthReport]
+
+# Job Schemas
+class JobResponse(BaseModel):
+    id: int
+    kind: str
+    status: str  # queued, running, succeeded or failed
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    created_at: datetime
+    finished_at: Optional[datetime]
+    result: Optional[Any]
+    error: Optional[str]
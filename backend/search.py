@@ -0,0 +1,51 @@
+from sqlalchemy import Float, and_, case, cast, func, literal_column, or_
+from sqlalchemy.orm import Session
+from models import AccountLedger
+
+# Must match the index expressions below exactly, or PostgreSQL won't use them
+TSVECTOR_SQL = "to_tsvector('simple'::regconfig, COALESCE(narration, ''::text))"
+SEARCH_INDEXES = (
+    ("ix_account_ledger_narration_tsv", f"CREATE INDEX IF NOT EXISTS ix_account_ledger_narration_tsv ON account_ledger USING gin ({TSVECTOR_SQL})"),
+    ("ix_account_ledger_narration_trgm", "CREATE INDEX IF NOT EXISTS ix_account_ledger_narration_trgm ON account_ledger USING gin (narration gin_trgm_ops)"),
+)
+MAX_QUERY_LENGTH = 200
+
+# "/" rather than backslash, which PostgreSQL treats differently depending on standard_conforming_strings
+LIKE_ESCAPE = "/"
+
+def _like_pattern(term: str) -> str:
+    escaped = term.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return f"%{escaped}%"
+
+def _is_postgresql(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+def _terms(q: str) -> list:
+    return q.split()
+
+def _pg_tsquery(q: str):
+    # websearch syntax: quoted phrases, OR, -exclusions; never raises on user input
+    return func.websearch_to_tsquery(literal_column("'simple'::regconfig"), q)
+
+def match_clause(db: Session, q: str):
+    """Entries whose narration matches q: full text, substring or (on PostgreSQL) fuzzy word match"""
+    narration = AccountLedger.narration
+    if _is_postgresql(db):
+        return or_(
+            literal_column(TSVECTOR_SQL).op("@@")(_pg_tsquery(q)),
+            narration.ilike(_like_pattern(q), escape=LIKE_ESCAPE),
+            narration.op("%>")(q),
+        )
+    # Portable fallback: every term must appear somewhere (LIKE is case-insensitive for ASCII on SQLite)
+    return and_(*[narration.like(_like_pattern(term), escape=LIKE_ESCAPE) for term in _terms(q)])
+
+def rank_expression(db: Session, q: str):
+    """Higher is better; used for /ledger/search ordering and its cursor"""
+    narration = AccountLedger.narration
+    if _is_postgresql(db):
+        return cast(func.greatest(
+            func.ts_rank(literal_column(TSVECTOR_SQL), _pg_tsquery(q)),
+            func.word_similarity(q, narration),
+        ), Float)
+    # Entries containing the whole phrase first, then those containing every term
+    return case((narration.like(_like_pattern(q), escape=LIKE_ESCAPE), 2.0), else_=1.0)
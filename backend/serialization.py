@@ -0,0 +1,32 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Optional, Sequence
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt; stdlib json keeps things working without it
+    orjson = None
+
+def _default(value):
+    # Decimals go out as strings, exactly as pydantic renders them, so no precision is lost
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def rows_as_dicts(keys: Sequence[str], rows: Iterable[tuple]) -> list:
+    """Column tuples straight to dicts, skipping ORM identity-map and pydantic work per row"""
+    return [dict(zip(keys, row)) for row in rows]
+
+def json_response(payload, response: Optional[Response] = None) -> Response:
+    """Pre-encoded JSON; carries over headers dependencies set on the injected response (ETag etc.)"""
+    headers = dict(response.headers) if response is not None else None
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
@@ -0,0 +1,160 @@
+"""Production entry point: wait for the database, check the schema, import the app once,
+then fork the requested number of uvicorn workers that share one listening socket.
+
+    python serve.py --host 0.0.0.0 --port 8000 --workers 4
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import traceback
+
+# A worker that dies sooner than this after starting is crash-looping; slow its restarts down
+MIN_WORKER_LIFETIME_SECONDS = 1.0
+
+def _available_cores() -> int:
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _elapsed_ms(since: float = STARTED) -> float:
+    return (time.perf_counter() - since) * 1000
+
+def log(message: str):
+    print(f"[serve {os.getpid()}] {message}", flush=True)
+
+class FirstRequestTimer:
+    """Logs how long after launch each worker received its first HTTP request"""
+
+    def __init__(self, app):
+        self.app = app
+        self.seen = False
+
+    async def __call__(self, scope, receive, send):
+        if not self.seen and scope["type"] == "http":
+            self.seen = True
+            log(f"first request {_elapsed_ms():.0f} ms after launch")
+        await self.app(scope, receive, send)
+
+def bind_socket(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(app, sock: socket.socket, args):
+    import uvicorn
+    config = uvicorn.Config(
+        FirstRequestTimer(app),
+        log_level=args.log_level,
+        access_log=args.access_log,
+        proxy_headers=True,
+        forwarded_allow_ips=args.forwarded_allow_ips,
+        timeout_keep_alive=args.keep_alive,
+    )
+    server = uvicorn.Server(config)
+    log(f"worker serving {_elapsed_ms():.0f} ms after launch")
+    server.run(sockets=[sock])
+
+def supervise(app, sock: socket.socket, args):
+    """Fork the workers, restart any that exit, and pass SIGTERM/SIGINT on to them"""
+    workers = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                run_worker(app, sock, args)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        workers[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+    log(f"{args.workers} workers forked {_elapsed_ms():.0f} ms after launch")
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if stopping or started is None:
+            continue
+        log(f"worker {pid} exited with status {os.waitstatus_to_exitcode(status)}; restarting")
+        if time.monotonic() - started < MIN_WORKER_LIFETIME_SECONDS:
+            time.sleep(MIN_WORKER_LIFETIME_SECONDS)
+        spawn()
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Elephant Book API with preloaded worker processes")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(_available_cores()))))
+    parser.add_argument("--backlog", type=int, default=2048)
+    parser.add_argument("--keep-alive", type=int, default=5, help="seconds to hold idle keep-alive connections")
+    parser.add_argument("--log-level", default=os.getenv("LOG_LEVEL", "info"))
+    parser.add_argument("--access-log", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--forwarded-allow-ips", default=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"))
+    parser.add_argument("--skip-migrations", action="store_true", help="don't check or apply schema migrations")
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    # Split the cores between the workers' bcrypt pools instead of giving each worker all of them
+    os.environ.setdefault("HASH_WORKERS", str(max(_available_cores() // args.workers, 1)))
+
+    from database import engine
+    import init_db
+    waited = init_db.wait_for_database()
+    log(f"database ready after {waited * 1000:.0f} ms")
+    if not args.skip_migrations:
+        schema_started = time.perf_counter()
+        applied = init_db.ensure_schema()
+        init_db.ensure_partitions()
+        log(f"schema {'upgraded through ' + str(applied) if applied else 'current'} ({_elapsed_ms(schema_started):.0f} ms)")
+
+    import_started = time.perf_counter()
+    from main import app
+    # Imported before forking so workers start with it already loaded
+    import uvicorn  # noqa: F401
+    log(f"app imported in {_elapsed_ms(import_started):.0f} ms; ready {_elapsed_ms():.0f} ms after launch")
+
+    # Children must open their own connections, not share the parent's sockets
+    engine.dispose()
+    sock = bind_socket(args.host, args.port, args.backlog)
+    log(f"listening on {args.host}:{args.port}")
+    if args.workers == 1:
+        run_worker(app, sock, args)
+    else:
+        supervise(app, sock, args)
+    sys.exit(0)
+
+if __name__ == "__main__":
+    main()
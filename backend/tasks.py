@@ -0,0 +1,150 @@
+"""Ledger maintenance that can run inline in a request or as a background job.
+
+Every function except purge_account works inside the caller's transaction and never commits:
+the endpoint commits its request, the job worker commits the work together with the job's own
+status. Each one is safe to run again after it has already succeeded, since a job can be retried
+after a crash.
+"""
+import os
+import shutil
+import tempfile
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+from models import Account, AccountBalanceCheckpoint, AccountLedger, Category, LedgerRollup, RecurringRule
+from balances import adjust_balances
+from ledger_import import import_statement
+import rollups
+from versions import bump_data_version
+
+# Uploads are copied here until a worker imports them; workers must see the same directory
+JOB_SPOOL_DIR = os.getenv("JOB_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "elephant_book_jobs"))
+# Ledger rows per purge transaction
+ACCOUNT_PURGE_CHUNK_SIZE = int(os.getenv("ACCOUNT_PURGE_CHUNK_SIZE", "5000"))
+
+def delete_account(db: Session, user_id: int, account_id: int) -> dict:
+    """Delete an account in one statement; ON DELETE CASCADE removes everything that references it"""
+    deleted = db.execute(
+        delete(Account).where(Account.id == account_id, Account.user_id == user_id),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if deleted:
+        bump_data_version(db, user_id)
+    return {"deleted": bool(deleted)}
+
+def soft_delete_account(db: Session, user_id: int, account_id: int) -> bool:
+    """Hide an account at once and leave its entries for purge_account"""
+    hidden = db.execute(
+        update(Account)
+        .where(Account.id == account_id, Account.user_id == user_id, Account.deleted_at.is_(None))
+        .values(deleted_at=datetime.utcnow()),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    if not hidden:
+        return False
+    # A few rows per month: reports and balance history stop counting the account now
+    db.execute(delete(LedgerRollup).where(LedgerRollup.account_id == account_id))
+    db.execute(delete(AccountBalanceCheckpoint).where(AccountBalanceCheckpoint.account_id == account_id))
+    # and no more entries are generated for it
+    db.execute(delete(RecurringRule).where(RecurringRule.account_id == account_id))
+    bump_data_version(db, user_id)
+    return True
+
+def purge_account(db: Session, user_id: int, account_id: int) -> dict:
+    """Delete a soft-deleted account's entries ACCOUNT_PURGE_CHUNK_SIZE at a time, then the account.
+
+    The one exception to the no-commit rule: each chunk commits on its own, so no transaction holds
+    row locks or WAL for the whole account. A retry after a crash picks up with the entries left.
+    """
+    account = select(Account.id).where(
+        Account.id == account_id, Account.user_id == user_id, Account.deleted_at.isnot(None)
+    ).execution_options(include_deleted=True)
+    if db.execute(account).first() is None:
+        return {"purged": 0}
+    purged = 0
+    while True:
+        chunk = select(AccountLedger.id).where(AccountLedger.account_id == account_id).limit(ACCOUNT_PURGE_CHUNK_SIZE)
+        deleted = db.execute(
+            delete(AccountLedger).where(AccountLedger.id.in_(chunk.scalar_subquery())),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        db.commit()
+        purged += deleted
+        if deleted < ACCOUNT_PURGE_CHUNK_SIZE:
+            break
+    # Only the balance row is left to cascade
+    db.execute(delete(Account).where(Account.id == account_id), execution_options={"synchronize_session": False})
+    return {"purged": purged}
+
+def resign_category(db: Session, user_id: int, category_id: int) -> dict:
+    """Flip the sign of the category's entries that disagree with its current type"""
+    category_type = db.scalar(select(Category.category_type).where(Category.id == category_id, Category.user_id == user_id))
+    if category_type == "expense":
+        wrong_sign = AccountLedger.amount > 0
+    elif category_type == "income":
+        wrong_sign = AccountLedger.amount < 0
+    else:
+        return {"resigned": 0}
+    matches = (AccountLedger.category_id == category_id, wrong_sign)
+
+    # Totals per account and month of the rows about to flip, so balances, rollups and
+    # checkpoints move by the same amounts without loading the rows
+    month = rollups.month_start(db, AccountLedger.transaction_date)
+    totals = db.execute(
+        select(AccountLedger.account_id, month, func.sum(AccountLedger.amount))
+        .where(*matches)
+        .group_by(AccountLedger.account_id, month)
+    ).all()
+    if not totals:
+        return {"resigned": 0}
+
+    balance_deltas = {}
+    deltas = rollups.RollupDeltas()
+    for account_id, month_value, total in totals:
+        if isinstance(month_value, str):
+            month_value = date.fromisoformat(month_value)
+        total = Decimal(total)
+        balance_deltas[account_id] = balance_deltas.get(account_id, Decimal("0")) - 2 * total
+        # Out of one column and into the other; the entry count nets to zero
+        deltas.add(user_id, account_id, category_id, month_value, total, sign=-1)
+        deltas.add(user_id, account_id, category_id, month_value, -total)
+    # Balance rows first: their locks order concurrent checkpoint updates per account
+    adjust_balances(db, balance_deltas)
+    resigned = db.execute(
+        update(AccountLedger).where(*matches).values(amount=-AccountLedger.amount),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    deltas.apply(db)
+    bump_data_version(db, user_id)
+    return {"resigned": resigned}
+
+def spool_upload(stream) -> str:
+    """Copy an uploaded statement to the spool directory and return its path"""
+    os.makedirs(JOB_SPOOL_DIR, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=JOB_SPOOL_DIR, prefix="import-", delete=False) as spooled:
+        shutil.copyfileobj(stream, spooled)
+    return spooled.name
+
+def import_spooled_statement(db: Session, user_id: int, path: str, format: str, account_id: Optional[int] = None) -> dict:
+    with open(path, "rb") as stream:
+        return import_statement(db, user_id, stream, format, account_id)
+
+def remove_spooled_statement(path: str, **_):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+# kind -> handler(db, user_id, **payload) returning the job's JSON result
+HANDLERS = {
+    "delete_account": delete_account,
+    "purge_account": purge_account,
+    "resign_category": resign_category,
+    "import_statement": import_spooled_statement,
+}
+# kind -> cleanup(**payload), run once the job has finished for good (succeeded or failed)
+CLEANUP = {
+    "import_statement": remove_spooled_statement,
+}
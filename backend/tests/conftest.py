@@ -0,0 +1,66 @@
+"""Shared fixtures: one throwaway SQLite database for the whole run, a fresh user per test"""
+import os
+import tempfile
+import uuid
+
+# The modules read their settings at import time, so these go in before anything imports them
+TEST_DIR = tempfile.mkdtemp(prefix="elephant_book_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(TEST_DIR, 'test.db')}"
+os.environ["JOB_SPOOL_DIR"] = os.path.join(TEST_DIR, "spool")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+os.environ.setdefault("HASH_WORKERS", "0")
+
+import pytest
+from fastapi.testclient import TestClient
+
+@pytest.fixture(scope="session")
+def app():
+    import init_db
+    init_db.init_db()
+    from main import app
+    return app
+
+@pytest.fixture
+def client(app):
+    with TestClient(app) as test_client:
+        yield test_client
+
+@pytest.fixture
+def db(app):
+    from database import SessionLocal
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def signup(client, password: str = "secret-pw") -> dict:
+    """Create a user with a unique email and return its Authorization header"""
+    email = f"{uuid.uuid4().hex[:12]}@example.com"
+    response = client.post("/signup", json={"first_name": "Test", "last_name": "User", "email": email, "password": password})
+    assert response.status_code == 201, response.text
+    token = client.post("/login", json={"email": email, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.fixture
+def auth(client):
+    return signup(client)
+
+def create_account(client, auth, name: str = "Checking") -> int:
+    response = client.post("/accounts", json={"account_name": name, "account_type": "bank"}, headers=auth)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+def create_category(client, auth, category_type: str = "expense", name: str = "Food") -> int:
+    response = client.post("/categories", json={"name": name, "category_type": category_type}, headers=auth)
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+def add_entry(client, auth, account_id: int, amount: str, day: str = "2024-01-15", **fields) -> dict:
+    response = client.post(
+        "/ledger",
+        json={"account_id": account_id, "amount": amount, "transaction_date": f"{day}T00:00:00", **fields},
+        headers=auth,
+    )
+    assert response.status_code == 201, response.text
+    return response.json()
@@ -0,0 +1,132 @@
+from sqlalchemy import func, select
+import checkpoints
+import jobs
+import rollups
+import tasks
+from models import Account, AccountBalance, AccountLedger, LedgerRollup, AccountBalanceCheckpoint, RecurringRule
+from conftest import add_entry, create_account, create_category
+
+ASYNC = {"Prefer": "respond-async"}
+
+def derived_state(db, account_ids):
+    """Rollups and checkpoints of the given accounts, for comparing against a rebuild"""
+    db.expire_all()
+    rollup_rows = db.execute(
+        select(LedgerRollup.account_id, LedgerRollup.category_id, LedgerRollup.month, LedgerRollup.income, LedgerRollup.expense, LedgerRollup.entry_count)
+        .where(LedgerRollup.account_id.in_(account_ids))
+        .order_by(LedgerRollup.account_id, LedgerRollup.category_id, LedgerRollup.month)
+    ).all()
+    checkpoint_rows = db.execute(
+        select(AccountBalanceCheckpoint.account_id, AccountBalanceCheckpoint.month, AccountBalanceCheckpoint.closing_balance)
+        .where(AccountBalanceCheckpoint.account_id.in_(account_ids))
+        .order_by(AccountBalanceCheckpoint.account_id, AccountBalanceCheckpoint.month)
+    ).all()
+    return rollup_rows, checkpoint_rows
+
+def assert_matches_rebuild(db, user_id, account_ids):
+    before = derived_state(db, account_ids)
+    rollups.rebuild(db, user_id)
+    for account_id in account_ids:
+        checkpoints.rebuild(db, account_id)
+    assert derived_state(db, account_ids) == before
+
+def owner_of(db, account_id):
+    return db.execute(select(Account.user_id).where(Account.id == account_id).execution_options(include_deleted=True)).scalar()
+
+def seed(client, auth):
+    kept, doomed = create_account(client, auth, "Kept"), create_account(client, auth, "Doomed")
+    category_id = create_category(client, auth, "expense")
+    for month in range(1, 7):
+        add_entry(client, auth, doomed, "12.50", f"2024-{month:02d}-10", category_id=category_id, narration="groceries")
+        add_entry(client, auth, kept, "40", f"2024-{month:02d}-11", narration="salary")
+    client.post("/recurring", json={"account_id": doomed, "amount": "3", "frequency": "monthly", "start_date": "2024-01-01"}, headers=auth)
+    transfer = client.post(
+        "/transfer",
+        json={"from_account_id": kept, "to_account_id": doomed, "amount": "5", "transaction_date": "2024-02-01T00:00:00"},
+        headers=auth,
+    ).json()
+    return kept, doomed, category_id, transfer
+
+def test_soft_deleted_account_is_hidden_from_every_read(client, auth):
+    kept, doomed, _, transfer = seed(client, auth)
+    doomed_entry = client.get("/ledger", params={"account_id": doomed, "limit": 1}, headers=auth).json()["items"][0]
+
+    response = client.delete(f"/accounts/{doomed}", headers={**auth, **ASYNC})
+    assert response.status_code == 202
+    assert response.json()["kind"] == "purge_account"
+
+    assert [account["id"] for account in client.get("/accounts", headers=auth).json()] == [kept]
+    assert client.get(f"/accounts/{doomed}", headers=auth).status_code == 404
+    assert client.get(f"/accounts/{doomed}/balance", headers=auth).status_code == 404
+    assert client.get(f"/accounts/{doomed}/balance-history", params={"start": "2024-01-01"}, headers=auth).status_code == 404
+    assert client.get(f"/ledger/{doomed_entry['id']}", headers=auth).status_code == 404
+    ledger = client.get("/ledger", params={"limit": 500}, headers=auth).json()["items"]
+    assert ledger and {entry["account_id"] for entry in ledger} == {kept}
+    assert client.get("/ledger", params={"account_id": doomed}, headers=auth).json()["items"] == []
+    assert client.get("/ledger/search", params={"q": "groceries"}, headers=auth).json()["items"] == []
+    exported = client.get("/ledger/export", params={"format": "ndjson"}, headers=auth).text.splitlines()
+    assert len(exported) == 7 and "groceries" not in "".join(exported)
+    assert [leg["account_id"] for leg in client.get(f"/transfer/{transfer[0]['transfer_id']}", headers=auth).json()] == [kept]
+    assert client.get("/recurring", headers=auth).json() == []
+    report = client.get("/reports", headers=auth).json()
+    assert report["totals"] == {"income": "240.00", "expense": "-5.00", "net": "235.00"}
+    # Deleting it again finds nothing
+    assert client.delete(f"/accounts/{doomed}", headers={**auth, **ASYNC}).status_code == 404
+
+def test_purge_job_deletes_entries_then_the_account(client, auth, db):
+    kept, doomed, _, _ = seed(client, auth)
+    user_id = owner_of(db, kept)
+    job = client.delete(f"/accounts/{doomed}", headers={**auth, **ASYNC}).json()
+    assert_matches_rebuild(db, user_id, [kept, doomed])
+    jobs.work(drain=True)
+
+    result = client.get(f"/jobs/{job['id']}", headers=auth).json()
+    assert result["status"] == "succeeded"
+    assert result["result"]["purged"] >= 13
+    db.expire_all()
+    assert db.scalar(select(func.count()).where(AccountLedger.account_id == doomed)) == 0
+    assert owner_of(db, doomed) is None
+    assert db.get(AccountBalance, doomed) is None
+    assert client.get(f"/accounts/{kept}", headers=auth).json()["balance"] == "235.00"
+    assert_matches_rebuild(db, user_id, [kept])
+
+def test_purge_commits_each_chunk(client, auth, db, monkeypatch):
+    kept, doomed, _, _ = seed(client, auth)
+    user_id = owner_of(db, kept)
+    remaining = lambda: db.scalar(select(func.count()).where(AccountLedger.account_id == doomed))
+    tasks.soft_delete_account(db, user_id, doomed)
+    db.commit()
+    total = remaining()
+
+    monkeypatch.setattr(tasks, "ACCOUNT_PURGE_CHUNK_SIZE", 4)
+    commits = []
+    original_commit = db.commit
+    monkeypatch.setattr(db, "commit", lambda: (commits.append(remaining()), original_commit()))
+    assert tasks.purge_account(db, user_id, doomed) == {"purged": total}
+    db.commit()
+    # Rows left when each chunk committed: four fewer every time
+    assert commits[:3] == [total - 4, total - 8, total - 12]
+    assert len(commits) == total // 4 + 2
+    assert owner_of(db, doomed) is None
+
+def test_inline_delete_cascades_to_dependent_rows(client, auth, db):
+    kept, doomed, _, _ = seed(client, auth)
+    user_id = owner_of(db, kept)
+    assert client.delete(f"/accounts/{doomed}", headers=auth).status_code == 204
+
+    assert db.scalar(select(func.count()).where(AccountLedger.account_id == doomed)) == 0
+    assert db.scalar(select(func.count()).select_from(LedgerRollup).where(LedgerRollup.account_id == doomed)) == 0
+    assert db.scalar(select(func.count()).select_from(RecurringRule).where(RecurringRule.account_id == doomed)) == 0
+    assert db.get(AccountBalance, doomed) is None
+    assert_matches_rebuild(db, user_id, [kept])
+
+def test_category_delete_uncategorises_entries_and_rollups(client, auth, db):
+    kept, doomed, category_id, _ = seed(client, auth)
+    user_id = owner_of(db, kept)
+    before = client.get("/reports", headers=auth).json()["totals"]
+    assert client.delete(f"/categories/{category_id}", headers=auth).status_code == 204
+
+    assert db.scalar(select(func.count()).where(AccountLedger.category_id == category_id)) == 0
+    assert db.scalar(select(func.count()).select_from(LedgerRollup).where(LedgerRollup.category_id == category_id)) == 0
+    assert client.get("/reports", headers=auth).json()["totals"] == before
+    assert_matches_rebuild(db, user_id, [kept, doomed])
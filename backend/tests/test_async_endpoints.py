@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+# ASYNC_ENDPOINTS is read when database.py and main.py are imported, so the async app runs in its own interpreter
+SCRIPT = textwrap.dedent('''
+    import asyncio
+    import init_db
+    init_db.init_db()
+    from fastapi.testclient import TestClient
+    from fastapi.routing import APIRoute
+    from main import app
+
+    endpoints = {(route.path, method): route.endpoint for route in app.routes if isinstance(route, APIRoute) for method in route.methods}
+    assert asyncio.iscoroutinefunction(endpoints[("/accounts", "GET")])
+    assert asyncio.iscoroutinefunction(endpoints[("/ledger", "POST")])
+    # Routes without an async variant stay in place
+    assert not asyncio.iscoroutinefunction(endpoints[("/reports", "GET")])
+
+    client = TestClient(app)
+    client.post("/signup", json={"first_name": "A", "last_name": "B", "email": "async@example.com", "password": "pw"})
+    token = client.post("/login", json={"email": "async@example.com", "password": "pw"}).json()["access_token"]
+    auth = {"Authorization": f"Bearer {token}"}
+    first = client.post("/accounts", json={"account_name": "A", "account_type": "bank"}, headers=auth).json()["id"]
+    second = client.post("/accounts", json={"account_name": "B", "account_type": "bank"}, headers=auth).json()["id"]
+    entry = client.post("/ledger", json={"account_id": first, "amount": "10.5", "transaction_date": "2024-01-01T00:00:00"}, headers=auth)
+    assert entry.status_code == 201 and entry.json()["amount"] == "10.50", entry.text
+    legs = client.post("/transfer", json={"from_account_id": first, "to_account_id": second, "amount": "4", "transaction_date": "2024-01-02T00:00:00"}, headers=auth)
+    assert legs.status_code == 201, legs.text
+    balances = {account["id"]: account["balance"] for account in client.get("/accounts", headers=auth).json()}
+    assert balances == {first: "6.50", second: "4.00"}, balances
+    assert len(client.get("/ledger", headers=auth).json()["items"]) == 3
+    etag = client.get("/accounts", headers=auth).headers["ETag"]
+    assert client.get("/accounts", headers={**auth, "If-None-Match": etag}).status_code == 304
+    assert client.delete(f"/accounts/{second}", headers=auth).status_code == 204
+    assert client.get(f"/accounts/{second}", headers=auth).status_code == 404
+    print("ok")
+''')
+
+def test_async_endpoint_mode(tmp_path):
+    path = tmp_path / "async.db"
+    env = {
+        **os.environ,
+        "ASYNC_ENDPOINTS": "1",
+        "DATABASE_URL": f"sqlite:///{path}",
+        "ASYNC_DATABASE_URL": f"sqlite+aiosqlite:///{path}",
+    }
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", SCRIPT], cwd=backend, env=env, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr[-3000:]
+    assert result.stdout.strip().endswith("ok")
@@ -0,0 +1,33 @@
+from sqlalchemy import select
+import auth as auth_module
+from models import User
+from conftest import signup
+
+def test_repeat_requests_hit_the_cache(client, auth):
+    client.get("/accounts", headers=auth)
+    tokens, principals = auth_module.token_cache.hits, auth_module.principal_cache.hits
+    client.get("/accounts", headers=auth)
+    assert auth_module.token_cache.hits == tokens + 1
+    assert auth_module.principal_cache.hits == principals + 1
+
+def test_updating_the_user_drops_its_cached_principal(client, db):
+    headers = signup(client)
+    client.get("/accounts", headers=headers)
+    email = auth_module.decode_token_subject(headers["Authorization"].split()[1])
+    assert auth_module.principal_cache.get(email) is not None
+
+    user = db.scalars(select(User).where(User.email == email)).one()
+    user.first_name = "Renamed"
+    db.commit()
+    assert auth_module.principal_cache.get(email) is None
+
+def test_deleted_user_is_rejected_despite_the_cache(client, db):
+    headers = signup(client)
+    assert client.get("/accounts", headers=headers).status_code == 200
+    email = auth_module.decode_token_subject(headers["Authorization"].split()[1])
+    db.delete(db.scalars(select(User).where(User.email == email)).one())
+    db.commit()
+    assert client.get("/accounts", headers=headers).status_code == 401
+
+def test_invalid_token_is_rejected(client):
+    assert client.get("/accounts", headers={"Authorization": "Bearer nonsense"}).status_code == 401
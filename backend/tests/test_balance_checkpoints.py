@@ -0,0 +1,67 @@
+from decimal import Decimal
+from sqlalchemy import select
+import checkpoints
+from models import AccountBalanceCheckpoint
+from conftest import add_entry, create_account
+
+def balance_on(client, auth, account_id, day):
+    response = client.get(f"/accounts/{account_id}/balance", params={"as_of": day}, headers=auth)
+    assert response.status_code == 200, response.text
+    return Decimal(response.json()["balance"])
+
+def stored_checkpoints(db, account_id):
+    return db.execute(
+        select(AccountBalanceCheckpoint.month, AccountBalanceCheckpoint.closing_balance)
+        .where(AccountBalanceCheckpoint.account_id == account_id)
+        .order_by(AccountBalanceCheckpoint.month)
+    ).all()
+
+def test_balance_as_of_spans_months_and_back_dated_writes(client, auth, db):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "100", "2024-01-10")
+    add_entry(client, auth, account_id, "-30", "2024-03-05")
+    late = add_entry(client, auth, account_id, "-20", "2024-03-20")
+    # Back-dated: shifts the January and March checkpoints
+    add_entry(client, auth, account_id, "5", "2024-01-31")
+
+    assert balance_on(client, auth, account_id, "2023-12-31") == 0
+    assert balance_on(client, auth, account_id, "2024-01-10") == 100
+    assert balance_on(client, auth, account_id, "2024-02-15") == 105
+    assert balance_on(client, auth, account_id, "2024-03-10") == 75
+    assert balance_on(client, auth, account_id, "2024-04-01") == 55
+
+    client.put(f"/ledger/{late['id']}", json={"transaction_date": "2024-02-01T00:00:00"}, headers=auth)
+    assert balance_on(client, auth, account_id, "2024-02-15") == 85
+    client.delete(f"/ledger/{late['id']}", headers=auth)
+    assert balance_on(client, auth, account_id, "2024-04-01") == 75
+
+    # Maintained checkpoints agree with a rebuild from the rollups
+    maintained = stored_checkpoints(db, account_id)
+    checkpoints.rebuild(db, account_id)
+    assert stored_checkpoints(db, account_id) == maintained
+
+def test_balance_history_carries_balances_between_entries(client, auth):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "10", "2024-01-02")
+    add_entry(client, auth, account_id, "5", "2024-01-04")
+    add_entry(client, auth, account_id, "1", "2024-02-10")
+    history = client.get(
+        f"/accounts/{account_id}/balance-history", params={"start": "2024-01-03", "end": "2024-01-05"}, headers=auth
+    ).json()
+    assert [(point["date"], Decimal(point["balance"])) for point in history["points"]] == [
+        ("2024-01-03", 10), ("2024-01-04", 15), ("2024-01-05", 15),
+    ]
+    monthly = client.get(
+        f"/accounts/{account_id}/balance-history",
+        params={"start": "2024-01-01", "end": "2024-02-15", "interval": "month"},
+        headers=auth,
+    ).json()
+    assert [(point["date"], Decimal(point["balance"])) for point in monthly["points"]] == [
+        ("2024-01-31", 15), ("2024-02-15", 16),
+    ]
+
+def test_balance_history_rejects_bad_ranges(client, auth):
+    account_id = create_account(client, auth)
+    path = f"/accounts/{account_id}/balance-history"
+    assert client.get(path, params={"start": "2024-02-01", "end": "2024-01-01"}, headers=auth).status_code == 400
+    assert client.get(path, params={"start": "2000-01-01", "end": "2024-01-01"}, headers=auth).status_code == 400
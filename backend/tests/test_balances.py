@@ -0,0 +1,60 @@
+from decimal import Decimal
+from sqlalchemy import update
+import balances
+from models import AccountBalance
+from conftest import add_entry, create_account
+
+def balance(client, auth, account_id):
+    return client.get(f"/accounts/{account_id}", headers=auth).json()["balance"]
+
+def test_ledger_writes_keep_the_stored_balance(client, auth):
+    first, second = create_account(client, auth, "A"), create_account(client, auth, "B")
+    assert balance(client, auth, first) == "0.00"
+    entry = add_entry(client, auth, first, "100")
+    add_entry(client, auth, first, "-30.25")
+    assert balance(client, auth, first) == "69.75"
+
+    client.put(f"/ledger/{entry['id']}", json={"amount": "80"}, headers=auth)
+    assert balance(client, auth, first) == "49.75"
+    # Moving the entry moves its amount between the two balances
+    client.put(f"/ledger/{entry['id']}", json={"account_id": second}, headers=auth)
+    assert (balance(client, auth, first), balance(client, auth, second)) == ("-30.25", "80.00")
+
+    client.delete(f"/ledger/{entry['id']}", headers=auth)
+    assert balance(client, auth, second) == "0.00"
+    listed = {account["id"]: account["balance"] for account in client.get("/accounts", headers=auth).json()}
+    assert listed == {first: "-30.25", second: "0.00"}
+
+def test_reconcile_finds_and_fixes_drift(client, auth, db):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "12")
+    assert account_id not in {row[0] for row in balances.reconcile(db)}
+
+    db.execute(update(AccountBalance).where(AccountBalance.account_id == account_id).values(balance=Decimal("99")))
+    db.commit()
+    assert (account_id, Decimal("99.00"), Decimal("12.00")) in [
+        (row[0], Decimal(row[1]), Decimal(row[2])) for row in balances.reconcile(db)
+    ]
+    balances.reconcile(db, fix=True)
+    assert balance(client, auth, account_id) == "12.00"
+
+def test_amounts_are_rounded_to_the_cent_before_they_reach_the_balance(client, auth):
+    first, second = create_account(client, auth, "A"), create_account(client, auth, "B")
+    add_entry(client, auth, first, "100")
+    entry = add_entry(client, auth, first, "-10.555")
+    assert entry["amount"] == "-10.56"
+    assert balance(client, auth, first) == "89.44"
+
+    client.put(f"/ledger/{entry['id']}", json={"amount": "-0.005"}, headers=auth)
+    assert balance(client, auth, first) == "99.99"
+    response = client.post("/transfer", json={
+        "from_account_id": first, "to_account_id": second, "amount": "0.125", "transaction_date": "2024-01-20T00:00:00",
+    }, headers=auth)
+    assert response.status_code == 201, response.text
+    batch = client.post("/ledger/batch", json={"operations": [
+        {"op": "create", "account_id": second, "amount": "1.004", "transaction_date": "2024-01-21T00:00:00"},
+    ]}, headers=auth).json()
+    assert batch["results"][0]["entry"]["amount"] == "1.00"
+    assert (balance(client, auth, first), balance(client, auth, second)) == ("99.86", "1.13")
+    entries = client.get("/ledger", headers=auth).json()["items"]
+    assert sum(Decimal(item["amount"]) for item in entries) == Decimal("100.99")
@@ -0,0 +1,40 @@
+import random
+from datetime import date, datetime
+from sqlalchemy import select
+import checkpoints
+from benchmarks.compare import change
+from benchmarks.seed import bench_email, generate_entries, seed
+from models import Account, AccountBalance, User
+
+OWNERS = [(1, [1, 2], {1: "income", 2: "expense"}), (2, [3], {})]
+
+def rows(seed_value):
+    return list(generate_entries(random.Random(seed_value), OWNERS, 200, datetime(2025, 1, 1), 365))
+
+def test_same_seed_yields_the_same_rows():
+    assert rows(7) == rows(7)
+    assert rows(7) != rows(8)
+
+def test_generated_rows_follow_category_signs():
+    types = {1: "income", 2: "expense"}
+    for row in rows(7):
+        assert datetime(2024, 1, 1) <= row["transaction_date"] <= datetime(2025, 1, 1)
+        if row["category_id"] is not None:
+            assert (row["amount"] > 0) == (types[row["category_id"]] == "income")
+
+def test_compare_reports_relative_change():
+    assert change(100, 125) == "+25.0%"
+    assert change(None, 1) == "-"
+    assert change(0, 0) == "0%"
+
+def test_seeded_balances_agree_with_the_checkpoints(app, db):
+    seed(users=2, accounts_per_user=2, categories_per_user=3, entries=300, seed_value=1, days=90, batch_size=100)
+    stored = db.execute(
+        select(AccountBalance.account_id, AccountBalance.balance)
+        .join(Account, Account.id == AccountBalance.account_id)
+        .join(User, User.id == Account.user_id)
+        .where(User.email.in_([bench_email(1), bench_email(2)]))
+    ).all()
+    assert len(stored) == 4 and any(balance for _, balance in stored)
+    for account_id, balance in stored:
+        assert checkpoints.balance_as_of(db, account_id, date(2025, 6, 1)) == balance
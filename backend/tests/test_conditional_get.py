@@ -0,0 +1,43 @@
+from datetime import date
+import versions
+from conftest import add_entry, create_account
+
+def test_unchanged_data_returns_304(client, auth):
+    first = client.get("/accounts", headers=auth)
+    etag = first.headers["ETag"]
+    assert client.get("/accounts", headers={**auth, "If-None-Match": etag}).status_code == 304
+
+def test_write_changes_etag(client, auth):
+    etag = client.get("/accounts", headers=auth).headers["ETag"]
+    create_account(client, auth)
+    response = client.get("/accounts", headers={**auth, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_etag_depends_on_query(client, auth):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "5")
+    all_entries = client.get("/ledger", headers=auth).headers["ETag"]
+    one_account = client.get("/ledger", params={"account_id": account_id}, headers=auth).headers["ETag"]
+    assert all_entries != one_account
+
+def test_defaulted_date_changes_etag_at_midnight(client, auth, monkeypatch):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "5")
+    path = f"/accounts/{account_id}/balance"
+
+    class Day(date):
+        current = date(2024, 3, 1)
+
+        @classmethod
+        def today(cls):
+            return cls.current
+
+    monkeypatch.setattr(versions, "date", Day)
+    etag = client.get(path, headers=auth).headers["ETag"]
+    assert client.get(path, headers={**auth, "If-None-Match": etag}).status_code == 304
+    history = client.get(f"{path}-history", params={"start": "2024-01-01"}, headers=auth).headers["ETag"]
+
+    Day.current = date(2024, 3, 2)
+    assert client.get(path, headers={**auth, "If-None-Match": etag}).status_code == 200
+    assert client.get(f"{path}-history", params={"start": "2024-01-01"}, headers={**auth, "If-None-Match": history}).status_code == 200
@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import create_engine, exc
+import database
+from database import InstrumentedQueuePool, engine_options, pool_class_with_own_stats, pool_status
+
+def test_engine_options_come_from_the_environment(monkeypatch):
+    monkeypatch.setattr(database, "DB_POOL_SIZE", 7)
+    monkeypatch.setattr(database, "DB_MAX_OVERFLOW", 3)
+    options = engine_options("postgresql+psycopg://u:p@db/x", InstrumentedQueuePool)
+    assert (options["poolclass"], options["pool_size"], options["max_overflow"]) == (InstrumentedQueuePool, 7, 3)
+    assert "connect_args" not in options
+    # SQLite picks its own pool
+    assert engine_options("sqlite:///x.db", InstrumentedQueuePool) == {}
+
+def test_pgbouncer_profile_disables_prepared_statements(monkeypatch):
+    monkeypatch.setattr(database, "DB_PROFILE", "pgbouncer")
+    assert engine_options("postgresql+psycopg://u:p@db/x", InstrumentedQueuePool)["connect_args"] == {"prepare_threshold": None}
+
+def test_pool_status_counts_checkouts_and_timeouts(tmp_path):
+    poolclass = pool_class_with_own_stats(InstrumentedQueuePool)
+    bind = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", poolclass=poolclass, pool_size=1, max_overflow=0, pool_timeout=0.05)
+    try:
+        held = bind.connect()
+        status = pool_status(bind)
+        assert (status["size"], status["checked_out"], status["overflow"]) == (1, 1, 0)
+        with pytest.raises(exc.TimeoutError):
+            bind.connect()
+        held.close()
+        status = pool_status(bind)
+        assert status["checkout_timeouts"] == 1
+        assert status["checkout_wait_seconds"]["count"] == 2
+        # Stats belong to this pool class only
+        assert poolclass.stats is not InstrumentedQueuePool.stats
+    finally:
+        bind.dispose()
+
+def test_internal_pool_reports_the_sync_engine(client, monkeypatch):
+    monkeypatch.setattr("auth.INTERNAL_API_TOKEN", "secret")
+    response = client.get("/internal/pool", headers={"Authorization": "Bearer secret"})
+    assert response.status_code == 200
+    assert "sync" in response.json()
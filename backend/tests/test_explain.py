@@ -0,0 +1,24 @@
+from sqlalchemy import event
+import explain
+from database import engine
+from conftest import create_account
+
+def test_explained_statements_are_the_ones_the_endpoints_run(client, auth, db):
+    account_id = create_account(client, auth)
+    user_id = client.get(f"/accounts/{account_id}", headers=auth).json()["user_id"]
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        client.get("/accounts", headers=auth)
+        client.get("/ledger", params={"account_id": account_id, "start_date": "2024-01-01T00:00:00"}, headers=auth)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+
+    statements = dict(explain.endpoint_queries(user_id, account_id, 0))
+    for name in ("GET /accounts", "GET /ledger?account_id&start_date"):
+        assert explain.session_sql(statements[name])[0] in executed
+        assert explain.explain(statements[name])
@@ -0,0 +1,31 @@
+import threading
+from sqlalchemy import select
+import hashing
+from models import User
+
+def test_saturated_hash_pool_rejects_with_retry_after(client, monkeypatch):
+    full = threading.BoundedSemaphore(1)
+    full.acquire()
+    monkeypatch.setattr(hashing, "_slots", full)
+    response = client.post("/signup", json={"first_name": "A", "last_name": "B", "email": "busy@example.com", "password": "x"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == str(hashing.HASH_RETRY_AFTER_SECONDS)
+
+def test_slots_are_released_after_each_hash(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(hashing, "_slots", slots)
+    hashed = hashing.hash_password("pw")
+    assert hashing.check_password("pw", hashed)
+    assert not hashing.check_password("other", hashed)
+
+def test_login_upgrades_hashes_made_with_other_rounds(client, db, monkeypatch):
+    email = "rehash@example.com"
+    client.post("/signup", json={"first_name": "R", "last_name": "H", "email": email, "password": "pw"})
+    stored = lambda: db.scalars(select(User.password_hash).where(User.email == email)).one()
+    assert stored().split("$")[2] == f"{hashing.BCRYPT_ROUNDS:02d}"
+
+    monkeypatch.setattr(hashing, "BCRYPT_ROUNDS", hashing.BCRYPT_ROUNDS + 1)
+    assert client.post("/login", json={"email": email, "password": "pw"}).status_code == 200
+    db.expire_all()
+    assert stored().split("$")[2] == f"{hashing.BCRYPT_ROUNDS:02d}"
+    assert not hashing.needs_rehash(stored())
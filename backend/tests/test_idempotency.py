@@ -0,0 +1,80 @@
+from conftest import create_account, create_category
+
+def test_replay_returns_the_first_response(client, auth):
+    account_id = create_account(client, auth)
+    category_id = create_category(client, auth, "expense")
+    body = {"account_id": account_id, "category_id": category_id, "amount": "10.5", "transaction_date": "2024-01-15T00:00:00"}
+    headers = {**auth, "Idempotency-Key": "entry-1"}
+
+    first = client.post("/ledger", json=body, headers=headers)
+    assert first.status_code == 201
+    assert first.json()["amount"] == "-10.50"
+    replay = client.post("/ledger", json=body, headers=headers)
+    assert replay.status_code == 201
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert client.get(f"/ledger/{first.json()['id']}", headers=auth).json() == first.json()
+    assert client.get(f"/accounts/{account_id}", headers=auth).json()["balance"] == "-10.50"
+
+def test_transfer_replay_matches_stored_legs(client, auth):
+    source, target = create_account(client, auth, "A"), create_account(client, auth, "B")
+    body = {"from_account_id": source, "to_account_id": target, "amount": "100", "transaction_date": "2024-02-01T00:00:00"}
+    headers = {**auth, "Idempotency-Key": "transfer-1"}
+
+    first = client.post("/transfer", json=body, headers=headers)
+    assert [leg["amount"] for leg in first.json()] == ["-100.00", "100.00"]
+    replay = client.post("/transfer", json=body, headers=headers)
+    assert replay.json() == first.json()
+    transfer_id = first.json()[0]["transfer_id"]
+    assert client.get(f"/transfer/{transfer_id}", headers=auth).json() == first.json()
+    assert client.get(f"/accounts/{target}", headers=auth).json()["balance"] == "100.00"
+
+def test_account_replay_creates_one_account(client, auth):
+    headers = {**auth, "Idempotency-Key": "account-1"}
+    body = {"account_name": "Savings", "account_type": "bank"}
+    first = client.post("/accounts", json=body, headers=headers)
+    replay = client.post("/accounts", json=body, headers=headers)
+    assert replay.json() == first.json()
+    assert len(client.get("/accounts", headers=auth).json()) == 1
+
+def test_key_reused_with_different_body_is_rejected(client, auth):
+    headers = {**auth, "Idempotency-Key": "account-2"}
+    assert client.post("/accounts", json={"account_name": "A", "account_type": "bank"}, headers=headers).status_code == 201
+    assert client.post("/accounts", json={"account_name": "B", "account_type": "bank"}, headers=headers).status_code == 422
+
+def test_batch_replay_does_not_duplicate_entries(client, auth):
+    account_id = create_account(client, auth)
+    body = {"operations": [
+        {"op": "create", "account_id": account_id, "amount": "5", "transaction_date": "2024-01-01T00:00:00"},
+        {"op": "create", "account_id": account_id, "amount": "7", "transaction_date": "2024-01-02T00:00:00"},
+    ]}
+    headers = {**auth, "Idempotency-Key": "batch-1"}
+    first = client.post("/ledger/batch", json=body, headers=headers)
+    replay = client.post("/ledger/batch", json=body, headers=headers)
+    assert (first.status_code, replay.status_code) == (200, 200)
+    assert replay.headers["Idempotent-Replayed"] == "true"
+    assert replay.json() == first.json()
+    assert len(client.get("/ledger", headers=auth).json()["items"]) == 2
+    assert client.get(f"/accounts/{account_id}", headers=auth).json()["balance"] == "12.00"
+
+def test_import_replay_does_not_duplicate_entries(client, auth):
+    account_id = create_account(client, auth)
+    upload = {"file": ("statement.csv", b"date,amount,description\n2024-01-05,25.00,refund\n")}
+    headers = {**auth, "Idempotency-Key": "import-1"}
+    first = client.post("/ledger/import", files=upload, data={"account_id": str(account_id)}, headers=headers)
+    replay = client.post("/ledger/import", files=upload, data={"account_id": str(account_id)}, headers=headers)
+    assert replay.json() == first.json() == {"imported": 1, "failed": 0, "errors": [], "errors_truncated": False}
+    assert client.get(f"/accounts/{account_id}", headers=auth).json()["balance"] == "25.00"
+    # Same key, different file
+    other = {"file": ("statement.csv", b"date,amount,description\n2024-01-06,1.00,other\n")}
+    assert client.post("/ledger/import", files=other, data={"account_id": str(account_id)}, headers=headers).status_code == 422
+
+def test_background_import_replay_points_at_the_same_job(client, auth):
+    account_id = create_account(client, auth)
+    upload = {"file": ("statement.csv", b"date,amount,description\n2024-01-05,25.00,refund\n")}
+    headers = {**auth, "Idempotency-Key": "import-2", "Prefer": "respond-async"}
+    first = client.post("/ledger/import", files=upload, data={"account_id": str(account_id)}, headers=headers)
+    replay = client.post("/ledger/import", files=upload, data={"account_id": str(account_id)}, headers=headers)
+    assert (first.status_code, replay.status_code) == (202, 202)
+    assert replay.headers["Location"] == first.headers["Location"]
+    assert len(client.get("/jobs", headers=auth).json()) == 1
@@ -0,0 +1,41 @@
+import pytest
+
+PATHS = ["/metrics", "/internal/auth-cache", "/internal/pool"]
+
+@pytest.mark.parametrize("path", PATHS)
+def test_disabled_without_token(client, auth, path, monkeypatch):
+    monkeypatch.setattr("auth.INTERNAL_API_TOKEN", "")
+    # A user's own bearer token is not enough
+    assert client.get(path, headers=auth).status_code == 404
+
+@pytest.mark.parametrize("path", PATHS)
+def test_requires_internal_token(client, path, monkeypatch):
+    monkeypatch.setattr("auth.INTERNAL_API_TOKEN", "s3cret")
+    assert client.get(path).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(path, headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+def test_metrics_count_requests_by_route(client, auth, monkeypatch):
+    monkeypatch.setattr("auth.INTERNAL_API_TOKEN", "s3cret")
+    client.get("/accounts", headers=auth)
+    body = client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).text
+    assert 'route="GET /accounts"' in body
+
+def test_histogram_family_renders_while_labels_are_added():
+    import threading
+    from metrics import HistogramFamily
+    family = HistogramFamily("test_seconds", "Test", "route")
+    done = threading.Event()
+
+    def add_labels():
+        for index in range(5000):
+            family.labels(f"/route/{index}").observe(0.01)
+        done.set()
+
+    writer = threading.Thread(target=add_labels)
+    writer.start()
+    while not done.is_set():
+        family.render()
+    writer.join()
+    # HELP and TYPE, then one bucket per bound plus +Inf, _sum and _count per label
+    assert len(family.render()) == 2 + 5000 * (len(family.buckets) + 3)
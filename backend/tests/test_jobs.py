@@ -0,0 +1,102 @@
+import os
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from sqlalchemy import func, select, update
+import jobs
+import tasks
+from models import Job, User
+from conftest import create_account, signup
+
+ASYNC = {"Prefer": "respond-async"}
+
+def new_user_id(client, db):
+    signup(client)
+    return db.scalar(select(func.max(User.id)))
+
+def run_claimed(db, job, worker_id="test-worker"):
+    """Lock one specific job the way claim() would, then run it"""
+    db.execute(
+        update(Job)
+        .where(Job.id == job.id)
+        .values(status="running", attempts=Job.attempts + 1, locked_by=worker_id, locked_at=datetime.utcnow())
+    )
+    db.commit()
+    db.refresh(job)
+    status = jobs.run_job((job.id, job.user_id, job.kind, {}, job.attempts, job.max_attempts), worker_id)
+    db.refresh(job)
+    return status
+
+def test_background_import_answers_202_and_runs_in_the_worker(client, auth):
+    account_id = create_account(client, auth)
+    response = client.post(
+        "/ledger/import",
+        files={"file": ("statement.csv", b"date,amount,description\n2024-01-05,25.00,refund\n")},
+        data={"account_id": str(account_id)},
+        headers={**auth, **ASYNC},
+    )
+    assert response.status_code == 202
+    assert response.headers["Location"] == f"/jobs/{response.json()['id']}"
+    assert response.json()["status"] == "queued"
+    spooled = os.listdir(tasks.JOB_SPOOL_DIR)
+    assert client.get(f"/accounts/{account_id}", headers=auth).json()["balance"] == "0.00"
+
+    jobs.work(drain=True)
+    job = client.get(response.headers["Location"], headers=auth).json()
+    assert (job["status"], job["attempts"], job["result"]["imported"]) == ("succeeded", 1, 1)
+    assert client.get(f"/accounts/{account_id}", headers=auth).json()["balance"] == "25.00"
+    # The spooled upload is removed once the job is done with it
+    assert not set(spooled) & set(os.listdir(tasks.JOB_SPOOL_DIR))
+    # Jobs are private to their user
+    assert client.get(response.headers["Location"], headers=signup(client)).status_code == 404
+
+def test_failures_retry_with_backoff_until_out_of_attempts(client, db, monkeypatch):
+    user_id = new_user_id(client, db)
+
+    def flaky(db, user_id):
+        raise ConnectionError("database restarted")
+
+    monkeypatch.setitem(tasks.HANDLERS, "flaky", flaky)
+    job = jobs.enqueue(db, user_id, "flaky", {}, max_attempts=2)
+    db.commit()
+
+    before = datetime.utcnow()
+    assert run_claimed(db, job) == "queued"
+    assert job.last_error == "ConnectionError: database restarted"
+    delay = (job.run_after - before).total_seconds()
+    assert jobs.JOB_RETRY_BASE_SECONDS / 2 - 1 <= delay <= jobs.JOB_RETRY_BASE_SECONDS + 1
+    assert run_claimed(db, job) == "failed"
+    assert (job.attempts, job.finished_at is not None, job.locked_by) == (2, True, None)
+
+def test_client_errors_fail_without_retrying(client, db, monkeypatch):
+    user_id = new_user_id(client, db)
+
+    def invalid(db, user_id):
+        raise HTTPException(status_code=404, detail="Account not found")
+
+    monkeypatch.setitem(tasks.HANDLERS, "invalid", invalid)
+    job = jobs.enqueue(db, user_id, "invalid", {})
+    db.commit()
+    assert run_claimed(db, job) == "failed"
+    assert (job.attempts, job.last_error) == (1, "Account not found")
+
+def test_stale_running_jobs_go_back_to_the_queue(client, db):
+    user_id = new_user_id(client, db)
+    stale = datetime.utcnow() - timedelta(seconds=jobs.JOB_LOCK_TIMEOUT_SECONDS + 1)
+    requeued = jobs.enqueue(db, user_id, "stale", {}, max_attempts=3)
+    exhausted = jobs.enqueue(db, user_id, "stale", {}, max_attempts=1)
+    for job in (requeued, exhausted):
+        job.status, job.attempts, job.locked_by, job.locked_at = "running", 1, "gone", stale
+    db.commit()
+
+    assert jobs.requeue_stale(db) == 2
+    db.refresh(requeued)
+    db.refresh(exhausted)
+    assert (requeued.status, requeued.locked_by) == ("queued", None)
+    assert exhausted.status == "failed"
+    assert exhausted.last_error == requeued.last_error == "worker stopped responding"
+
+def test_prefer_header_parsing():
+    assert jobs.respond_async("respond-async")
+    assert jobs.respond_async("wait=10, Respond-Async; foo=bar")
+    assert not jobs.respond_async("return=minimal")
+    assert not jobs.respond_async(None)
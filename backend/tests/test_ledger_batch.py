@@ -0,0 +1,58 @@
+from decimal import Decimal
+from conftest import add_entry, create_account, create_category, signup
+
+def batch(client, auth, operations, mode="atomic"):
+    return client.post("/ledger/batch", json={"operations": operations, "mode": mode}, headers=auth)
+
+def balance(client, auth, account_id):
+    return Decimal(client.get(f"/accounts/{account_id}", headers=auth).json()["balance"])
+
+def test_batch_applies_creates_updates_and_deletes(client, auth):
+    account_id = create_account(client, auth)
+    category_id = create_category(client, auth)
+    kept = add_entry(client, auth, account_id, "10")
+    dropped = add_entry(client, auth, account_id, "20")
+
+    response = batch(client, auth, [
+        {"op": "create", "account_id": account_id, "amount": "5", "category_id": category_id, "transaction_date": "2024-02-01T00:00:00"},
+        {"op": "update", "id": kept["id"], "amount": "12.50"},
+        {"op": "delete", "id": dropped["id"]},
+    ])
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["applied"] and all(result["ok"] for result in body["results"])
+    created = body["results"][0]["entry"]
+    # Category sign rules match POST /ledger
+    assert Decimal(created["amount"]) == Decimal("-5")
+    amounts = sorted(Decimal(item["amount"]) for item in client.get("/ledger", headers=auth).json()["items"])
+    assert amounts == [Decimal("-5"), Decimal("12.50")]
+    assert balance(client, auth, account_id) == Decimal("7.50")
+
+def test_atomic_batch_writes_nothing_when_one_operation_fails(client, auth):
+    account_id = create_account(client, auth)
+    entry = add_entry(client, auth, account_id, "10")
+
+    response = batch(client, auth, [
+        {"op": "update", "id": entry["id"], "amount": "99"},
+        {"op": "delete", "id": 10**9},
+    ])
+    assert response.status_code == 422
+    assert not response.json()["applied"]
+    assert response.json()["results"][1]["error"] == "Ledger entry not found"
+    assert Decimal(client.get(f"/ledger/{entry['id']}", headers=auth).json()["amount"]) == Decimal("10")
+    assert balance(client, auth, account_id) == Decimal("10")
+
+def test_best_effort_batch_applies_the_valid_operations(client, auth):
+    account_id = create_account(client, auth)
+    other_account = create_account(client, signup(client))
+
+    response = batch(client, auth, [
+        {"op": "create", "account_id": account_id, "amount": "3", "transaction_date": "2024-01-01T00:00:00"},
+        {"op": "create", "account_id": other_account, "amount": "4", "transaction_date": "2024-01-01T00:00:00"},
+    ], mode="best_effort")
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["ok"] for result in results] == [True, False]
+    # Another user's account looks the same as a missing one
+    assert results[1]["error"] == "Account not found"
+    assert balance(client, auth, account_id) == Decimal("3")
@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+import ledger_export
+from models import AccountLedger
+from conftest import add_entry, create_account, signup
+
+def test_csv_export_lists_only_the_users_entries(client, auth):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "12.5", "2024-01-02", narration='comma, "quoted"')
+    add_entry(client, auth, account_id, "-3", "2024-01-03")
+    other = signup(client)
+    add_entry(client, other, create_account(client, other), "999")
+
+    response = client.get("/ledger/export", params={"format": "csv"}, headers={**auth, "Accept-Encoding": "identity"})
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [(row["amount"], row["narration"]) for row in rows] == [("-3.00", ""), ("12.50", 'comma, "quoted"')]
+
+def test_ndjson_export_is_filtered_and_yielded_in_chunks(client, auth, monkeypatch):
+    monkeypatch.setattr(ledger_export, "EXPORT_CHUNK_SIZE", 256)
+    account_id = create_account(client, auth)
+    for day in range(1, 21):
+        add_entry(client, auth, account_id, str(day), f"2024-02-{day:02d}")
+
+    response = client.get("/ledger/export", params={"format": "ndjson", "start_date": "2024-02-11T00:00:00"}, headers=auth)
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["amount"] for line in lines] == [f"{day}.00" for day in range(20, 10, -1)]
+
+    chunks = list(ledger_export.stream_export(ledger_export.export_statement(AccountLedger.account_id == account_id), "ndjson", False))
+    assert len(chunks) > 1
+    assert len(b"".join(chunks).splitlines()) == 20
+
+def test_export_applies_the_listing_search(client, auth):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "4", "2024-03-01", narration="Coffee beans")
+    add_entry(client, auth, account_id, "9", "2024-03-02", narration="Rent")
+    add_entry(client, auth, account_id, "2", "2024-03-03", narration="coffee to go")
+
+    params = {"format": "ndjson", "q": "coffee"}
+    lines = [json.loads(line) for line in client.get("/ledger/export", params=params, headers=auth).text.splitlines()]
+    listed = client.get("/ledger", params={"q": "coffee"}, headers=auth).json()["items"]
+    assert [line["id"] for line in lines] == [item["id"] for item in listed]
+    assert [line["narration"] for line in lines] == ["coffee to go", "Coffee beans"]
+
+def test_export_is_gzipped_when_accepted(client, auth):
+    account_id = create_account(client, auth)
+    add_entry(client, auth, account_id, "1")
+    response = client.get("/ledger/export", params={"format": "ndjson"}, headers={**auth, "Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    # httpx already decoded the body; compare with an uncompressed export
+    plain = client.get("/ledger/export", params={"format": "ndjson"}, headers={**auth, "Accept-Encoding": "identity"})
+    assert response.content == plain.content
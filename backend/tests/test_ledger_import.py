@@ -0,0 +1,48 @@
+from conftest import create_account, create_category
+
+OFX = b"""OFXHEADER:100
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240305120000<TRNAMT>-42.10<NAME>Grocer<MEMO>weekly</STMTTRN>
+<STMTTRN><TRNTYPE>CREDIT<DTPOSTED>20240306<TRNAMT>1000.00<NAME>Employer</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+def upload(client, auth, content: bytes, filename: str, **form):
+    return client.post("/ledger/import", files={"file": (filename, content)}, data={k: str(v) for k, v in form.items()}, headers=auth)
+
+def test_csv_import_reports_bad_rows_and_imports_the_rest(client, auth):
+    account_id = create_account(client, auth)
+    category_id = create_category(client, auth, "expense")
+    csv = (
+        "date,amount,description,category_id\n"
+        f"2024-01-05,25.00,lunch,{category_id}\n"
+        "2024-01-06,not-a-number,broken,\n"
+        "2024-01-07,100,refund,\n"
+        "2024-01-08,5,stranger,999999\n"
+    ).encode()
+    result = upload(client, auth, csv, "statement.csv", account_id=account_id).json()
+
+    assert (result["imported"], result["failed"]) == (2, 2)
+    # Rows are numbered by file line, header included
+    assert [error["row"] for error in result["errors"]] == [3, 5]
+    entries = client.get("/ledger", params={"account_id": account_id}, headers=auth).json()["items"]
+    assert sorted((entry["narration"], entry["amount"]) for entry in entries) == [("lunch", "-25.00"), ("refund", "100.00")]
+    assert client.get(f"/accounts/{account_id}", headers=auth).json()["balance"] == "75.00"
+    assert client.get("/reports", headers=auth).json()["totals"] == {"income": "100.00", "expense": "-25.00", "net": "75.00"}
+
+def test_csv_rows_may_not_target_other_users_accounts(client, auth):
+    from conftest import signup
+    other_account = create_account(client, signup(client))
+    csv = f"transaction_date,amount,account_id\n2024-01-05,10,{other_account}\n".encode()
+    result = upload(client, auth, csv, "statement.csv").json()
+    assert (result["imported"], result["errors"][0]["error"]) == (0, "Account not found")
+
+def test_ofx_import(client, auth):
+    account_id = create_account(client, auth)
+    result = upload(client, auth, OFX, "statement.qfx", account_id=account_id).json()
+    assert result["imported"] == 2
+    entries = client.get("/ledger", params={"account_id": account_id}, headers=auth).json()["items"]
+    assert [(entry["narration"], entry["amount"]) for entry in entries] == [("Employer", "1000.00"), ("Grocer - weekly", "-42.10")]
+
+def test_unknown_format_is_rejected(client, auth):
+    assert upload(client, auth, b"x", "statement.pdf").status_code == 400
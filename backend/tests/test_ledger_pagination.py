@@ -0,0 +1,27 @@
+from conftest import add_entry, create_account
+
+def test_pages_cover_every_entry_once_in_date_order(client, auth):
+    account_id = create_account(client, auth)
+    created = [add_entry(client, auth, account_id, str(n + 1), f"2024-01-{n % 4 + 1:02d}")["id"] for n in range(11)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 3, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/ledger", params=params, headers=auth).json()
+        assert len(page["items"]) <= 3
+        seen.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    assert sorted(entry["id"] for entry in seen) == sorted(created)
+    keys = [(entry["transaction_date"], entry["id"]) for entry in seen]
+    # Newest first, id breaking ties between entries on the same date
+    assert keys == sorted(keys, reverse=True)
+
+def test_page_size_is_bounded(client, auth):
+    assert client.get("/ledger", params={"limit": 501}, headers=auth).status_code == 422
+    assert client.get("/ledger", params={"limit": 0}, headers=auth).status_code == 422
+
+def test_invalid_cursor_is_rejected(client, auth):
+    assert client.get("/ledger", params={"cursor": "not-a-cursor"}, headers=auth).status_code == 400
@@ -0,0 +1,35 @@
+from conftest import add_entry, create_account, signup
+
+def search(client, auth, q, **params):
+    response = client.get("/ledger/search", params={"q": q, **params}, headers=auth)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_whole_phrase_matches_rank_first(client, auth):
+    account_id = create_account(client, auth)
+    phrase = add_entry(client, auth, account_id, "-4", "2024-01-01", narration="Coffee shop downtown")
+    scattered = add_entry(client, auth, account_id, "-6", "2024-02-01", narration="Shop for coffee beans")
+    add_entry(client, auth, account_id, "-8", "2024-03-01", narration="Groceries")
+
+    items = search(client, auth, "coffee shop")["items"]
+    assert [item["id"] for item in items] == [phrase["id"], scattered["id"]]
+
+def test_search_pages_without_gaps_and_stays_in_scope(client, auth):
+    account_id = create_account(client, auth)
+    created = {add_entry(client, auth, account_id, "-1", f"2024-01-{day:02d}", narration=f"Rent 100% paid {day}")["id"] for day in range(1, 8)}
+    other = signup(client)
+    add_entry(client, other, create_account(client, other), "-1", narration="Rent 100% paid")
+
+    seen, cursor = [], None
+    while True:
+        page = search(client, auth, "100% paid", limit=3, **({"cursor": cursor} if cursor else {}))
+        seen.extend(item["id"] for item in page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted(created)
+    # LIKE wildcards in the query are matched literally
+    assert search(client, auth, "1_0")["items"] == []
+
+def test_blank_query_is_rejected(client, auth):
+    assert client.get("/ledger/search", params={"q": "   "}, headers=auth).status_code == 400
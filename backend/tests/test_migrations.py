@@ -0,0 +1,140 @@
+from datetime import datetime
+from decimal import Decimal
+import pytest
+from sqlalchemy import Column, DateTime, ForeignKey, Integer, MetaData, Numeric, String, Table, Text, create_engine, inspect, select, text
+import migrations
+from models import AccountBalance, AccountBalanceCheckpoint, LedgerRollup
+
+def baseline_schema() -> MetaData:
+    """The four tables the original create_all built, before any migration existed"""
+    metadata = MetaData()
+    Table(
+        "users", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("first_name", String, nullable=False),
+        Column("last_name", String, nullable=False),
+        Column("email", String, unique=True, index=True, nullable=False),
+        Column("password_hash", String, nullable=False),
+        Column("created_at", DateTime),
+    )
+    Table(
+        "accounts", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("account_name", String, nullable=False),
+        Column("account_type", String, nullable=False),
+        Column("created_at", DateTime),
+    )
+    Table(
+        "categories", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id"), nullable=False),
+        Column("category_type", String, nullable=False),
+        Column("name", String, nullable=False),
+        Column("created_at", DateTime),
+    )
+    Table(
+        "account_ledger", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("account_id", Integer, ForeignKey("accounts.id"), nullable=False),
+        Column("created_by", Integer, ForeignKey("users.id"), nullable=False),
+        Column("amount", Numeric(10, 2), nullable=False),
+        Column("category_id", Integer, ForeignKey("categories.id"), nullable=True),
+        Column("narration", Text, nullable=True),
+        Column("transaction_date", DateTime, nullable=False),
+        Column("created_on", DateTime),
+    )
+    return metadata
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    bind = create_engine(f"sqlite:///{tmp_path / 'baseline.db'}")
+    metadata = baseline_schema()
+    metadata.create_all(bind)
+    tables = metadata.tables
+    with bind.begin() as conn:
+        conn.execute(tables["users"].insert().values(id=1, first_name="a", last_name="b", email="a@example.com", password_hash="x"))
+        conn.execute(tables["accounts"].insert(), [
+            dict(id=1, user_id=1, account_name="Checking", account_type="bank"),
+            dict(id=2, user_id=1, account_name="Cash", account_type="cash"),
+        ])
+        conn.execute(tables["categories"].insert().values(id=1, user_id=1, category_type="expense", name="Food"))
+        conn.execute(tables["account_ledger"].insert(), [
+            dict(account_id=1, created_by=1, amount=Decimal("100"), category_id=None, transaction_date=datetime(2024, 1, 5)),
+            dict(account_id=1, created_by=1, amount=Decimal("-30"), category_id=1, transaction_date=datetime(2024, 1, 20)),
+            dict(account_id=1, created_by=1, amount=Decimal("-20"), category_id=1, transaction_date=datetime(2024, 3, 2)),
+        ])
+    yield bind
+    bind.dispose()
+
+def test_baseline_database_upgrades_through_every_migration(baseline_db):
+    applied = migrations.upgrade(baseline_db)
+    assert applied == [step for step, _, _ in migrations.MIGRATIONS]
+    assert migrations.current_version(baseline_db) == migrations.LATEST_VERSION
+
+    columns = lambda table: {column["name"] for column in inspect(baseline_db).get_columns(table)}
+    assert {"transfer_id", "recurring_rule_id"} <= columns("account_ledger")
+    assert "deleted_at" in columns("accounts")
+    with baseline_db.connect() as conn:
+        balances = dict(conn.execute(select(AccountBalance.account_id, AccountBalance.balance)).all())
+        rollups = conn.execute(
+            select(LedgerRollup.category_id, LedgerRollup.month, LedgerRollup.income, LedgerRollup.expense)
+            .order_by(LedgerRollup.month, LedgerRollup.category_id)
+        ).all()
+        checkpoints = conn.execute(
+            select(AccountBalanceCheckpoint.month, AccountBalanceCheckpoint.closing_balance).order_by(AccountBalanceCheckpoint.month)
+        ).all()
+    assert balances == {1: Decimal("50.00"), 2: Decimal("0.00")}
+    assert [(category, month.isoformat(), income, expense) for category, month, income, expense in rollups] == [
+        (0, "2024-01-01", Decimal("100.00"), Decimal("0.00")),
+        (1, "2024-01-01", Decimal("0.00"), Decimal("-30.00")),
+        (1, "2024-03-01", Decimal("0.00"), Decimal("-20.00")),
+    ]
+    assert [(month.isoformat(), closing) for month, closing in checkpoints] == [("2024-01-01", Decimal("70.00")), ("2024-03-01", Decimal("50.00"))]
+
+def test_upgrade_is_a_no_op_once_current(baseline_db):
+    migrations.upgrade(baseline_db)
+    assert migrations.upgrade(baseline_db) == []
+
+def test_upgrade_stops_at_target(baseline_db):
+    assert migrations.upgrade(baseline_db, target=3) == [1, 2, 3]
+    assert migrations.current_version(baseline_db) == 3
+    assert migrations.upgrade(baseline_db) == [step for step, _, _ in migrations.MIGRATIONS if step > 3]
+    with baseline_db.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM schema_migrations")).scalar() == migrations.LATEST_VERSION
+
+def test_query_indexes_are_created(baseline_db):
+    migrations.upgrade(baseline_db)
+    inspector = inspect(baseline_db)
+    ledger_indexes = {index["name"]: index["column_names"] for index in inspector.get_indexes("account_ledger")}
+    assert ledger_indexes["ix_account_ledger_account_date"] == ["account_id", "transaction_date", "id"]
+    assert ledger_indexes["ix_account_ledger_category_date"] == ["category_id", "transaction_date"]
+    assert migrations.TRANSFER_INDEX in ledger_indexes
+    assert {"user_id"} <= {column for index in inspector.get_indexes("accounts") for column in index["column_names"]}
+    assert {"user_id"} <= {column for index in inspector.get_indexes("categories") for column in index["column_names"]}
+
+def test_postgresql_migrations_refuse_to_run_through_pgbouncer(monkeypatch):
+    monkeypatch.setattr(migrations, "DB_PROFILE", "pgbouncer")
+    postgresql = create_engine("postgresql+psycopg://user:pw@localhost/db")
+    # Refused before connecting, so no session-level lock can be taken
+    with pytest.raises(migrations.MigrationError):
+        migrations.upgrade(postgresql)
+
+def test_sqlite_tables_are_rebuilt_with_delete_actions(baseline_db):
+    migrations.upgrade(baseline_db)
+    actions = {
+        (table, fk["constrained_columns"][0]): (fk["options"].get("ondelete") or "").upper()
+        for table in {table for table, *_ in migrations.DELETE_ACTIONS}
+        for fk in inspect(baseline_db).get_foreign_keys(table)
+    }
+    for table, column, _, action in migrations.DELETE_ACTIONS:
+        assert actions[(table, column)] == action
+    assert "ix_account_ledger_account_date" in {index["name"] for index in inspect(baseline_db).get_indexes("account_ledger")}
+
+    with baseline_db.begin() as conn:
+        conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+        assert conn.execute(text("SELECT count(*) FROM account_ledger")).scalar() == 3
+        conn.execute(text("DELETE FROM categories WHERE id = 1"))
+        conn.execute(text("DELETE FROM accounts WHERE id = 1"))
+        assert conn.execute(text("SELECT count(*) FROM account_ledger")).scalar() == 0
+        assert conn.execute(text("SELECT count(*) FROM account_balances WHERE account_id = 1")).scalar() == 0
@@ -0,0 +1,25 @@
+from conftest import add_entry, create_account, create_category, signup
+
+def test_other_users_entries_look_missing(client, auth):
+    entry = add_entry(client, auth, create_account(client, auth), "10")
+    intruder = signup(client)
+
+    assert client.get(f"/ledger/{entry['id']}", headers=intruder).status_code == 404
+    assert client.put(f"/ledger/{entry['id']}", json={"amount": "1"}, headers=intruder).status_code == 404
+    assert client.delete(f"/ledger/{entry['id']}", headers=intruder).status_code == 404
+    assert client.get("/ledger", headers=intruder).json()["items"] == []
+    assert client.get(f"/ledger/{entry['id']}", headers=auth).json()["amount"] == "10.00"
+
+def test_entries_cannot_move_to_another_users_account_or_category(client, auth):
+    entry = add_entry(client, auth, create_account(client, auth), "10")
+    other = signup(client)
+    foreign_account = create_account(client, other)
+    foreign_category = create_category(client, other)
+
+    response = client.put(f"/ledger/{entry['id']}", json={"account_id": foreign_account}, headers=auth)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Account not found"
+    response = client.put(f"/ledger/{entry['id']}", json={"category_id": foreign_category}, headers=auth)
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Category not found"
+    assert client.get("/ledger", headers=other).json()["items"] == []
@@ -0,0 +1,21 @@
+from datetime import date
+import pytest
+import partitions
+from database import engine
+
+def test_month_arithmetic_and_partition_names():
+    assert partitions._add_months(date(2024, 11, 1), 3) == date(2025, 2, 1)
+    assert partitions._add_months(date(2024, 1, 1), -1) == date(2023, 12, 1)
+    assert partitions.partition_name(date(2024, 3, 1)) == "account_ledger_y2024m03"
+    assert partitions._bounds(date(2024, 12, 1)) == "FROM ('2024-12-01') TO ('2025-01-01')"
+    assert partitions._parse_month("2024-07") == date(2024, 7, 1)
+
+def test_other_databases_keep_the_plain_ledger(app):
+    assert not partitions.is_partitioned(engine)
+    assert partitions.archived_months(engine) == []
+    # Rebuild CLIs only refuse when months are archived
+    partitions.require_full_ledger("rebuild rollups", engine)
+    with pytest.raises(partitions.PartitionError):
+        partitions.convert(engine)
+    with pytest.raises(partitions.PartitionError):
+        partitions.ensure_future_partitions(engine)
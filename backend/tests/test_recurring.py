@@ -0,0 +1,55 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from sqlalchemy import update
+import recurring
+from models import RecurringRule
+from conftest import create_account, create_category
+
+def create_rule(client, auth, **fields):
+    response = client.post("/recurring", json=fields, headers=auth)
+    assert response.status_code == 201, response.text
+    return response.json()
+
+def entry_dates(client, auth, account_id):
+    items = client.get("/ledger", params={"account_id": account_id, "limit": 500}, headers=auth).json()["items"]
+    return sorted(item["transaction_date"][:10] for item in items)
+
+def test_monthly_occurrences_clamp_to_month_end_and_recover():
+    days = [recurring.occurrence_date("monthly", 1, date(2024, 1, 31), index) for index in range(4)]
+    assert days == [date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30)]
+    assert recurring.occurrence_date("yearly", 1, date(2024, 2, 29), 1) == date(2025, 2, 28)
+    assert recurring.occurrence_date("weekly", 2, date(2024, 1, 1), 3) == date(2024, 2, 12)
+
+def test_past_occurrences_are_generated_when_the_rule_is_created(client, auth):
+    account_id = create_account(client, auth)
+    rule = create_rule(
+        client, auth, account_id=account_id, category_id=create_category(client, auth),
+        amount="100", frequency="monthly", start_date="2024-01-31", max_occurrences=4,
+    )
+    assert (rule["amount"], rule["next_occurrence"], rule["next_date"]) == ("-100.00", 4, None)
+    assert entry_dates(client, auth, account_id) == ["2024-01-31", "2024-02-29", "2024-03-31", "2024-04-30"]
+    assert Decimal(client.get(f"/accounts/{account_id}", headers=auth).json()["balance"]) == Decimal("-400")
+
+def test_materialize_catches_up_and_never_duplicates(client, auth, db, monkeypatch):
+    account_id = create_account(client, auth)
+    start = date.today() + timedelta(days=1)
+    rule = create_rule(
+        client, auth, account_id=account_id, amount="5", frequency="daily",
+        start_date=start.isoformat(), end_date=(start + timedelta(days=5)).isoformat(),
+    )
+    assert entry_dates(client, auth, account_id) == []
+
+    # Fewer occurrences per pass than are due: passes repeat until the rule is caught up
+    monkeypatch.setattr(recurring, "RECURRING_MAX_CATCH_UP", 2)
+    recurring.materialize(db, start + timedelta(days=2))
+    assert len(entry_dates(client, auth, account_id)) == 3
+    recurring.materialize(db, start + timedelta(days=2))
+    assert len(entry_dates(client, auth, account_id)) == 3
+
+    # Rewinding the cursor re-inserts nothing: existing occurrences are skipped
+    db.execute(update(RecurringRule).where(RecurringRule.id == rule["id"]).values(next_occurrence=0, next_date=start))
+    db.commit()
+    recurring.materialize(db, start + timedelta(days=30))
+    assert len(entry_dates(client, auth, account_id)) == 6
+    assert Decimal(client.get(f"/accounts/{account_id}", headers=auth).json()["balance"]) == Decimal("30")
+    assert client.get(f"/recurring/{rule['id']}", headers=auth).json()["next_date"] is None
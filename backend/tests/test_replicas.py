@@ -0,0 +1,95 @@
+import replicas
+from conftest import create_account
+from replicas import Replica, ReplicaSet
+
+class FakeEngine:
+    """Answers the routing and health-check queries with canned rows"""
+
+    def __init__(self, row=None, version=None, error=None):
+        self.row, self.version, self.error = row, version, error
+        self.connects = 0
+
+    def connect(self):
+        self.connects += 1
+        if self.error:
+            raise self.error
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        return self
+
+    def first(self):
+        return self.row
+
+    def one(self):
+        return self.row
+
+    def scalar(self):
+        return self.version
+
+def replica_set(*members):
+    replica_set_ = ReplicaSet(list(members))
+    # Health is set by hand below instead of by the polling thread
+    replica_set_._poller = object()
+    return replica_set_
+
+def healthy(name, engine, lag=0.0):
+    replica = Replica(name, engine)
+    replica.healthy, replica.lag_seconds = True, lag
+    return replica
+
+def test_reads_stay_on_the_primary_without_an_eligible_replica():
+    lagging = healthy("lagging", FakeEngine(), lag=replicas.REPLICA_MAX_LAG_SECONDS + 1)
+    down = Replica("down", FakeEngine())
+    assert replica_set(lagging, down).read_bind(FakeEngine(row=(3, -1.0)), user_id=1) is None
+
+def test_old_writes_read_from_any_eligible_replica():
+    engine = FakeEngine(version=1)
+    assert replica_set(healthy("r1", engine)).read_bind(FakeEngine(row=(3, -1.0)), user_id=1) is engine
+    # A user who never wrote has no marker row
+    assert replica_set(healthy("r1", engine)).read_bind(FakeEngine(row=None), user_id=1) is engine
+
+def test_recent_writes_wait_for_the_replica_to_catch_up():
+    primary = FakeEngine(row=(3, 4.0))
+    behind = FakeEngine(version=2)
+    caught_up = FakeEngine(version=3)
+    assert replica_set(healthy("r1", behind)).read_bind(primary, user_id=1) is None
+    assert replica_set(healthy("r1", caught_up)).read_bind(primary, user_id=1) is caught_up
+
+def test_markers_are_cached_until_this_process_writes():
+    primary = FakeEngine(row=(3, -1.0))
+    engine = FakeEngine(version=3)
+    replicas_ = replica_set(healthy("r1", engine))
+    assert replicas_.read_bind(primary, user_id=1) is engine
+    assert replicas_.read_bind(primary, user_id=1) is engine
+    assert primary.connects == 1
+    primary.row = (4, 4.0)
+    replicas_.forget(1)
+    assert replicas_.read_bind(primary, user_id=1) is None
+    assert primary.connects == 2
+
+def test_committed_writes_drop_the_cached_marker(monkeypatch, client, auth):
+    import database
+    forgotten = []
+    monkeypatch.setattr(database, "replica_set", type("Recorder", (), {"forget": lambda self, user_id: forgotten.append(user_id)})())
+    create_account(client, auth)
+    assert len(forgotten) == 1
+
+def test_replica_errors_fall_back_to_the_primary():
+    replica = healthy("r1", FakeEngine(error=OSError("connection refused")))
+    assert replica_set(replica).read_bind(FakeEngine(row=(3, 4.0)), user_id=1) is None
+    assert not replica.healthy
+
+def test_health_check_marks_promoted_and_unreachable_replicas():
+    promoted = Replica("promoted", FakeEngine(row=(False, 0)))
+    promoted.check()
+    assert (promoted.healthy, promoted.last_error) == (False, "not in recovery")
+    unreachable = Replica("unreachable", FakeEngine(error=OSError("timeout")))
+    unreachable.check()
+    assert not unreachable.eligible and unreachable.failures == 1
@@ -0,0 +1,50 @@
+from decimal import Decimal
+from sqlalchemy import select
+import rollups
+from models import LedgerRollup
+from conftest import add_entry, create_account, create_category
+
+def rollup_rows(db, account_ids):
+    """Non-empty rollups; emptied keys stay behind as zero rows, which a rebuild doesn't recreate"""
+    db.expire_all()
+    rows = db.execute(
+        select(LedgerRollup.account_id, LedgerRollup.category_id, LedgerRollup.month, LedgerRollup.income, LedgerRollup.expense, LedgerRollup.entry_count)
+        .where(LedgerRollup.account_id.in_(account_ids))
+        .order_by(LedgerRollup.account_id, LedgerRollup.category_id, LedgerRollup.month)
+    ).all()
+    return [row for row in rows if row.income or row.expense or row.entry_count]
+
+def test_report_totals_categories_and_months(client, auth):
+    account_id = create_account(client, auth)
+    food = create_category(client, auth, "expense", "Food")
+    pay = create_category(client, auth, "income", "Pay")
+    add_entry(client, auth, account_id, "1000", "2024-01-31", category_id=pay)
+    add_entry(client, auth, account_id, "120", "2024-01-10", category_id=food)
+    add_entry(client, auth, account_id, "80", "2024-03-05", category_id=food)
+
+    report = client.get("/reports", headers=auth).json()
+    assert report["totals"] == {"income": "1000.00", "expense": "-200.00", "net": "800.00"}
+    assert [(row["name"], row["net"]) for row in report["categories"]] == [("Food", "-200.00"), ("Pay", "1000.00")]
+    # February had no entries but still gets a row
+    months = [(row["month"], Decimal(row["net"]), row["net_change"] and Decimal(row["net_change"])) for row in report["months"]]
+    assert months == [
+        ("2024-01-01", Decimal("880"), None),
+        ("2024-02-01", Decimal("0"), Decimal("-880")),
+        ("2024-03-01", Decimal("-80"), Decimal("-80")),
+    ]
+    march = client.get("/reports", params={"start_month": "2024-03-01"}, headers=auth).json()
+    assert march["totals"]["net"] == "-80.00"
+
+def test_rollups_follow_edits_and_deletes(client, auth, db):
+    first, second = create_account(client, auth, "A"), create_account(client, auth, "B")
+    food = create_category(client, auth, "expense")
+    entry = add_entry(client, auth, first, "50", "2024-01-10", category_id=food)
+    add_entry(client, auth, first, "20", "2024-02-10")
+    client.put(f"/ledger/{entry['id']}", json={"account_id": second, "transaction_date": "2024-04-01T00:00:00"}, headers=auth)
+    doomed = add_entry(client, auth, second, "7", "2024-04-02")
+    client.delete(f"/ledger/{doomed['id']}", headers=auth)
+
+    maintained = rollup_rows(db, [first, second])
+    user_id = db.execute(select(LedgerRollup.user_id).where(LedgerRollup.account_id == first)).scalar()
+    rollups.rebuild(db, user_id)
+    assert rollup_rows(db, [first, second]) == maintained
@@ -0,0 +1,23 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+import serialization
+from conftest import add_entry, create_account, create_category
+
+def test_fast_path_lists_match_the_pydantic_responses(client, auth):
+    account_id = create_account(client, auth)
+    entry = add_entry(client, auth, account_id, "-10.50", category_id=create_category(client, auth), narration="Lunch")
+
+    listed = client.get("/ledger", headers=auth).json()["items"]
+    assert listed == [client.get(f"/ledger/{entry['id']}", headers=auth).json()]
+    accounts = client.get("/accounts", headers=auth)
+    assert accounts.json() == [client.get(f"/accounts/{account_id}", headers=auth).json()]
+    # Headers set by the conditional-GET dependency survive the raw Response
+    assert accounts.headers["etag"]
+
+def test_stdlib_fallback_encodes_like_orjson(monkeypatch):
+    payload = {"amount": Decimal("-10.50"), "on": datetime(2024, 1, 15), "narration": "Café"}
+    encoded = serialization.dumps(payload)
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert json.loads(serialization.dumps(payload)) == json.loads(encoded)
+    assert json.loads(encoded) == {"amount": "-10.50", "on": "2024-01-15T00:00:00", "narration": "Café"}
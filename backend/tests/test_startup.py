@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from sqlalchemy.exc import OperationalError
+import init_db
+import serve
+
+class FlakyBind:
+    def __init__(self, failures):
+        self.failures = failures
+        self.attempts = 0
+
+    def connect(self):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise OperationalError("SELECT 1", {}, Exception("connection refused"))
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+def test_wait_for_database_backs_off_until_the_database_answers(monkeypatch):
+    pauses = []
+    monkeypatch.setattr(init_db.time, "sleep", pauses.append)
+    bind = FlakyBind(failures=4)
+    init_db.wait_for_database(bind, timeout=60)
+    assert bind.attempts == 5
+    # Doubling delay with jitter of up to half of it
+    for pause, delay in zip(pauses, (0.05, 0.1, 0.2, 0.4)):
+        assert delay / 2 <= pause <= delay
+
+def test_wait_for_database_gives_up_at_the_timeout(monkeypatch):
+    monkeypatch.setattr(init_db.time, "sleep", lambda pause: None)
+    with pytest.raises(OperationalError):
+        init_db.wait_for_database(FlakyBind(failures=10**6), timeout=0.2)
+
+def test_shared_socket_is_inherited_by_workers():
+    sock = serve.bind_socket("127.0.0.1", 0, backlog=16)
+    try:
+        assert sock.get_inheritable()
+        assert sock.getsockname()[1] > 0
+    finally:
+        sock.close()
+
+def test_first_request_timer_logs_once(capsys):
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append(scope["type"])
+
+    timer = serve.FirstRequestTimer(app)
+    for scope_type in ("lifespan", "http", "http"):
+        asyncio.run(timer({"type": scope_type}, None, None))
+    assert calls == ["lifespan", "http", "http"]
+    assert capsys.readouterr().out.count("first request") == 1
@@ -0,0 +1,122 @@
+import hashlib
+from datetime import date
+from typing import Optional
+from fastapi import Depends, HTTPException, Request, Response, status
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from auth import Principal, get_current_user, get_current_user_async
+from database import get_db, get_async_db
+from models import UserDataVersion
+
+def bump_data_version(db: Session, user_id: int):
+    """Advance the user's data version; call in the same transaction as the write, or after it commits"""
+    db.info.setdefault("written_users", set()).add(user_id)
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(UserDataVersion).values(user_id=user_id, version=1, updated_at=func.localtimestamp())
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[UserDataVersion.user_id],
+            set_={"version": UserDataVersion.version + 1, "updated_at": func.localtimestamp()},
+        ))
+        return
+    result = db.execute(
+        update(UserDataVersion)
+        .where(UserDataVersion.user_id == user_id)
+        .values(version=UserDataVersion.version + 1, updated_at=func.localtimestamp())
+    )
+    if result.rowcount == 0:
+        db.execute(insert(UserDataVersion).values(user_id=user_id, version=1, updated_at=func.localtimestamp()))
+
+def bump_data_versions(db: Session, user_ids):
+    """bump_data_version for many users at once, in user order"""
+    user_ids = sorted(set(user_ids))
+    if not user_ids:
+        return
+    db.info.setdefault("written_users", set()).update(user_ids)
+    dialect = db.get_bind().dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        for user_id in user_ids:
+            bump_data_version(db, user_id)
+        return
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = dialect_insert(UserDataVersion).values(version=1, updated_at=func.localtimestamp())
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[UserDataVersion.user_id],
+            set_={"version": UserDataVersion.version + 1, "updated_at": func.localtimestamp()},
+        ),
+        [{"user_id": user_id} for user_id in user_ids],
+    )
+
+def _version_query(user_id: int):
+    return select(UserDataVersion.version).where(UserDataVersion.user_id == user_id)
+
+def make_etag(user_id: int, version: int, request: Request, today: Optional[date] = None) -> str:
+    # Same data version, different path or query string -> different representation
+    query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+    key = f"{user_id}:{request.url.path}?{query}"
+    if today is not None:
+        key += f"#{today.isoformat()}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+    return f'W/"{version}-{digest}"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore the W/ prefix on either side
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+def _conditional(request: Request, response: Response, user_id: int, version: int, today: Optional[date] = None):
+    etag = make_etag(user_id, version, request, today)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        # Raised from a dependency, so the endpoint's own queries never run
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+def conditional_get(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    version = db.execute(_version_query(current_user.id)).scalar() or 0
+    _conditional(request, response, current_user.id, version)
+
+async def conditional_get_async(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    version = (await db.execute(_version_query(current_user.id))).scalar() or 0
+    _conditional(request, response, current_user.id, version)
+
+def conditional_get_dated(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """conditional_get for endpoints whose omitted dates default to today: the ETag changes at midnight"""
+    version = db.execute(_version_query(current_user.id)).scalar() or 0
+    _conditional(request, response, current_user.id, version, date.today())
+
+async def conditional_get_dated_async(
+    request: Request,
+    response: Response,
+    current_user: Principal = Depends(get_current_user_async),
+    db: AsyncSession = Depends(get_async_db),
+):
+    version = (await db.execute(_version_query(current_user.id))).scalar() or 0
+    _conditional(request, response, current_user.id, version, date.today())
@@ -4,6 +4,8 @@ import { format } from 'date-fns';
 
 export default function Ledger() {
   const [transactions, setTransactions] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [accounts, setAccounts] = useState([]);
   const [categories, setCategories] = useState([]);
   const [loading, setLoading] = useState(true);
@@ -17,12 +19,14 @@ export default function Ledger() {
     category_id: '',
     start_date: '',
     end_date: '',
+    q: '',
   });
   const [appliedFilters, setAppliedFilters] = useState({
     account_id: '',
     category_id: '',
     start_date: '',
     end_date: '',
+    q: '',
   });
   const [formData, setFormData] = useState({
     account_id: '',
@@ -61,17 +65,22 @@ export default function Ledger() {
     }
   };
 
+  const buildParams = () => {
+    const params = {};
+    if (appliedFilters.account_id) params.account_id = appliedFilters.account_id;
+    if (appliedFilters.category_id) params.category_id = appliedFilters.category_id;
+    if (appliedFilters.start_date) params.start_date = appliedFilters.start_date;
+    if (appliedFilters.end_date) params.end_date = appliedFilters.end_date;
+    if (appliedFilters.q.trim()) params.q = appliedFilters.q.trim();
+    return params;
+  };
+
   const loadTransactions = async () => {
     setLoading(true);
     try {
-      const params = {};
-      if (appliedFilters.account_id) params.account_id = appliedFilters.account_id;
-      if (appliedFilters.category_id) params.category_id = appliedFilters.category_id;
-      if (appliedFilters.start_date) params.start_date = appliedFilters.start_date;
-      if (appliedFilters.end_date) params.end_date = appliedFilters.end_date;
-
-      const response = await ledgerAPI.getAll(params);
-      setTransactions(response.data);
+      const response = await ledgerAPI.getAll(buildParams());
+      setTransactions(response.data.items);
+      setNextCursor(response.data.next_cursor);
     } catch (err) {
       setError('Failed to load transactions');
     } finally {
@@ -79,6 +88,20 @@ export default function Ledger() {
     }
   };
 
+  const loadMoreTransactions = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await ledgerAPI.getAll({ ...buildParams(), cursor: nextCursor });
+      setTransactions((prev) => [...prev, ...response.data.items]);
+      setNextCursor(response.data.next_cursor);
+    } catch (err) {
+      setError('Failed to load transactions');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleApplyFilters = () => {
     setAppliedFilters({ ...filters });
     setShowFilters(false);
@@ -91,6 +114,7 @@ export default function Ledger() {
       category_id: '',
       start_date: '',
       end_date: '',
+      q: '',
     };
     setFilters(emptyFilters);
     setAppliedFilters(emptyFilters);
@@ -98,7 +122,7 @@ export default function Ledger() {
   };
 
   const hasActiveFilters = () => {
-    return appliedFilters.account_id || appliedFilters.category_id || appliedFilters.start_date || appliedFilters.end_date;
+    return appliedFilters.account_id || appliedFilters.category_id || appliedFilters.start_date || appliedFilters.end_date || appliedFilters.q;
   };
 
   const handleSubmit = async (e) => {
@@ -357,6 +381,21 @@ export default function Ledger() {
               </button>
             </span>
           )}
+          {appliedFilters.q && (
+            <span className="inline-flex items-center px-3 py-1 rounded-full text-xs font-medium bg-blue-100 text-blue-800">
+              Search: {appliedFilters.q}
+              <button
+                onClick={() => {
+                  const newFilters = { ...appliedFilters, q: '' };
+                  setAppliedFilters(newFilters);
+                  setFilters(newFilters);
+                }}
+                className="ml-2 hover:text-blue-600"
+              >
+                ×
+              </button>
+            </span>
+          )}
           <button
             onClick={handleClearFilters}
             className="text-sm text-blue-600 hover:text-blue-800 font-medium"
@@ -425,6 +464,17 @@ export default function Ledger() {
                 onChange={(e) => setFilters({ ...filters, end_date: e.target.value })}
               />
             </div>
+            <div className="sm:col-span-2 lg:col-span-4">
+              <label className="block text-sm font-medium text-gray-700 mb-2">Narration</label>
+              <input
+                type="search"
+                placeholder="Search narration, e.g. coffee or &quot;direct debit&quot;"
+                maxLength={200}
+                className="w-full border border-gray-300 rounded-lg shadow-sm py-3 px-4 text-base focus:outline-none focus:ring-2 focus:ring-blue-500 focus:border-transparent"
+                value={filters.q}
+                onChange={(e) => setFilters({ ...filters, q: e.target.value })}
+              />
+            </div>
           </div>
           <div className="flex flex-col sm:flex-row gap-3 justify-end">
             <button
@@ -500,6 +550,17 @@ export default function Ledger() {
               </div>
             </div>
           ))}
+          {nextCursor && (
+            <div className="flex justify-center pt-2">
+              <button
+                onClick={loadMoreTransactions}
+                disabled={loadingMore}
+                className="px-6 py-3 text-sm font-medium text-blue-600 bg-blue-50 rounded-lg hover:bg-blue-100 transition-colors disabled:opacity-50"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </div>
       )}
 